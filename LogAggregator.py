@@ -3,6 +3,7 @@
 """
 import os
 import sys
+import atexit
 import inspect
 import json
 from pathlib import Path
@@ -14,7 +15,13 @@ from src.auth import auth_bp, LogJWTManager as jwt
 from src.FileTransferManager.FileUploader import FileUploader
 from src.ConfigManager.ConfigManager import ConfigManager
 from src.FileTransferManager.ElasticConnector import ElasticConnector
-from src.blueprints import LogBlueprint
+from src.blueprints import LogBlueprint, MetricsBlueprint, SearchBlueprint
+from src.Metrics.Metrics import Metrics
+from src.Profiling.RequestProfiler import RequestProfiler
+from src.Search.LogSearch import LogSearch
+from src.Search.RecentLogs import RecentLogs
+from src.services.search_service import SearchService
+from src.Tail.TailHub import TailHub
 from src.docs.py.docs import doc_app
 #from src.blueprints.docs import LogDoc
 #from src.blueprints.docs.auth_doc import api as auth_namespace
@@ -33,11 +40,17 @@ class LogAggregator:
                  ):
         try:
             self.__config = ConfigManager(config_path)
-            file_uploader = uploader or FileUploader().get_instance()
-            elastic_connector = elastic_connector or ElasticConnector(self.__config).get_instance()
-            self.__log = logger_instance or Logger(file_uploader, self.__config, elastic_connector)
+            Metrics.configure(self.__config.config.get("metrics", {}))
+            file_uploader = uploader or FileUploader(self.__config).get_instance()
+            self.__elastic_connector = elastic_connector or ElasticConnector(self.__config).get_instance()
+            self.__elastic_connector.register_index_template()
+            self.__log = logger_instance or Logger(file_uploader, self.__config, self.__elastic_connector)
+            #ship whatever is still in the asynchronous queue when the worker process exits
+            atexit.register(self.__log.close)
             self.app = Flask(__name__)
             self.app.json_encoder = json.JSONEncoder
+            #payloads over the limit are refused with 413 before their body is read (Content-Length) or as soon as it's exceeded (chunked)
+            self.app.config["MAX_CONTENT_LENGTH"] = self.__config.config["logs"].get("maxPayloadBytes")
             #self.app.config.from_prefixed_env()
             #initialize the database:
             if test_config:
@@ -50,10 +63,28 @@ class LogAggregator:
             db.initialize_db(self.app)
             jwt.initialize_manager(self.app)
             # register the log blueprint
-            log_bp = LogBlueprint.create_log_blueprint(self.__log)
+            profiling_config = self.__config.config["logs"].get("profiling", {})
+            profiler = RequestProfiler(profiling_config, os.path.join(Path(__file__).parent, "src")) if profiling_config.get("enabled", False) else None
+            #live tail of the entries accepted, streamed by /log/tail
+            tail_config = self.__config.config["logs"].get("tail", {})
+            self.__tail_hub = None
+            if tail_config.get("enabled", False):
+                self.__tail_hub = TailHub(queue_size=tail_config.get("queueSize", 1000),
+                                          max_subscribers=tail_config.get("maxSubscribers", 500),
+                                          slow_policy=tail_config.get("slowSubscribers", "sample"),
+                                          heartbeat=tail_config.get("heartbeatSeconds", 15))
+                self.__log.add_listener(self.__tail_hub.publish)
+            log_bp = LogBlueprint.create_log_blueprint(self.__log, profiler, self.__tail_hub)
             self.app.register_blueprint(log_bp,url_prefix='/')
             # register the blueprints for authentication: every authentication related resource needs to be prefixed with /auth
             self.app.register_blueprint(auth_bp,url_prefix='/auth')
+            # metrics to be scraped by Prometheus, available at /metrics
+            self.app.register_blueprint(MetricsBlueprint.create_metrics_blueprint())
+            # search of the indexed logs, cached in front of Elasticsearch. Recent entries can be kept in memory to be searched
+            # locally, but only by a server that runs in a single process (see enable_recent_logs)
+            self.__recent_logs = None
+            self.__log_search = LogSearch(self.__config, self.__elastic_connector)
+            self.app.register_blueprint(SearchBlueprint.create_search_blueprint(self.__log_search))
             # Swagger UI implementation in a separate blueprint
             self.app.register_blueprint(doc_app, url_prefix='/api')
         except FileNotFoundError as exc:
@@ -64,8 +95,35 @@ class LogAggregator:
             raise FileNotFoundError("Shutting down. No config.json found") from exc
         
     def run(self):
+        self.enable_recent_logs()
         self.app.run(port=8080)
+
+    def enable_recent_logs(self):
+        """
+        Keeps the entries received from now on in memory (search.recent) and answers the searches of a recent window from them.
+        Only for servers that run in a single process (run, AsyncServer.run): with several worker processes, as under gunicorn,
+        each one would hold just its own share of the entries and answer with incomplete results, so searches go to
+        Elasticsearch there.
+        """
+        recent_config = self.__config.config.get("search", {}).get("recent", {})
+        if self.__recent_logs or not recent_config.get("enabled", False):
+            return
+        self.__recent_logs = RecentLogs(max_bytes=recent_config.get("maxBytes", 67108864), max_age=recent_config.get("maxAgeSeconds", 900))
+        self.__log.add_listener(self.__recent_logs.add)
+        self.__log_search.set_recent_logs(self.__recent_logs)
+        SearchService.register_gauges(self.__log_search, self.__recent_logs)
         
     def get_logger(self):
         return self.__log
 
+    def get_config(self):
+        return self.__config
+
+    def get_elastic_connector(self):
+        return self.__elastic_connector
+
+    def get_tail_hub(self):
+        return self.__tail_hub
+
+    def get_recent_logs(self):
+        return self.__recent_logs
@@ -0,0 +1,13 @@
+"""
+LogAggregator asyncio entrypoint. Serves the same app as main.py from an aiohttp event loop, shipping the logs to
+Elasticsearch and S3 without blocking a thread per request (see src/AsyncServer/AsyncServer.py).
+Run it with python async_main.py, or with gunicorn async_main:app --worker-class aiohttp.GunicornWebWorker
+"""
+
+from src.AsyncServer.AsyncServer import AsyncServer
+
+server = AsyncServer()
+app = server.app
+
+if __name__ == "__main__":
+    server.run()
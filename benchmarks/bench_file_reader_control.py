@@ -0,0 +1,49 @@
+"""
+Benchmark of the ledger of indexed files: seconds FileReaderControl.unread_files takes to check a listing of S3 keys, half
+of them already processed, with a cold cache (names looked up in the database) and a warm one.
+Run it from the repository root with:
+    python -m benchmarks.bench_file_reader_control [--keys 100000] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from src.FileTransferManager.FileReaderControl import FileReaderControl
+
+
+def open_control(db_path: str) -> FileReaderControl:
+    """Opens the database without the names cached in memory"""
+    FileReaderControl._instance = None
+    return FileReaderControl(db_path)
+
+
+def best_of(run, repeat: int) -> float:
+    """Best of `repeat` runs, to reduce the noise of other processes running in the machine"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--keys", type=int, default=100000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+    keys = ["logaggregator_2025-03-15_{}.log".format(i) for i in range(args.keys)]
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, "file_sync.db")
+        open_control(db_path).add_files(keys[::2])
+        cold = best_of(lambda: open_control(db_path).unread_files(keys), args.repeat)
+        control = open_control(db_path)
+        control.unread_files(keys)
+        warm = best_of(lambda: control.unread_files(keys), args.repeat)
+        FileReaderControl._instance = None
+    print("cold cache: {:.3f} s for {:,} keys".format(cold, args.keys))
+    print("warm cache: {:.3f} s for {:,} keys".format(warm, args.keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark of the bulk request body builders: documents/second of NewlineDelimitedJSON.ndjson, which parses and dumps every
+document again, against NewlineDelimitedJSON.bulk_body, which joins the already serialized documents.
+Run it from the repository root with:
+    python -m benchmarks.bench_ndjson [--documents 100000] [--repeat 5]
+"""
+import argparse
+import time
+from benchmarks.bench_parser import SAMPLE_LINE
+from src.Formatter.JsonBackend import JsonBackend
+from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+from src.Parser.LogParser import LogParser
+
+INDEX = "logaggregator-2025.03.15"
+
+
+def legacy_body(documents):
+    """Body as it was sent before bulk_body: a str that requests encodes before sending"""
+    return NewlineDelimitedJSON.ndjson(documents, INDEX).encode("utf-8")
+
+
+def bulk_body(documents):
+    return NewlineDelimitedJSON.bulk_body(documents, INDEX)
+
+
+def documents_per_second(build, documents, repeat: int) -> float:
+    """Best of `repeat` runs, to reduce the noise of other processes running in the machine"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(documents)
+        best = min(best, time.perf_counter() - start)
+    return len(documents) / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--documents", type=int, default=100000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+    documents = LogParser.serialize(LogParser.parse("10.0.0.1", [SAMPLE_LINE] * args.documents))
+    legacy = documents_per_second(legacy_body, documents, args.repeat)
+    current = documents_per_second(bulk_body, documents, args.repeat)
+    print("JSON backend: {}".format(JsonBackend.name))
+    print("ndjson:    {:>12,.0f} documents/s".format(legacy))
+    print("bulk_body: {:>12,.0f} documents/s ({:.1f}x)".format(current, current / legacy))
+
+
+if __name__ == "__main__":
+    main()
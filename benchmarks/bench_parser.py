@@ -0,0 +1,71 @@
+"""
+Benchmark of the log line parser: lines/second of LogParser against the previous split-based Logger.__parse implementation.
+Run it from the repository root with:
+    python -m benchmarks.bench_parser [--lines 100000] [--repeat 5]
+"""
+import argparse
+import time
+from src.LogEntry.LogEntry import LogEntry
+from src.Parser.LogParser import LogParser
+
+SAMPLE_LINE = "2025-03-15 01:56:59,303 - 127.0.0.1  - 4109 - INFO - get_dns - server.py - Querying DNS server for address www.yoursite.com"
+
+
+def legacy_parse(remote_addr: str, message: bytes):
+    """
+    The Logger.__parse implementation that LogParser replaced, kept here as the benchmark baseline.
+    """
+    parsed_message = []
+    message = str(message, encoding='utf-8').split("\n")
+    for log_row in message:
+        if not log_row:
+            break
+        log_row = log_row.split("-")
+        year, month = log_row[0:2]
+        day, time = log_row[2].split(" ")[:-1]
+        date = "{}-{}-{}".format(year, month, day)
+        log_row = [row.strip(" ") for row in log_row]
+        parsed_message.append(
+            LogEntry(
+                application_server_ip=remote_addr,
+                application_id=log_row[4],
+                date=date,
+                time=time,
+                client_ip=log_row[3],
+                level=log_row[5],
+                method=log_row[6],
+                component=log_row[7],
+                message=log_row[8]
+            ).model_dump_json() + '\n'
+        )
+    return parsed_message
+
+
+def log_parser(remote_addr: str, message: bytes):
+    return LogParser.serialize(LogParser.parse(remote_addr, str(message, encoding='utf-8').splitlines()))
+
+
+def lines_per_second(parse, payload: bytes, lines: int, repeat: int) -> float:
+    """Best of `repeat` runs, to reduce the noise of other processes running in the machine"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse("10.0.0.1", payload)
+        best = min(best, time.perf_counter() - start)
+    return lines / best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--lines", type=int, default=100000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+    payload = "\n".join([SAMPLE_LINE] * args.lines).encode("utf-8")
+    legacy = lines_per_second(legacy_parse, payload, args.lines, args.repeat)
+    current = lines_per_second(log_parser, payload, args.lines, args.repeat)
+    print("legacy split parser: {:>12,.0f} lines/s".format(legacy))
+    print("LogParser:           {:>12,.0f} lines/s ({:.1f}x)".format(current, current / legacy))
+
+
+if __name__ == "__main__":
+    main()
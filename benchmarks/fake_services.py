@@ -0,0 +1,138 @@
+"""
+Local stand-ins of Elasticsearch and S3, so LogAggregator can be load tested on a single machine. They accept everything
+LogAggregator sends, discard the content and count what was received.
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeService:
+    """HTTP server running in a background thread, at http://127.0.0.1:<port>"""
+
+    def __init__(self, handler):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._server.stats = {"requests": 0, "bytes": 0}
+        self._server.stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._server.serve_forever, name=handler.__name__, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}".format(self.port)
+
+    @property
+    def stats(self) -> dict:
+        with self._server.stats_lock:
+            return dict(self._server.stats)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    #keep-alive, as the clients of LogAggregator reuse their connections
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes"] += len(body)
+        return body
+
+    def _count(self, key: str, amount: int):
+        with self.server.stats_lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + amount
+
+    def _respond(self, status: int, body: bytes = b"", content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class FakeElasticsearchHandler(_Handler):
+    """
+    Every index exists, index and template creation succeed, and every document sent to _bulk is indexed.
+    """
+
+    def do_HEAD(self):
+        self._read_body()
+        self._respond(200)
+
+    def do_GET(self):
+        self._read_body()
+        if self.path.startswith("/_cat/indices"):
+            self._respond(200, json.dumps([{"index": self.path.rsplit("/", 1)[-1].split("?")[0]}]).encode())
+        else:
+            self._respond(200, b"{}")
+
+    def do_PUT(self):
+        self._read_body()
+        self._respond(200, b'{"acknowledged":true}')
+
+    def do_POST(self):
+        body = self._read_body()
+        if urlparse(self.path).path.endswith("/_bulk"):
+            #an action line and a document per entry
+            self._count("documents", body.count(b"\n") // 2)
+            self._respond(200, b'{"errors":false}')
+        else:
+            self._respond(200, b"{}")
+
+
+class FakeS3Handler(_Handler):
+    """
+    Path-style S3 (http://127.0.0.1:<port>/<bucket>/<key>): single uploads, multipart uploads and empty listings.
+    Signatures are not checked and the objects are not stored.
+    """
+
+    def do_PUT(self):
+        self._read_body()
+        query = parse_qs(urlparse(self.path).query)
+        if "partNumber" not in query:
+            self._count("objects", 1)
+        self._respond(200, headers={"ETag": '"{}"'.format(uuid.uuid4().hex)})
+
+    def do_POST(self):
+        self._read_body()
+        query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        bucket, _, key = urlparse(self.path).path.lstrip("/").partition("/")
+        if "uploads" in query:
+            body = ("<InitiateMultipartUploadResult><Bucket>{}</Bucket><Key>{}</Key><UploadId>{}</UploadId>"
+                    "</InitiateMultipartUploadResult>").format(bucket, key, uuid.uuid4().hex)
+        else:
+            self._count("objects", 1)
+            body = ("<CompleteMultipartUploadResult><Bucket>{}</Bucket><Key>{}</Key><ETag>\"{}\"</ETag>"
+                    "</CompleteMultipartUploadResult>").format(bucket, key, uuid.uuid4().hex)
+        self._respond(200, body.encode(), content_type="application/xml")
+
+    def do_HEAD(self):
+        self._read_body()
+        self._respond(200)
+
+    def do_GET(self):
+        self._read_body()
+        bucket = urlparse(self.path).path.lstrip("/").partition("/")[0]
+        body = ("<ListBucketResult><Name>{}</Name><KeyCount>0</KeyCount><IsTruncated>false</IsTruncated>"
+                "</ListBucketResult>").format(bucket)
+        self._respond(200, body.encode(), content_type="application/xml")
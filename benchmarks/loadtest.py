@@ -0,0 +1,234 @@
+"""
+Offline load test of LogAggregator. Starts local stand-ins of Elasticsearch and S3 (see fake_services.py), starts the
+aggregator against them in a separate process (werkzeug, or gunicorn with --workers/--threads) and drives POST /log from
+--concurrency client threads for --duration seconds, with payloads of the sizes in --mix (lines:weight, comma separated).
+Reports requests/s, lines/s, p50/p95/p99 latency, errors and the peak RSS of the aggregator, and optionally saves them as JSON.
+Run it from the repository root with:
+    python -m benchmarks.loadtest [--concurrency 8] [--duration 30] [--mix 1:60,100:30,1000:10]
+                                  [--server werkzeug|gunicorn] [--workers 2] [--threads 4] [--output loadtest.json]
+The clients share this process with the stand-ins, so with many client threads they may be the bottleneck: compare the
+CPU usage of both processes when sizing from these numbers.
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import requests
+from benchmarks.bench_parser import SAMPLE_LINE
+from benchmarks.fake_services import FakeElasticsearchHandler, FakeS3Handler, FakeService
+
+ROOT = Path(__file__).parent.parent
+BUCKET = "loadtest"
+
+
+def create_app():
+    """
+    App factory of the aggregator process (gunicorn 'benchmarks.loadtest:create_app()'), configured by the
+    LOADTEST_CONFIG and LOADTEST_DATABASE environment variables. Creates the admin user the clients log in with.
+    """
+    from LogAggregator import LogAggregator
+    from sqlalchemy.exc import IntegrityError
+    from src.database import DB
+    from src.models import User
+    log_aggregator = LogAggregator(config_path=os.environ["LOADTEST_CONFIG"], test_config={
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///{}".format(os.environ["LOADTEST_DATABASE"]),
+        "JWT_SECRET_KEY": "loadtestsecret"
+    })
+    with log_aggregator.app.app_context():
+        try:
+            User.create_admin()
+        except IntegrityError:
+            #created by another gunicorn worker in the meantime
+            DB.db_instance().session.rollback()
+    return log_aggregator.app
+
+
+def serve(port: int):
+    """Serves the app with the threaded werkzeug server, until the process is terminated"""
+    from werkzeug.serving import make_server
+    #a line per request would slow the server down
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    make_server("127.0.0.1", port, create_app(), threaded=True).serve_forever()
+
+
+def write_config(directory: str, elastic: FakeService, s3: FakeService) -> str:
+    """config.json of test/ pointing to the stand-ins, with the log files kept in the directory"""
+    with open(ROOT / "test" / "config.json", "rt") as fp:
+        config = json.load(fp)
+    config["logs"]["path"] = os.path.join(directory, "logs")
+    os.makedirs(config["logs"]["path"])
+    config["elastic"].update(scheme="http", host="127.0.0.1", port=elastic.port)
+    config["S3"].update(bucketName=BUCKET, endpointUrl=s3.url)
+    config_path = os.path.join(directory, "config.json")
+    with open(config_path, "wt") as fp:
+        json.dump(config, fp)
+    return config_path
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, directory: str, config_path: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, LOADTEST_CONFIG=config_path, LOADTEST_DATABASE=os.path.join(directory, "loadtest.db"),
+               #the stand-in of S3 does not check signatures, but boto3 needs credentials to sign
+               AWS_ACCESS_KEY_ID="loadtest", AWS_SECRET_ACCESS_KEY="loadtest", AWS_DEFAULT_REGION="us-east-1",
+               PYTHONPATH=str(ROOT))
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--bind", "127.0.0.1:{}".format(port), "--workers", str(args.workers),
+                   "--threads", str(args.threads), "--log-level", "warning", "benchmarks.loadtest:create_app()"]
+    else:
+        command = [sys.executable, "-m", "benchmarks.loadtest", "--serve", str(port)]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def wait_until_up(url: str, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise Exception("Error upon starting the aggregator: exit code {}".format(server.returncode))
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise Exception("Error upon starting the aggregator: not up after {} seconds".format(timeout))
+
+
+def parse_mix(mix: str):
+    """lines:weight,... into the payloads and their weights"""
+    payloads, weights = [], []
+    for item in mix.split(","):
+        lines, _, weight = item.partition(":")
+        payloads.append((int(lines), "\n".join([SAMPLE_LINE] * int(lines)).encode("utf-8")))
+        weights.append(float(weight or 1))
+    return payloads, weights
+
+
+def drive(url: str, token: str, payloads, weights, concurrency: int, duration: float) -> dict:
+    """
+    Posts payloads to /log from `concurrency` threads for `duration` seconds.
+    Returns:
+        dict: latency of every request, lines accepted, errors by status and the elapsed seconds
+    """
+    latencies, errors = [], {}
+    lines_sent = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(seed: int):
+        session = requests.Session()
+        session.headers["Authorization"] = "Bearer {}".format(token)
+        chooser = random.Random(seed)
+        own_latencies, own_errors, own_lines = [], {}, 0
+        while time.monotonic() < deadline:
+            lines, payload = chooser.choices(payloads, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = session.post(url + "/log", data=payload).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            own_latencies.append(time.perf_counter() - start)
+            if status == 200:
+                own_lines += lines
+            else:
+                own_errors[str(status)] = own_errors.get(str(status), 0) + 1
+        with lock:
+            latencies.extend(own_latencies)
+            lines_sent[0] += own_lines
+            for status, count in own_errors.items():
+                errors[status] = errors.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"latencies": latencies, "lines": lines_sent[0], "errors": errors, "elapsed": time.monotonic() - start}
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of the largest process that ran the aggregator (gunicorn workers included), once it exited"""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    #kilobytes in Linux, bytes in macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--duration", type=float, default=30)
+    arg_parser.add_argument("--mix", default="1:60,100:30,1000:10", help="payload sizes in lines and their weights")
+    arg_parser.add_argument("--server", choices=("werkzeug", "gunicorn"), default="werkzeug")
+    arg_parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    arg_parser.add_argument("--threads", type=int, default=4, help="threads of each gunicorn worker")
+    arg_parser.add_argument("--output", default=None, help="file where the report is saved as JSON")
+    arg_parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+    payloads, weights = parse_mix(args.mix)
+    directory = tempfile.mkdtemp()
+    try:
+        with FakeService(FakeElasticsearchHandler) as elastic, FakeService(FakeS3Handler) as s3:
+            port = free_port()
+            url = "http://127.0.0.1:{}".format(port)
+            server = start_server(args, directory, write_config(directory, elastic, s3), port)
+            try:
+                wait_until_up(url, server)
+                credentials = base64.b64encode(b"admin:changeme").decode("utf-8")
+                token = requests.get(url + "/auth/login", headers={"Authorization": "Basic {}".format(credentials)}).json()["token"]["access"]
+                run = drive(url, token, payloads, weights, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+            elastic_stats, s3_stats = elastic.stats, s3.stats
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    latencies = run["latencies"]
+    report = {
+        "server": args.server if args.server == "werkzeug" else "gunicorn ({} workers, {} threads)".format(args.workers, args.threads),
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / run["elapsed"],
+        "lines_per_second": run["lines"] / run["elapsed"],
+        "latency_ms": {name: percentile(latencies, fraction) * 1000 for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "errors": run["errors"],
+        "peak_rss_mb": peak_rss_mb(),
+        "elasticsearch": elastic_stats,
+        "s3": s3_stats
+    }
+    print("{requests} requests in {elapsed:.1f}s: {rps:,.1f} requests/s, {lps:,.0f} lines/s".format(
+        requests=report["requests"], elapsed=run["elapsed"], rps=report["requests_per_second"], lps=report["lines_per_second"]))
+    print("latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms".format(**report["latency_ms"]))
+    print("errors: {}".format(report["errors"] or "none"))
+    print("peak RSS of the aggregator: {:.1f} MB".format(report["peak_rss_mb"]))
+    print("Elasticsearch received {} documents, S3 received {} objects".format(elastic_stats.get("documents", 0), s3_stats.get("objects", 0)))
+    if args.output:
+        with open(args.output, "wt") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Benchmark suite of the ingest hot path. For every payload shape (1 line, 1k lines, 100k lines and 1k lines with long
+messages) it measures:
+    parse: lines/second and bytes/second of LogParser (what Logger does with the payload of /log)
+    ndjson: bytes/second of the bulk request bodies, NewlineDelimitedJSON.bulk_body and the legacy ndjson
+    index: documents/second of ElasticConnector.create_document (chunking, body and response handling)
+    http: lines/second of POST /log through the Flask test client, from the request to the response
+Elasticsearch and S3 are stubbed, so only the work done by LogAggregator is measured.
+Results are saved as JSON, so runs can be compared over time. Run it from the repository root with:
+    python -m benchmarks.suite [--repeat 3] [--shapes single,1k,100k,long] [--benchmarks parse,ndjson,index,http]
+                               [--output benchmarks/results/<timestamp>.json] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+import requests
+from benchmarks.bench_parser import SAMPLE_LINE, log_parser
+from src.Formatter.JsonBackend import JsonBackend
+from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+from src.FileTransferManager.UploadResult import UploadResult
+
+ROOT = Path(__file__).parent.parent
+INDEX = "logaggregator-2025.03.15"
+#seconds
+MIN_MEASUREMENT = 0.2
+LONG_MESSAGE = "Querying DNS server for address www.yoursite.com " * 160
+#name: (lines, log line)
+SHAPES = {
+    "single": (1, SAMPLE_LINE),
+    "1k": (1000, SAMPLE_LINE),
+    "100k": (100000, SAMPLE_LINE),
+    "long": (1000, SAMPLE_LINE.rsplit(" - ", 1)[0] + " - " + LONG_MESSAGE),
+}
+
+
+def best_of(run, repeat: int) -> float:
+    """
+    Best time per call of `repeat` measurements, to reduce the noise of other processes running in the machine.
+    Each measurement calls run as many times as needed to last at least MIN_MEASUREMENT seconds, so small payloads are
+    not dominated by the resolution of the timer. The first call warms up caches and is not measured.
+    """
+    start = time.perf_counter()
+    run()
+    calls = max(1, int(MIN_MEASUREMENT / max(time.perf_counter() - start, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            run()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def result(benchmark: str, shape: str, lines: int, size: int, seconds: float, **extra) -> dict:
+    return {
+        "benchmark": benchmark,
+        "shape": shape,
+        "lines": lines,
+        "bytes": size,
+        "seconds": seconds,
+        "lines_per_second": lines / seconds,
+        "bytes_per_second": size / seconds,
+        **extra
+    }
+
+
+def stub_response(*args, **kwargs) -> requests.Response:
+    """Response of the stubbed Elasticsearch: every index exists and every document is indexed"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"errors":false}'
+    return response
+
+
+def bench_parse(shape: str, lines: int, payload: bytes, repeat: int):
+    yield result("parse", shape, lines, len(payload), best_of(lambda: log_parser("10.0.0.1", payload), repeat))
+
+
+def bench_ndjson(shape: str, lines: int, payload: bytes, repeat: int):
+    documents = log_parser("10.0.0.1", payload)
+    body = NewlineDelimitedJSON.bulk_body(documents, INDEX)
+    yield result("ndjson", shape, lines, len(body), best_of(lambda: NewlineDelimitedJSON.bulk_body(documents, INDEX), repeat),
+                 builder="bulk_body")
+    yield result("ndjson", shape, lines, len(body),
+                 best_of(lambda: NewlineDelimitedJSON.ndjson(documents, INDEX).encode("utf-8"), repeat), builder="ndjson")
+
+
+def bench_index(shape: str, lines: int, payload: bytes, repeat: int, connector):
+    documents = log_parser("10.0.0.1", payload)
+    with patch.object(requests.Session, "request", stub_response):
+        seconds = best_of(lambda: connector.create_document(INDEX, documents), repeat)
+    yield result("index", shape, lines, sum(map(len, documents)), seconds)
+
+
+def bench_http(shape: str, lines: int, payload: bytes, repeat: int, client, headers: dict):
+    def post():
+        response = client.post("/log", data=payload, headers=headers)
+        if response.status_code != 200:
+            raise Exception("Error upon posting the {} payload: {} {}".format(shape, response.status_code, response.get_data(as_text=True)))
+    with patch.object(requests.Session, "request", stub_response):
+        yield result("http", shape, lines, len(payload), best_of(post, repeat))
+
+
+class StubUploader:
+    """FileUploader that stores nothing: the file is left for Logger to delete, as after a successful upload"""
+
+    def transfer_file(self, file_path, bucket_name, object_name):
+        return UploadResult(file_path=file_path, bucket_name=bucket_name, object_name=object_name, success=True)
+
+    def upload_async(self, file_path, bucket_name, object_name) -> Future:
+        future = Future()
+        future.set_result(self.transfer_file(file_path, bucket_name, object_name))
+        return future
+
+
+def create_app(directory: str):
+    """
+    LogAggregator with the settings of test/config.json, S3 stubbed and a client authorized to send logs.
+    Log files and the database are kept in the directory.
+    Returns:
+        tuple: connector to Elasticsearch, Flask test client and the headers of the requests
+    """
+    from flask_jwt_extended import create_access_token
+    from LogAggregator import LogAggregator
+    with open(ROOT / "test" / "config.json", "rt") as fp:
+        config = json.load(fp)
+    config["logs"]["path"] = os.path.join(directory, "logs")
+    os.makedirs(config["logs"]["path"])
+    config_path = os.path.join(directory, "config.json")
+    with open(config_path, "wt") as fp:
+        json.dump(config, fp)
+    test_config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///{}".format(os.path.join(directory, "benchmark.db")),
+        "JWT_SECRET_KEY": "benchmarksecret"
+    }
+    with patch.object(requests.Session, "request", stub_response):
+        log_aggregator = LogAggregator(config_path=config_path, test_config=test_config, uploader=StubUploader())
+    with log_aggregator.app.app_context():
+        token = create_access_token(identity="benchmark", additional_claims={"perm": ["log"]}, expires_delta=False)
+    return log_aggregator.get_elastic_connector(), log_aggregator.app.test_client(), {"Authorization": "Bearer {}".format(token)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results: list, previous_path: str):
+    """Prints the throughput of every result relative to the same benchmark in a previous run"""
+    with open(previous_path, "rt") as fp:
+        previous = {(r["benchmark"], r["shape"], r.get("builder")): r for r in json.load(fp)["results"]}
+    print("\nCompared to {}:".format(previous_path))
+    for r in results:
+        before = previous.get((r["benchmark"], r["shape"], r.get("builder")))
+        if before:
+            print("{:<24} {:>8} {:>7.2f}x".format(r["benchmark"] + (":" + r["builder"] if r.get("builder") else ""), r["shape"],
+                                                 r["bytes_per_second"] / before["bytes_per_second"]))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--shapes", default=",".join(SHAPES))
+    arg_parser.add_argument("--benchmarks", default="parse,ndjson,index,http")
+    arg_parser.add_argument("--output", default=None, help="defaults to benchmarks/results/<timestamp>.json")
+    arg_parser.add_argument("--compare", default=None, help="results of a previous run")
+    args = arg_parser.parse_args()
+    benchmarks = args.benchmarks.split(",")
+    started = datetime.now(timezone.utc)
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        connector, client, headers = create_app(directory) if {"index", "http"} & set(benchmarks) else (None, None, None)
+        for shape in args.shapes.split(","):
+            lines, line = SHAPES[shape]
+            payload = "\n".join([line] * lines).encode("utf-8")
+            runs = {
+                "parse": lambda: bench_parse(shape, lines, payload, args.repeat),
+                "ndjson": lambda: bench_ndjson(shape, lines, payload, args.repeat),
+                "index": lambda: bench_index(shape, lines, payload, args.repeat, connector),
+                "http": lambda: bench_http(shape, lines, payload, args.repeat, client, headers),
+            }
+            for benchmark in benchmarks:
+                for r in runs[benchmark]():
+                    results.append(r)
+                    print("{:<24} {:>8} {:>14,.0f} lines/s {:>10,.1f} MB/s".format(
+                        benchmark + (":" + r["builder"] if r.get("builder") else ""), shape, r["lines_per_second"],
+                        r["bytes_per_second"] / 1e6))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    report = {
+        "started": started.isoformat(),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "json_backend": JsonBackend.name,
+        "repeat": args.repeat,
+        "results": results
+    }
+    output = args.output or str(ROOT / "benchmarks" / "results" / "{}.json".format(started.strftime("%Y%m%dT%H%M%SZ")))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wt") as fp:
+        json.dump(report, fp, indent=2)
+    print("\nResults saved to {}".format(output))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Non-blocking counterpart of the BulkIndexer, used by the asyncio server"""
+import asyncio
+import base64
+import json
+from typing import List, Tuple
+import aiohttp
+from src.FileTransferManager.BulkIndexer import BulkIndexer, BulkChunksError
+from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+from src.Metrics.Metrics import Metrics
+
+
+class BulkRequestError(Exception):
+    """
+    A bulk request failed as a whole (e.g. the index does not exist). Carries the status and the decoded body of the response.
+    """
+
+    def __init__(self, message: str, status: int, body: dict):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class AsyncBulkIndexer(BulkIndexer):
+    """
+    Sends documents to the Elasticsearch _bulk API with an aiohttp session, so the event loop keeps serving requests
+    while the bulk requests are in flight. Chunking, filter_path, the retry of the documents rejected with 429 and the
+    summary of the results are the same as in the BulkIndexer. Chunks are sent concurrently as coroutines instead of
+    worker threads.
+    """
+
+    def __init__(self, auth: Tuple[str, str], chunk_bytes: int = 5242880, connections: int = 10, max_retries: int = 3,
+                 retry_backoff: float = 0.5, timeout: float = 60):
+        """
+        Args:
+            auth (tuple): username and password of Elasticsearch
+            chunk_bytes (int): maximum size of the body of each bulk request
+            connections (int): maximum amount of connections open to Elasticsearch
+            max_retries (int): how many times rejected documents are sent again
+            retry_backoff (float): seconds to wait before the first retry. Doubles at every retry.
+            timeout (float): seconds to wait for the response of each bulk request
+        """
+        super().__init__(None, chunk_bytes=chunk_bytes, workers=0, max_retries=max_retries, retry_backoff=retry_backoff,
+                         timeout=timeout)
+        credentials = base64.b64encode("{}:{}".format(*auth).encode("utf-8")).decode("ascii")
+        self._headers = dict(self._HEADERS, Authorization="Basic " + credentials)
+        self._connections = connections
+
+    async def open(self):
+        """Opens the session. Must be called from the event loop that sends the requests."""
+        #certificates are not verified, as in the ElasticConnector
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._connections, ssl=False),
+                                              timeout=aiohttp.ClientTimeout(total=self._timeout))
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def index_async(self, bulk_url: str, index_name: str, documents: List[str]) -> dict:
+        """
+        Indexes the documents in the index.
+        Args:
+            bulk_url (str): URL of the _bulk endpoint
+            index_name (str): index where the documents will be stored
+            documents (List[str]): JSON documents, one per entry
+        Raises:
+            BulkChunksError: if bulk requests fail as a whole (e.g. the index does not exist, or Elasticsearch can't be
+                reached). Its error is the BulkRequestError (or aiohttp.ClientError, asyncio.TimeoutError) of the first one.
+        Returns:
+            dict: amount of "indexed" and "failed" documents, the first "errors" reported by Elasticsearch and the
+                "retryable" documents, which failed with a transient error
+        """
+        chunks = self._chunks(index_name, documents)
+        outcomes = await asyncio.gather(*(self._try_chunk_async(bulk_url, index_name, chunk) for chunk in chunks))
+        return self._outcome(chunks, outcomes)
+
+    async def _try_chunk_async(self, bulk_url: str, index_name: str, documents: List[str]):
+        """_index_chunk_async, returning the error of a chunk that failed as a whole instead of raising it"""
+        try:
+            return await self._index_chunk_async(bulk_url, index_name, documents)
+        except (BulkRequestError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return exc
+
+    async def _index_chunk_async(self, bulk_url: str, index_name: str, documents: List[str]):
+        """
+        Sends a chunk, retrying whatever was rejected by an overloaded or failing cluster.
+        Returns:
+            tuple: amount of documents indexed, the errors of the documents that failed and the documents still rejected
+            with a transient error after every retry
+        """
+        indexed, errors, retryable = 0, [], []
+        pending = documents
+        attempt = 0
+        while pending:
+            body = NewlineDelimitedJSON.bulk_body(pending, index_name)
+            with Metrics.stage_timer("es_bulk"):
+                async with self._session.post(bulk_url, params={"filter_path": self._FILTER_PATH}, headers=self._headers,
+                                              data=body) as response:
+                    content = await response.read()
+            Metrics.increment("logaggregator_bytes_sent_total", len(body), destination="elasticsearch")
+            retry = []
+            if response.status == 429:
+                retry = pending
+            elif response.status != 200:
+                raise BulkRequestError("Error upon creating bulk request for index {}: status {}".format(index_name, response.status),
+                                       response.status, self._decode(content))
+            else:
+                item_indexed, retry, item_errors = self._item_results(pending, json.loads(content))
+                indexed += item_indexed
+                errors.extend(item_errors)
+            if retry and attempt >= self._max_retries:
+                errors.extend({"type": "es_rejected_execution_exception", "reason": "retries exhausted"} for _ in retry)
+                retryable, retry = retry, []
+            if retry:
+                await asyncio.sleep(self._retry_backoff * 2 ** attempt)
+                attempt += 1
+            pending = retry
+        return indexed, errors, retryable
+
+    @staticmethod
+    def _decode(content: bytes) -> dict:
+        try:
+            return json.loads(content)
+        except ValueError:
+            return {}
@@ -0,0 +1,72 @@
+"""asyncio (aiohttp) server of LogAggregator"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from LogAggregator import LogAggregator
+from src.AsyncServer.AsyncBulkIndexer import AsyncBulkIndexer
+from src.AsyncServer.AsyncShipper import AsyncShipper
+from src.AsyncServer.TailHandler import TailHandler
+from src.AsyncServer.WSGIBridge import WSGIBridge
+
+
+class AsyncServer:
+    """
+    Serves LogAggregator from an asyncio event loop. Requests go through the same Flask app (and so the same LogService and
+    AuthService logic) by means of the WSGIBridge, while the parsed batches are shipped by the AsyncShipper: the bulk
+    requests to Elasticsearch are sent with aiohttp and the uploads to S3 are awaited without blocking a thread.
+    Settings are read from asyncServer in config.json:
+        threads: threads that run the Flask app (parsing and authentication)
+        maxInFlightBatches: batches shipped at the same time. Past that, /log answers 503.
+        connections: maximum amount of connections open to Elasticsearch
+    """
+
+    def __init__(self, config_path: str = "./config.json", log_aggregator: LogAggregator = None):
+        """
+        Args:
+            config_path (str): path of config.json
+            log_aggregator (LogAggregator): app to be served. Created from config_path if not given.
+        """
+        self._log_aggregator = log_aggregator or LogAggregator(config_path)
+        config = self._log_aggregator.get_config().config
+        server_config = config.get("asyncServer", {})
+        elastic_config = config["elastic"]
+        bulk_config = elastic_config.get("bulk", {})
+        self._bulk_indexer = AsyncBulkIndexer((elastic_config["auth"]["username"], elastic_config["auth"]["password"]),
+                                              chunk_bytes=bulk_config.get("chunkBytes", 5242880),
+                                              connections=server_config.get("connections", 10),
+                                              max_retries=bulk_config.get("maxRetries", 3),
+                                              retry_backoff=bulk_config.get("retryBackoffSeconds", 0.5),
+                                              timeout=bulk_config.get("timeoutSeconds", 60))
+        self._shipper = AsyncShipper(self._log_aggregator.get_logger(), self._log_aggregator.get_elastic_connector(),
+                                     self._bulk_indexer, max_in_flight=server_config.get("maxInFlightBatches", 64))
+        self._executor = ThreadPoolExecutor(max_workers=server_config.get("threads", 16), thread_name_prefix="wsgi")
+        #the payload limit is enforced by the Flask app, aiohttp only needs to let the body through. The WSGIBridge reads it
+        #whole, so logs.streaming does not bound the memory of a request here
+        #Content-Encoding is handled by LogService, so aiohttp must not decompress the body
+        self.app = web.Application(client_max_size=config["logs"].get("maxPayloadBytes") or sys.maxsize,
+                                   handler_args={"auto_decompress": False})
+        tail_hub = self._log_aggregator.get_tail_hub()
+        if tail_hub:
+            #viewers of the live tail are kept connected by the event loop, not by the threads of the bridge
+            self.app.router.add_get("/log/tail", TailHandler(self._log_aggregator.app, tail_hub, self._executor).handle)
+        self.app.router.add_route("*", "/{path:.*}", WSGIBridge(self._log_aggregator.app, self._executor).handle)
+        self.app.on_startup.append(self._start)
+        self.app.on_cleanup.append(self._stop)
+
+    async def _start(self, app: web.Application):
+        self._shipper.attach(asyncio.get_running_loop())
+        await self._bulk_indexer.open()
+        self._log_aggregator.get_logger().set_dispatcher(self._shipper.submit)
+
+    async def _stop(self, app: web.Application):
+        self._log_aggregator.get_logger().set_dispatcher(None)
+        await self._shipper.drain()
+        await self._bulk_indexer.close()
+        self._executor.shutdown(wait=False)
+
+    def run(self, port: int = 8080):
+        #a single process holds every entry received, so recent windows can be searched in memory (not under gunicorn)
+        self._log_aggregator.enable_recent_logs()
+        web.run_app(self.app, port=port)
+
@@ -0,0 +1,107 @@
+"""Ships the batches accepted by the asyncio server from its event loop"""
+import asyncio
+import queue
+import threading
+import traceback
+from typing import List
+from src.Logger.Logger import Logger
+from src.FileTransferManager.ElasticConnector import ElasticConnector
+from src.AsyncServer.AsyncBulkIndexer import AsyncBulkIndexer
+from src.FileTransferManager.BulkIndexer import BulkChunksError
+from src.Metrics.Metrics import Metrics
+
+
+class AsyncShipper:
+    """
+    Dispatcher of the Logger (see Logger.set_dispatcher) in the asyncio server. Each batch is shipped by a coroutine in the
+    event loop: the file is written in the default executor, uploaded to S3 by the FileUploader in the background and
+    indexed by the AsyncBulkIndexer, without holding a thread while waiting for S3 or Elasticsearch.
+    At most max_in_flight batches are shipped at the same time. Past that, batches are refused with queue.Full (503),
+    as in the asynchronous mode of the Logger.
+    """
+
+    def __init__(self, logger: Logger, elastic_connector: ElasticConnector, bulk_indexer: AsyncBulkIndexer, max_in_flight: int = 64):
+        """
+        Args:
+            logger (Logger): logger whose batches are shipped
+            elastic_connector (ElasticConnector): connector that names and creates the indices
+            bulk_indexer (AsyncBulkIndexer): indexer that sends the documents to Elasticsearch
+            max_in_flight (int): maximum amount of batches being shipped at the same time
+        """
+        self._logger = logger
+        self._elastic_connector = elastic_connector
+        self._bulk_indexer = bulk_indexer
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._loop = None
+        self._in_flight = set()
+        Metrics.register_gauge("logaggregator_queue_depth", self.depth, queue="async_shipping")
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Ships the batches in the loop. Must be called before the first batch is submitted."""
+        self._loop = loop
+
+    def submit(self, batch: List[str], wait: bool = False):
+        """
+        Schedules the shipping of a batch in the event loop. Called from the threads that run the Flask app.
+        Args:
+            batch (List[str]): parsed log entries
+            wait (bool): waits for a batch to be shipped when there's no room, instead of refusing it
+        Raises:
+            queue.Full: if max_in_flight batches are being shipped and wait is False
+        """
+        if not self._slots.acquire(blocking=wait):
+            raise queue.Full()
+        future = asyncio.run_coroutine_threadsafe(self._ship_and_release(batch), self._loop)
+        self._in_flight.add(future)
+        future.add_done_callback(self._in_flight.discard)
+
+    async def _ship_and_release(self, batch: List[str]):
+        try:
+            await self.ship(batch)
+        except Exception as e:
+            print("Error upon shipping {} log entries: {}".format(len(batch), e))
+            traceback.print_exc()
+        finally:
+            self._slots.release()
+
+    async def ship(self, batch: List[str]):
+        """
+        Writes the batch to a file, uploads it to S3 and indexes it in Elasticsearch.
+        Args:
+            batch (List[str]): JSON log entries produced by the parser
+        """
+        loop = asyncio.get_running_loop()
+        file_name, upload = await loop.run_in_executor(None, self._logger.stage, batch)
+        try:
+            await self._index(self._elastic_connector.index_name(file_name), batch)
+        finally:
+            self._logger.handle_upload(await asyncio.wrap_future(upload))
+
+    async def _index(self, index_name: str, batch: List[str]) -> dict:
+        """
+        Same as ElasticConnector.create_document: if the index is reported missing, it's created again and the chunks
+        that failed are sent once more.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._elastic_connector.ensure_index, index_name)
+        bulk_url = self._elastic_connector.bulk_url(index_name)
+        try:
+            result = await self._bulk_indexer.index_async(bulk_url, index_name, batch)
+        except BulkChunksError as exc:
+            if not ElasticConnector.is_index_not_found(getattr(exc.error, "body", None)):
+                raise
+            await loop.run_in_executor(None, self._elastic_connector.ensure_index, index_name, True)
+            result = AsyncBulkIndexer.merge(exc.result, await self._bulk_indexer.index_async(bulk_url, index_name, exc.documents))
+        if result["failed"]:
+            Metrics.increment("logaggregator_index_failures_total", result["failed"])
+            print("{} of {} documents were not indexed in {}: {}".format(result["failed"], len(batch), index_name, result["errors"]))
+        return result
+
+    def depth(self) -> int:
+        """Amount of batches being shipped"""
+        return len(self._in_flight)
+
+    async def drain(self):
+        """Waits for the batches being shipped"""
+        if self._in_flight:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in list(self._in_flight)))
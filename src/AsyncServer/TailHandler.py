@@ -0,0 +1,65 @@
+"""Streams the live tail (/log/tail) from the event loop of the asyncio server"""
+import asyncio
+from aiohttp import web
+from src.AsyncServer.WSGIBridge import WSGIBridge
+from src.services.tail_service import TailService
+from src.Tail.Subscription import Subscription
+from src.Tail.TailHub import TailHub
+
+
+class TailHandler(WSGIBridge):
+    """
+    aiohttp handler of /log/tail. Through the WSGIBridge, every viewer would hold one of its threads for as long as it's
+    connected, so the viewer is only authenticated and subscribed by the Flask logic (TailService.subscribe, in a thread),
+    and its events are then awaited and written by the event loop, which can keep hundreds of viewers connected.
+    """
+
+    def __init__(self, flask_app, tail_hub: TailHub, executor):
+        """
+        Args:
+            flask_app (flask.Flask): app of LogAggregator, which authenticates the viewers
+            tail_hub (TailHub): hub the entries accepted by the Logger are published to
+            executor (Executor): pool of threads where the Flask logic is called
+        """
+        super().__init__(flask_app, executor)
+        self._flask_app = flask_app
+        self._tail_hub = tail_hub
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        environ = self._environ(request, b"")
+        subscription, error = await asyncio.get_running_loop().run_in_executor(self._executor, self._subscribe, environ)
+        if error:
+            status, headers, content = error
+            return web.Response(status=status, headers={"Content-Type": headers.get("Content-Type", "text/plain")}, body=content)
+        try:
+            response = web.StreamResponse(headers=dict(TailService.HEADERS, **{"Content-Type": "text/event-stream"}))
+            await response.prepare(request)
+            await response.write(b": subscribed\n\n")
+            while True:
+                entries, skipped, closed = await subscription.poll_async(self._tail_hub.heartbeat)
+                await response.write(Subscription.render(entries, skipped, closed).encode("utf-8"))
+                if closed:
+                    return response
+        except ConnectionResetError:
+            #the viewer left
+            return response
+        finally:
+            subscription.close()
+
+    def _subscribe(self, environ: dict):
+        """
+        Runs TailService.subscribe in a request context of the Flask app, so the viewer is authenticated and its filters are
+        checked exactly as in the Flask server.
+        Returns:
+            tuple: the subscription, or None and the status, headers and body of the error response
+        """
+        with self._flask_app.request_context(environ):
+            try:
+                result = TailService.subscribe(self._tail_hub)
+            except Exception as e:
+                #e.g. a missing or invalid JWT, answered by the handlers of flask_jwt_extended
+                result = self._flask_app.handle_user_exception(e)
+            if isinstance(result, Subscription):
+                return result, None
+            response = self._flask_app.make_response(result)
+            return None, (response.status_code, response.headers, response.get_data())
@@ -0,0 +1,92 @@
+"""Serves a WSGI app (the Flask app of LogAggregator) from an aiohttp server"""
+import asyncio
+import io
+import sys
+from concurrent.futures import Executor
+from typing import Callable
+from aiohttp import web
+from multidict import CIMultiDict
+
+
+class WSGIBridge:
+    """
+    aiohttp handler that runs every request through the WSGI app, so the asyncio server keeps the exact /log and /auth
+    contract of the Flask app (LogService and AuthService). The body is read by the event loop and the WSGI app is called
+    in a bounded pool of threads, which only parses the payload and authenticates the request: shipping the batches is left
+    to the event loop (see AsyncShipper).
+    The whole body is read into memory before the WSGI app is called (up to logs.maxPayloadBytes), so logs.streaming does
+    not bound the memory used per request here: the payload is still parsed and shipped in units, but it's held whole.
+    """
+
+    #hop-by-hop headers describe how the body was sent to aiohttp, not the buffered body handed to the WSGI app
+    _SKIPPED_HEADERS = {"CONTENT-TYPE", "CONTENT-LENGTH", "TRANSFER-ENCODING", "CONNECTION"}
+
+    def __init__(self, wsgi_app: Callable, executor: Executor):
+        """
+        Args:
+            wsgi_app (Callable): WSGI application
+            executor (Executor): pool of threads where the WSGI application is called
+        """
+        self._wsgi_app = wsgi_app
+        self._executor = executor
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        environ = self._environ(request, body)
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(self._executor, self._call, environ)
+        code, _, reason = status.partition(" ")
+        response_headers = CIMultiDict(headers)
+        #aiohttp sets the length of the body it sends
+        response_headers.popall("Content-Length", None)
+        return web.Response(status=int(code), reason=reason or None, headers=response_headers, body=content)
+
+    def _environ(self, request: web.Request, body: bytes) -> dict:
+        host, _, port = request.host.partition(":")
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": request.path,
+            "QUERY_STRING": request.query_string,
+            "SERVER_NAME": host,
+            "SERVER_PORT": port or ("443" if request.secure else "80"),
+            "SERVER_PROTOCOL": "HTTP/{}.{}".format(*request.version),
+            "REMOTE_ADDR": request.remote or "",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": request.scheme,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if "Content-Type" in request.headers:
+            environ["CONTENT_TYPE"] = request.headers["Content-Type"]
+        for name in request.headers.keys():
+            if name.upper() in self._SKIPPED_HEADERS:
+                continue
+            key = "HTTP_" + name.upper().replace("-", "_")
+            if key not in environ:
+                environ[key] = ",".join(request.headers.getall(name))
+        return environ
+
+    def _call(self, environ: dict):
+        """
+        Calls the WSGI app.
+        Returns:
+            tuple: status line, headers and body of the response
+        """
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"], response["headers"] = status, headers
+            return chunks.append
+
+        result = self._wsgi_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], b"".join(chunks)
@@ -0,0 +1,210 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import requests
+from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+from src.Metrics.Metrics import Metrics
+
+
+class BulkChunksError(Exception):
+    """
+    Some chunks of a batch failed as a whole (e.g. the index does not exist), while the others may have been indexed.
+    Carries the error of the first chunk that failed, the summary of the chunks indexed and the documents of those that failed,
+    so only those are sent again.
+    """
+
+    def __init__(self, error: Exception, result: dict, documents: List[str]):
+        super().__init__(str(error))
+        self.error = error
+        self.result = result
+        self.documents = documents
+
+
+class BulkIndexer:
+    """
+    Sends documents to the Elasticsearch _bulk API in chunks of at most chunk_bytes, so a large batch never goes over
+    http.max_content_length. Chunks are sent concurrently by a pool of worker threads.
+    The bulk response is trimmed with filter_path to the per-item status and error, which is used to count the indexed and
+    failed documents. Documents rejected because the cluster is overloaded or failing (429, es_rejected_execution_exception,
+    or 5xx) are sent again, alone, with an exponential backoff. Those still rejected after every retry are listed in the
+    summary as "retryable", so the caller can send them later, while the ones rejected for good (other 4xx, e.g.
+    mapper_parsing_exception) are only counted as failed.
+    """
+
+    _FILTER_PATH = "errors,items.*.status,items.*.error"
+    _HEADERS = {
+        "Content-Type" : "application/x-ndjson"
+    }
+    #amount of item errors kept in the result, enough to diagnose a failure without holding a huge response
+    _MAX_REPORTED_ERRORS = 10
+
+    def __init__(self, session: requests.Session, chunk_bytes: int = 5242880, workers: int = 4, max_retries: int = 3,
+                 retry_backoff: float = 0.5, timeout: float = 60):
+        """
+        Args:
+            session (requests.Session): session used to send the bulk requests
+            chunk_bytes (int): maximum size of the body of each bulk request
+            workers (int): amount of bulk requests sent at the same time. 0 sends the chunks one after the other, without
+                a pool of threads (e.g. the AsyncBulkIndexer, which sends them as coroutines)
+            max_retries (int): how many times rejected documents are sent again
+            retry_backoff (float): seconds to wait before the first retry. Doubles at every retry.
+            timeout (float): seconds to wait for the response of each bulk request, so a hung Elasticsearch does not block
+                the shipping thread forever
+        """
+        self._session = session
+        self._chunk_bytes = chunk_bytes
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-indexer") if workers else None
+
+    def index(self, bulk_url: str, index_name: str, documents: List[str]) -> dict:
+        """
+        Indexes the documents in the index.
+        Args:
+            bulk_url (str): URL of the _bulk endpoint
+            index_name (str): index where the documents will be stored
+            documents (List[str]): JSON documents, one per entry
+        Raises:
+            BulkChunksError: if bulk requests fail as a whole (e.g. the index does not exist, or Elasticsearch can't be
+                reached). Its error is the requests.RequestException of the first one, with the response attached if any.
+        Returns:
+            dict: amount of "indexed" and "failed" documents, the first "errors" reported by Elasticsearch and the
+                "retryable" documents, which failed with a transient error
+        """
+        chunks = self._chunks(index_name, documents)
+        if len(chunks) == 1 or not self._executor:
+            outcomes = [self._try_chunk(bulk_url, index_name, chunk) for chunk in chunks]
+        else:
+            context = contextvars.copy_context()
+            outcomes = list(self._executor.map(lambda chunk: context.copy().run(self._try_chunk, bulk_url, index_name, chunk), chunks))
+        return self._outcome(chunks, outcomes)
+
+    def _try_chunk(self, bulk_url: str, index_name: str, documents: List[str]):
+        """_index_chunk, returning the error of a chunk that failed as a whole instead of raising it"""
+        try:
+            return self._index_chunk(bulk_url, index_name, documents)
+        except requests.RequestException as exc:
+            return exc
+
+    def _outcome(self, chunks: List[List[str]], outcomes: list) -> dict:
+        """
+        Summary of the chunks of a batch.
+        Raises:
+            BulkChunksError: if any chunk failed as a whole
+        """
+        failed = [(chunk, outcome) for chunk, outcome in zip(chunks, outcomes) if isinstance(outcome, Exception)]
+        summary = self._summary(outcome for outcome in outcomes if not isinstance(outcome, Exception))
+        if failed:
+            raise BulkChunksError(failed[0][1], summary, [document for chunk, _ in failed for document in chunk]) from failed[0][1]
+        return summary
+
+    def _summary(self, results) -> dict:
+        """
+        Adds up the results of the chunks of a batch.
+        """
+        summary = {
+            "indexed": 0,
+            "failed": 0,
+            "errors": [],
+            "retryable": []
+        }
+        for indexed, errors, retryable in results:
+            summary["indexed"] += indexed
+            summary["failed"] += len(errors)
+            summary["errors"].extend(errors[:self._MAX_REPORTED_ERRORS - len(summary["errors"])])
+            summary["retryable"].extend(retryable)
+        return summary
+
+    @classmethod
+    def merge(cls, *summaries: dict) -> dict:
+        """Adds up the summaries of several calls of index (e.g. a batch and the chunks of it that were sent again)"""
+        merged = {
+            "indexed": 0,
+            "failed": 0,
+            "errors": [],
+            "retryable": []
+        }
+        for summary in summaries:
+            merged["indexed"] += summary["indexed"]
+            merged["failed"] += summary["failed"]
+            merged["errors"].extend(summary["errors"][:cls._MAX_REPORTED_ERRORS - len(merged["errors"])])
+            merged["retryable"].extend(summary["retryable"])
+        return merged
+
+    def _chunks(self, index_name: str, documents: List[str]) -> List[List[str]]:
+        """
+        Splits the documents so that the NDJSON body of each chunk has at most chunk_bytes (a single document bigger than
+        that is sent alone). Sizes are counted in UTF-8 bytes, as sent.
+        """
+        action_size = len(NewlineDelimitedJSON.action_line(index_name).encode("utf-8"))
+        chunks, chunk, chunk_size = [], [], 0
+        for document in documents:
+            #isascii is a flag lookup, so only the documents with other characters are encoded to be measured
+            document_size = action_size + (len(document) if document.isascii() else len(document.encode("utf-8")))
+            if chunk and chunk_size + document_size > self._chunk_bytes:
+                chunks.append(chunk)
+                chunk, chunk_size = [], 0
+            chunk.append(document)
+            chunk_size += document_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _index_chunk(self, bulk_url: str, index_name: str, documents: List[str]):
+        """
+        Sends a chunk, retrying whatever was rejected by an overloaded or failing cluster.
+        Returns:
+            tuple: amount of documents indexed, the errors of the documents that failed and the documents still rejected
+            with a transient error after every retry
+        """
+        indexed, errors, retryable = 0, [], []
+        pending = documents
+        attempt = 0
+        while pending:
+            body = NewlineDelimitedJSON.bulk_body(pending, index_name)
+            with Metrics.stage_timer("es_bulk"):
+                req = self._session.post(url=bulk_url, params={"filter_path": self._FILTER_PATH}, headers=self._HEADERS, data=body,
+                                         timeout=self._timeout)
+            Metrics.increment("logaggregator_bytes_sent_total", len(body), destination="elasticsearch")
+            retry = []
+            if req.status_code == 429:
+                retry = pending
+            elif req.status_code != 200:
+                raise requests.HTTPError("Error upon creating bulk request for index {}: status {}".format(index_name, req.status_code),
+                                         response=req)
+            else:
+                item_indexed, retry, item_errors = self._item_results(pending, req.json())
+                indexed += item_indexed
+                errors.extend(item_errors)
+            if retry and attempt >= self._max_retries:
+                errors.extend({"type": "es_rejected_execution_exception", "reason": "retries exhausted"} for _ in retry)
+                retryable, retry = retry, []
+            if retry:
+                time.sleep(self._retry_backoff * 2 ** attempt)
+                attempt += 1
+            pending = retry
+        return indexed, errors, retryable
+
+    @staticmethod
+    def _item_results(documents: List[str], body: dict):
+        """
+        Splits the documents of a bulk request according to the result of each item.
+        Returns:
+            tuple: amount of documents indexed, documents rejected with a transient error (429 or 5xx) and errors of the
+            documents that failed for good
+        """
+        if not body.get("errors"):
+            return len(documents), [], []
+        indexed, retry, errors = 0, [], []
+        for document, item in zip(documents, body["items"]):
+            #each item is keyed by its action, e.g. {"index": {"status": 201}}
+            result = next(iter(item.values()))
+            if result["status"] < 300:
+                indexed += 1
+            elif result["status"] == 429 or result["status"] >= 500:
+                retry.append(document)
+            else:
+                errors.append(result.get("error"))
+        return indexed, retry, errors
@@ -1,7 +1,11 @@
 import requests
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
 from src.FileTransferManager.Reader import Reader
 from src.ConfigManager.ConfigManager import ConfigManager
-from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+from src.FileTransferManager.BulkIndexer import BulkIndexer, BulkChunksError
+from src.Metrics.Metrics import Metrics
+from src.Utils import TTLCache
 from typing import List
 
 class ElasticConnector:
@@ -12,9 +16,30 @@ class ElasticConnector:
     Process:
     
     Indexes are created per each file read from AWS. The index name is composed by the prefix "logaggregator-" followed by the date of the file creation.
-    
+    The naming is configured by elastic.index.strategy:
+        - daily (default): one index per UTC day, e.g. logaggregator-2025.03.15;
+        - alias: every batch is written to a write alias (e.g. logaggregator-write), whose backing index is bootstrapped
+          as logaggregator-000001 and can be rolled over by an ILM policy;
+        - file: one index per flushed file, the legacy behaviour.
+    An index template with explicit mappings is registered for the prefix, so Elasticsearch does not need to guess the
+    mapping of each new index.
     """
     _instance = None
+    _INDEX_STRATEGIES = ("daily", "alias", "file")
+    _INDEX_MAPPINGS = {
+        "dynamic": False,
+        "properties": {
+            "application_server_ip": {"type": "keyword"},
+            "application_id": {"type": "keyword"},
+            "date": {"type": "date", "format": "yyyy-MM-dd"},
+            "time": {"type": "keyword"},
+            "client_ip": {"type": "keyword"},
+            "level": {"type": "keyword"},
+            "method": {"type": "keyword"},
+            "component": {"type": "keyword"},
+            "message": {"type": "text"}
+        }
+    }
     
     def __new__(cls, config_manager: ConfigManager):
         if cls._instance is None:
@@ -31,39 +56,176 @@ class ElasticConnector:
         if not config_manager:
             raise Exception("Elasticsearch config not provided. Please check your config.json file.")
         self._config = config_manager.config["elastic"]
+        #https unless elastic.scheme says otherwise (e.g. a local stand-in of Elasticsearch)
+        self._base_url = "{}://{}:{}".format(self._config.get("scheme", "https"), self._config["host"], self._config["port"])
+        #keep-alive connections shared by every request, instead of a new TLS handshake per call
+        pool_config = self._config.get("pool", {})
+        adapter = HTTPAdapter(pool_connections=pool_config.get("connections", 1), pool_maxsize=pool_config.get("maxSize", 10))
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.auth = (self._config["auth"]["username"], self._config["auth"]["password"])
+        self._session.verify = False
+        #indices known to exist, so the steady state costs a single bulk request per batch
+        index_cache_config = self._config.get("indexCache", {})
+        self._index_cache = TTLCache(max_size=index_cache_config.get("maxSize", 1024), ttl=index_cache_config.get("ttlSeconds", 300))
+        bulk_config = self._config.get("bulk", {})
+        self._bulk_indexer = BulkIndexer(self._session,
+                                         chunk_bytes=bulk_config.get("chunkBytes", 5242880),
+                                         workers=bulk_config.get("workers", 4),
+                                         max_retries=bulk_config.get("maxRetries", 3),
+                                         retry_backoff=bulk_config.get("retryBackoffSeconds", 0.5),
+                                         timeout=bulk_config.get("timeoutSeconds", 60))
+        index_config = self._config.get("index", {})
+        self._index_strategy = index_config.get("strategy", "daily")
+        if self._index_strategy not in self._INDEX_STRATEGIES:
+            raise Exception("Unknown index strategy {}. Please use one of {}".format(self._index_strategy, self._INDEX_STRATEGIES))
+        self._index_prefix = index_config.get("prefix", "logaggregator")
+        self._write_alias = index_config.get("alias", "{}-write".format(self._index_prefix))
+        self._template_config = index_config.get("template", {})
+        #set when the template could not be registered at startup (e.g. Elasticsearch offline), so it's retried later
+        self._template_pending = False
         
     def get_instance(cls):
         return cls._instance
 
+    def index_name(self, file_name: str) -> str:
+        """
+        Name of the index (or alias) where the documents of a flushed file are written, according to elastic.index.strategy.
+        Args:
+            file_name (str): name of the file flushed by the Logger
+        """
+        if self._index_strategy == "file":
+            return file_name
+        if self._index_strategy == "alias":
+            return self._write_alias
+        return "{}-{}".format(self._index_prefix, datetime.now(timezone.utc).strftime("%Y.%m.%d"))
+
+    def register_index_template(self):
+        """
+        Registers (or updates) the index template for the indices created by LogAggregator, if elastic.index.template.enabled.
+        Failures are reported and not raised, as the aggregator must start even if Elasticsearch is offline: the registration
+        is retried before the next index is created.
+        """
+        if not self._template_config.get("enabled", False):
+            return
+        template_url = "{}/_index_template/{}".format(self._base_url, self._index_prefix)
+        template = {
+            "index_patterns": ["{}*".format(self._index_prefix)],
+            "template": {
+                "settings": {
+                    "number_of_shards": self._template_config.get("shards", 1),
+                    "number_of_replicas": self._template_config.get("replicas", 1)
+                },
+                "mappings": self._INDEX_MAPPINGS
+            }
+        }
+        try:
+            req = self._session.put(url=template_url, json=template)
+            if req.status_code != 200:
+                raise Exception("status {}: {}".format(req.status_code, req.text))
+            self._template_pending = False
+        except Exception as e:
+            self._template_pending = True
+            print("Error registering index template {}: {}".format(self._index_prefix, e))
+
     def create_document(self, index_name:str, content: List[str]):
         """
         Creates a document in the Elasticsearch instance from the file read. A new index is only created if an index for the current file does not exist.
+        Indices known to exist are cached for elastic.indexCache.ttlSeconds. If Elasticsearch reports that a cached index
+        does not exist anymore, the cache entry is dropped and the index is created again before retrying once the chunks
+        that failed (the others were indexed already).
+        The documents are sent by the BulkIndexer, in chunks of at most elastic.bulk.chunkBytes.
+        Raises:
+            BulkChunksError: if chunks failed as a whole. It carries the documents of those chunks, which were not indexed.
+        Returns:
+            dict: amount of "indexed" and "failed" documents, the first "errors" reported by Elasticsearch and the
+                "retryable" documents, which failed with a transient error
         """
-        index_exists = self.retrieve_index(index_name)
-        if not index_exists:
-            self.create_index(index_name)
-        ndjson = NewlineDelimitedJSON.ndjson(content, index_name)
-        auth = (self._config["auth"]["username"], self._config["auth"]["password"])
-        bulk_url = "https://{}:{}".format(self._config["host"], self._config["port"])+ "/" + index_name + "/_bulk"
-        headers = {
-            "Content-Type" : "application/x-ndjson"
-        }
-        req = requests.post(url=bulk_url, auth=auth, headers=headers, data=ndjson, verify=False)
+        self.ensure_index(index_name)
+        bulk_url = self.bulk_url(index_name)
+        try:
+            try:
+                result = self._bulk_indexer.index(bulk_url, index_name, content)
+            except BulkChunksError as exc:
+                if not self._index_not_found(exc.error.response):
+                    raise
+                self.ensure_index(index_name, refresh=True)
+                result = BulkIndexer.merge(exc.result, self._bulk_indexer.index(bulk_url, index_name, exc.documents))
+        except BulkChunksError as exc:
+            response = exc.error.response
+            error = Exception("Error upon creating bulk request for index {}: message {}".format(index_name,
+                                                                                             response.text if response is not None else exc.error))
+            raise BulkChunksError(error, exc.result, exc.documents) from exc
+        if result["failed"]:
+            Metrics.increment("logaggregator_index_failures_total", result["failed"])
+            print("{} of {} documents were not indexed in {}: {}".format(result["failed"], len(content), index_name, result["errors"]))
+        return result
+
+    def bulk_url(self, index_name: str) -> str:
+        """URL of the _bulk endpoint of the index"""
+        return self._base_url + "/" + index_name + "/_bulk"
+
+    def ensure_index(self, index_name: str, refresh: bool = False):
+        """
+        Creates the index if it does not exist, skipping the round trips when it's known to exist.
+        Args:
+            refresh (bool): whether to check the index again even if it's known to exist (e.g. it was reported missing)
+        """
+        if refresh:
+            self._index_cache.invalidate(index_name)
+        elif self._index_cache.get(index_name):
+            return
+        if self._template_pending:
+            self.register_index_template()
+        if self._index_strategy == "alias" and index_name == self._write_alias:
+            self._bootstrap_write_alias()
+        else:
+            index_exists = self.retrieve_index(index_name)
+            if not index_exists:
+                self.create_index(index_name)
+        self._index_cache.set(index_name, True)
+
+    def _bootstrap_write_alias(self):
+        """
+        Creates the first backing index of the write alias, unless the alias already exists.
+        """
+        if self.retrieve_index(self._write_alias):
+            return
+        index_url = "{}/{}-000001".format(self._base_url, self._index_prefix)
+        req = self._session.put(url=index_url, json={"aliases": {self._write_alias: {"is_write_index": True}}})
+        if req.status_code == 400 and req.json().get("error", {}).get("type") == "resource_already_exists_exception":
+            return
         if req.status_code != 200:
-            raise Exception("Error upon creating bulk request for index {}: message {}".format(index_name, req.json()))
-        return req.json()
+            raise Exception("Error upon creating write alias {}: message {}".format(self._write_alias, req.json()))
+
+    @staticmethod
+    def _index_not_found(response: requests.Response) -> bool:
+        if response is None:
+            return False
+        try:
+            return ElasticConnector.is_index_not_found(response.json())
+        except ValueError:
+            return False
+
+    @staticmethod
+    def is_index_not_found(body: dict) -> bool:
+        """Whether the body of an error response reports that the index does not exist"""
+        try:
+            return body["error"]["type"] == "index_not_found_exception"
+        except (KeyError, TypeError):
+            return False
     
     def retrieve_index(self, index_name: str):
         """
         Retrieves the index from the Elasticsearch instance based on the file name
         """
-        url = "https://{}:{}".format(self._config["host"], self._config["port"]) + self._config["endpoints"]["indexQuery"].format(index_name)
+        url = self._base_url + self._config["endpoints"]["indexQuery"].format(index_name)
         #this endpoint does not default its return type to application/json.
         headers = {
             "Accept" : "application/json"
         } 
-        auth_config = (self._config["auth"]["username"], self._config["auth"]["password"])
-        req = requests.get(url=url ,auth=auth_config, headers=headers, verify=False)
+        req = self._session.get(url=url, headers=headers)
 
         if req.status_code == 404:
             return None
@@ -76,8 +238,33 @@ class ElasticConnector:
         """
         Creates an index in the Elasticsearch instance based on the amount of files that were created in this day.
         """
-        index_url = "https://{}:{}/{}".format(self._config["host"], self._config["port"], index_name)
-        auth = (self._config["auth"]["username"], self._config["auth"]["password"])
-        req = requests.put(url=index_url, auth=auth, verify=False)
+        index_url = "{}/{}".format(self._base_url, index_name)
+        req = self._session.put(url=index_url)
+        if req.status_code == 400 and req.json().get("error", {}).get("type") == "resource_already_exists_exception":
+            #created in the meantime by another worker
+            return
         if req.status_code != 200:
             raise Exception("Error upon requesting index {}: message {}".format(index_name, req.json()))
+
+    def search(self, query: dict) -> dict:
+        """
+        Runs a search over the indices written by LogAggregator: <prefix>-* (daily indices and the backing indices of the
+        write alias), or <prefix>* with the file strategy. The first leaves out the indices of the file strategy, which may
+        predate the index template and so have dynamic mappings, where sorting on date and time fails.
+        Args:
+            query (dict): body of the _search request (query, sort, size...)
+        Raises:
+            Exception: if Elasticsearch refuses the search or can't be reached
+        Returns:
+            dict: the response of Elasticsearch
+        """
+        pattern = "{}*" if self._index_strategy == "file" else "{}-*"
+        search_url = "{}/{}/_search".format(self._base_url, pattern.format(self._index_prefix))
+        try:
+            #no index yet (e.g. nothing was logged today) is an empty result, not an error
+            req = self._session.post(url=search_url, json=query, params={"ignore_unavailable": "true", "allow_no_indices": "true"})
+        except requests.RequestException as exc:
+            raise Exception("Error upon searching {}: {}".format(search_url, exc)) from exc
+        if req.status_code != 200:
+            raise Exception("Error upon searching {}: status {}: {}".format(search_url, req.status_code, req.text))
+        return req.json()
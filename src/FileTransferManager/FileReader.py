@@ -1,48 +1,128 @@
 import boto3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple
 from src.FileTransferManager.Reader import Reader
 from src.FileTransferManager.FileReaderControl import FileReaderControl
 from src.ConfigManager.ConfigManager import ConfigManager
+from src.Utils import Compression
 
 class FileReader(Reader):
     """
     Reads file from S3 repository, returning the content as a parsed string. This content will be sent to the elasticsearch instance for indexing.
     Considering S3 as the source of truth of the logging system, this class will read the files from the S3 repository and return their content as documents
-    to be indexed in the elasticsearch instance (only new files). 
+    to be indexed in the elasticsearch instance (only new files).
+    The bucket is listed page by page and the files are downloaded by a pool of threads, while the amount of bytes downloaded
+    but not yet consumed is kept under S3.backfill.maxInFlightBytes. Every backfill lists the whole bucket (or prefix) and
+    skips the files recorded by the FileReaderControl.
+    With S3.backfill.resumeFromWatermark, the last key handed over is kept as a watermark and the next backfill resumes the
+    listing after it. That's only safe when new keys always sort after the previous ones: a key uploaded later that sorts
+    before the watermark (e.g. logaggregator_<date>_9.log after _10.log, or files from several pods) would never be read.
     """
     _instance = None
-    
-    def __new__(cls, config_manager: ConfigManager, file_reader_control: FileReaderControl):
+
+    def __new__(cls, config_manager: ConfigManager, file_reader_control: FileReaderControl, s3_client=None):
         if not cls._instance:
             cls._instance = super(FileReader, cls).__new__(cls)
         return cls._instance
-    
-    def __init__(self, config_manager: ConfigManager, file_reader_control: FileReaderControl):
+
+    def __init__(self, config_manager: ConfigManager, file_reader_control: FileReaderControl, s3_client=None):
+        """
+        Args:
+            s3_client: client used to reach the bucket. Defaults to a boto3 client for S3.endpointUrl (AWS if it's not set),
+                which also allows running the reader against a local S3 compatible server.
+        """
         self._config_manager = config_manager
         self._file_reader_control = file_reader_control
         self._bucket_name = self._config_manager.config["S3"]["bucketName"]
-        self._s3 = boto3.client('s3')
-    
+        self._s3 = s3_client or boto3.client('s3', endpoint_url=self._config_manager.config["S3"].get("endpointUrl"))
+        backfill_config = self._config_manager.config["S3"].get("backfill", {})
+        self._page_size = backfill_config.get("pageSize", 1000)
+        self._workers = backfill_config.get("workers", 8)
+        self._max_in_flight_bytes = backfill_config.get("maxInFlightBytes", 67108864)
+        self._prefix = backfill_config.get("prefix", "")
+        self._resume_from_watermark = backfill_config.get("resumeFromWatermark", False)
+        self._watermark = None
+
+    @property
+    def watermark(self) -> str:
+        """Key of the last file handed over by backfill and processed by the caller (i.e. the caller asked for the next one)"""
+        return self._watermark
+
     def read(self):
         """
         Reads the file from the S3 repository and returns the content as a string.
         If the file was already processed, it will be ignored and the processing begins from the next file in the bucket.
+        Prefer backfill for large buckets, as this method holds the content of every new file in memory.
         """
         try:
-            bucket_content = self._s3.list_objects(Bucket=self._bucket_name)
-            if bucket_content["ResponseMetadata"]["HTTPStatusCode"] != 200:
-                raise Exception("Error reading bucket content {}".format(bucket_content["Contents"]))
-            contents = []
-            for file in bucket_content["Contents"]:
-                file_processed = self._file_reader_control.check_if_read(file["Key"]) #this needs to be close to the document creation... or the document check needs to be added here.
-                if file_processed:
-                    continue
-                data = self._s3.get_object(Bucket=self._bucket_name, Key=file["Key"])
-                if data["ResponseMetadata"]["HTTPStatusCode"] != 200:
-                    raise Exception("Error reading file {}".format(file["Key"]))
-                read_data = data["Body"].read().decode("utf-8") 
-                contents.append(read_data)
-            return contents
+            return [content for _, content in self.backfill()]
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return None 
\ No newline at end of file
+            return None
+
+    def backfill(self, start_after: str = None) -> Iterator[Tuple[str, str]]:
+        """
+        Yields the files of the bucket that were not processed yet, in key order, as soon as they're downloaded.
+        Args:
+            start_after (str): key after which the listing starts. Defaults to the beginning of the bucket, or to the
+                watermark of the previous backfill with S3.backfill.resumeFromWatermark.
+        Raises:
+            Exception: if the bucket can't be listed or a file can't be read. Backfilling again resumes after the last file yielded.
+        Returns:
+            Iterator[Tuple[str, str]]: key and decoded content of each file
+        """
+        if start_after is None and self._resume_from_watermark:
+            start_after = self._watermark
+        #downloads in key order, with the size reported by the listing. Only this generator submits and consumes them.
+        in_flight = deque()
+        in_flight_bytes = 0
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="s3-backfill") as executor:
+            try:
+                for file in self._list_new_files(start_after):
+                    #the oldest download is handed over before starting a new one that would go over the limits
+                    while in_flight and (in_flight_bytes + file["Size"] > self._max_in_flight_bytes
+                                         or len(in_flight) >= 2 * self._workers):
+                        key, size, download = in_flight.popleft()
+                        in_flight_bytes -= size
+                        yield key, download.result()
+                        self._watermark = key
+                    in_flight.append((file["Key"], file["Size"], executor.submit(self._download, file["Key"])))
+                    in_flight_bytes += file["Size"]
+                while in_flight:
+                    key, _, download = in_flight.popleft()
+                    yield key, download.result()
+                    self._watermark = key
+            finally:
+                for _, _, download in in_flight:
+                    download.cancel()
+
+    def _list_new_files(self, start_after: str = None) -> Iterator[dict]:
+        """
+        Lists the bucket with list_objects_v2, one page at a time, skipping the files already processed.
+        """
+        request = {
+            "Bucket": self._bucket_name,
+            "MaxKeys": self._page_size,
+            "Prefix": self._prefix
+        }
+        if start_after:
+            request["StartAfter"] = start_after
+        while True:
+            page = self._s3.list_objects_v2(**request)
+            if page["ResponseMetadata"]["HTTPStatusCode"] != 200:
+                raise Exception("Error reading bucket content {}".format(self._bucket_name))
+            files = {file["Key"]: file for file in page.get("Contents", [])}
+            for key in self._file_reader_control.unread_files(list(files)):
+                yield files[key]
+            if not page.get("IsTruncated"):
+                return
+            request["ContinuationToken"] = page["NextContinuationToken"]
+
+    def _download(self, key: str) -> str:
+        data = self._s3.get_object(Bucket=self._bucket_name, Key=key)
+        if data["ResponseMetadata"]["HTTPStatusCode"] != 200:
+            raise Exception("Error reading file {}".format(key))
+        #files compressed by Logger.flush are recognized by their extension (.gz, .zst)
+        return Compression.decompress(data["Body"].read(), Compression.encoding_of(key)).decode("utf-8")
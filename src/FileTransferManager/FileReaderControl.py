@@ -1,47 +1,128 @@
 import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Iterable, List
 
 class FileReaderControl:
     """
     This class controls the file sync process with elasticsearch. It uses a sqlite3 database to keep track of the files that were already read.
+    File names are unique in the database and looked up in batches, with the names recently known to be processed kept in
+    an LRU cache, so checking a whole page of S3 keys costs at most a few queries. Each thread uses its own connection to the database,
+    which runs in WAL mode so that readers don't wait for the writer.
     """
     _instance = None
-    
-    def __new__(cls):
+    #SQLite's default limit of variables in a single statement is 999
+    _BATCH_SIZE = 900
+
+    def __new__(cls, db_path: str = None, cache_size: int = 100000):
         if not cls._instance:
             cls._instance = super(FileReaderControl, cls).__new__(cls)
         return cls._instance
-    
-    def __init__(self):
-        self._conn = sqlite3.connect(Path(__file__).parent.parent.parent.joinpath("db/file_sync.db").__str__(), check_same_thread=False)
-        self._cursor = self._conn.cursor()
-        self._cursor.execute("CREATE TABLE IF NOT EXISTS files (file_name TEXT NOT NULL, timestamp DATETIME not null)")
-        
-    def add_file(self, file_name: str, timestamp: str):
+
+    def __init__(self, db_path: str = None, cache_size: int = 100000):
+        """
+        Args:
+            db_path (str): path of the database file. Defaults to db/file_sync.db in the project root.
+            cache_size (int): maximum amount of file names kept in memory. Older ones are looked up in the database again.
+        """
+        self._db_path = db_path or Path(__file__).parent.parent.parent.joinpath("db/file_sync.db").__str__()
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._read_files = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS files (file_name TEXT NOT NULL, timestamp DATETIME not null)")
+            #duplicated names would prevent the unique index from being created
+            conn.execute("DELETE FROM files WHERE rowid NOT IN (SELECT MIN(rowid) FROM files GROUP BY file_name)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS files_file_name ON files (file_name)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_file(self, file_name: str, timestamp: str = None):
         """
         Adds a file that was successfully indexed in elasticsearch to the database.
         Args:
             file_name (str): name of the log file processed
-            timestamp (str): date of the file processing
+            timestamp (str): date of the file processing. Defaults to now.
+        """
+        self.add_files([file_name], timestamp)
+
+    def add_files(self, file_names: Iterable[str], timestamp: str = None):
         """
+        Adds the files that were successfully indexed in elasticsearch to the database, in a single transaction.
+        Files already recorded are ignored.
+        Args:
+            file_names (Iterable[str]): names of the log files processed
+            timestamp (str): date of the file processing. Defaults to now.
+        """
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+        file_names = list(file_names)
         try:
-            self._cursor.execute("INSERT INTO files (file_name, timestamp) VALUES (?, ?)", file_name, timestamp)
-            self._conn.commit()
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO files (file_name, timestamp) VALUES (?, ?)",
+                                 ((file_name, timestamp) for file_name in file_names))
+            self._remember(file_names)
         except Exception:
             import traceback
             traceback.print_exc()
-    
+
+    def _remember(self, file_names: Iterable[str]):
+        """Caches the names of processed files, evicting the least recently used ones beyond the cache size"""
+        with self._lock:
+            for file_name in file_names:
+                self._read_files[file_name] = None
+                self._read_files.move_to_end(file_name)
+            while len(self._read_files) > self._cache_size:
+                self._read_files.popitem(last=False)
+
     def check_if_read(self, file: str):
         """
         Selects the current entry from the control table. if there's a file with the same ID, then it will be ignored by the FileReader.
         Args:
             file_name (str): name of the log file processed
         """
+        return not self.unread_files([file])
+
+    def unread_files(self, files: List[str]) -> List[str]:
+        """
+        Filters out the files that were already processed, querying the database only for the names that aren't known yet.
+        Args:
+            files (List[str]): names of the log files, e.g. a page of S3 keys
+        Returns:
+            List[str]: files that were not processed, in the given order. If the database can't be queried, no file is
+                returned so nothing is indexed twice.
+        """
+        unknown = []
+        with self._lock:
+            for file in files:
+                if file in self._read_files:
+                    self._read_files.move_to_end(file)
+                else:
+                    unknown.append(file)
+        if not unknown:
+            return []
         try:
-            self._cursor.execute("SELECT file_name FROM files where file_name = ?", (file,))
-            entry = self._cursor.fetchone()
-            return entry != None
+            conn = self._connection()
+            read = set()
+            for start in range(0, len(unknown), self._BATCH_SIZE):
+                batch = unknown[start:start + self._BATCH_SIZE]
+                query = "SELECT file_name FROM files WHERE file_name IN ({})".format(",".join("?" * len(batch)))
+                read.update(file_name for (file_name,) in conn.execute(query, batch))
         except Exception:
             import traceback
             traceback.print_exc()
-        return True
\ No newline at end of file
+            return []
+        self._remember(read)
+        return [file for file in unknown if file not in read]
@@ -1,40 +1,123 @@
+import os
+import time
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 import boto3
-from botocore.exceptions import NoCredentialsError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+from src.ConfigManager.ConfigManager import ConfigManager
+from src.FileTransferManager.UploadResult import UploadResult
+from src.Metrics.Metrics import Metrics
 
 
 
 class FileUploader:
     """
     Class to manage file transfer between server and cloud storage using AWS S3. The objective is to store all collected logs in buckets in AWS so tehy will be acessed by ElasticSearch
+    Files over S3.upload.multipartThreshold are sent in parts of S3.upload.multipartChunkSize bytes, S3.upload.maxConcurrency at a time.
+    Uploads can be run in the background (upload_async), so the caller can do something else, like indexing the same entries, in the meantime.
+    Failures that may not happen again (see UploadResult.retryable, e.g. SlowDown or a connection error) are retried up to
+    S3.upload.maxRetries times, waiting S3.upload.retryBackoffSeconds (doubled at every retry). Uploads that still failed are
+    counted in logaggregator_upload_failures_total, by error code.
     """    
     
     _instance = None
     
-    def __new__(cls):
+    def __new__(cls, config_manager: ConfigManager = None):
         if not cls._instance:
             cls._instance = super(FileUploader, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        self._s3_client = boto3.client('s3')
+    def __init__(self, config_manager: ConfigManager = None):
+        """
+        Args:
+            config_manager (ConfigManager): configuration with the S3 section. Without it, boto3 defaults are used.
+        """
+        s3_config = config_manager.config.get("S3", {}) if config_manager else {}
+        upload_config = s3_config.get("upload", {})
+        self._transfer_config = TransferConfig(multipart_threshold=upload_config.get("multipartThreshold", 8388608),
+                                               multipart_chunksize=upload_config.get("multipartChunkSize", 8388608),
+                                               max_concurrency=upload_config.get("maxConcurrency", 10))
+        self._max_retries = upload_config.get("maxRetries", 3)
+        self._retry_backoff = upload_config.get("retryBackoffSeconds", 0.5)
+        workers = upload_config.get("workers", 4)
+        #every part being sent by every upload needs its own connection
+        self._s3_client = boto3.client('s3', endpoint_url=s3_config.get("endpointUrl"),
+                                       config=Config(max_pool_connections=max(10, workers * self._transfer_config.max_request_concurrency)))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-upload")
     
     
     def get_instance(cls):
         return cls._instance
     
-    def transfer_file(self, file_path, bucket_name, object_name):
+    def transfer_file(self, file_path, bucket_name, object_name) -> UploadResult:
         """
         Transfer a file to a bucket in AWS S3
         :param: file_path: str: path of file to be transfered
         :param: bucket_name: str: name of the bucket in S3
         :param: object_name: str: name of the object in the bucket (defaults to the file name if not specified)
+        :return: UploadResult: outcome of the upload. Errors are reported in the result instead of being raised.
         """
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            result = self._transfer_once(file_path, bucket_name, object_name)
+            if not result.retryable or attempt >= self._max_retries:
+                break
+            time.sleep(self._retry_backoff * 2 ** attempt)
+            attempt += 1
+        result.attempts = attempt + 1
+        result.elapsed_seconds = time.perf_counter() - start
+        if not result.success:
+            Metrics.increment("logaggregator_upload_failures_total", error_code=result.error_code)
+        return result
+
+    def _transfer_once(self, file_path, bucket_name, object_name) -> UploadResult:
+        object_name = object_name or os.path.basename(file_path)
+        result = {
+            "file_path": file_path,
+            "bucket_name": bucket_name,
+            "object_name": object_name,
+            "success": False
+        }
+        start = time.perf_counter()
         try:
-            self._s3_client.upload_file(file_path, bucket_name, object_name)
-            print("File transfered successfully")
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(file_path)
+            self._s3_client.upload_file(file_path, bucket_name, object_name, Config=self._transfer_config)
+            result["success"] = True
+            Metrics.increment("logaggregator_bytes_sent_total", os.path.getsize(file_path), destination="s3")
         except FileNotFoundError:
-            print("The file was not found")
+            result.update(error_code="FileNotFound", error="The file {} was not found".format(file_path))
         except NoCredentialsError:
-            print("Credentials not available")
+            result.update(error_code="NoCredentials", error="Credentials not available")
+        except ClientError as e:
+            result.update(self._client_error(e), error=str(e))
         except Exception as e:
-            print(f"An error occurred: {e}")
\ No newline at end of file
+            #upload_file wraps the S3 errors (e.g. AccessDenied) in S3UploadFailedError, chained to the original one
+            cause = e.__cause__ or e.__context__
+            if isinstance(cause, ClientError):
+                result.update(self._client_error(cause), error=str(e))
+            else:
+                #e.g. EndpointConnectionError, possibly wrapped as well
+                result.update(error_code=type(cause if isinstance(cause, BotoCoreError) else e).__name__, error=str(e))
+        result["elapsed_seconds"] = time.perf_counter() - start
+        Metrics.observe_stage("s3_upload", result["elapsed_seconds"])
+        return UploadResult(**result)
+
+    @staticmethod
+    def _client_error(error: ClientError) -> dict:
+        """Code and HTTP status of an error returned by S3"""
+        return {
+            "error_code": error.response.get("Error", {}).get("Code"),
+            "status_code": error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        }
+
+    def upload_async(self, file_path, bucket_name, object_name) -> Future:
+        """
+        Transfers the file in a background thread. Same parameters as transfer_file.
+        :return: Future: resolves to the UploadResult of the upload
+        """
+        #in the context of the caller, so the upload is accounted to the request being served (see Metrics.request_stages)
+        return self._executor.submit(contextvars.copy_context().run, self.transfer_file, file_path, bucket_name, object_name)
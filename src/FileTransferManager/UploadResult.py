@@ -0,0 +1,29 @@
+from typing import Optional
+from pydantic import BaseModel
+
+#failures that may not happen again: throttling and server errors reported by S3, and the connection errors of botocore
+TRANSIENT_ERROR_CODES = frozenset({
+    "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException", "RequestTimeout",
+    "InternalError", "ServiceUnavailable", "503",
+    "EndpointConnectionError", "ConnectionClosedError", "ConnectTimeoutError", "ReadTimeoutError", "ProxyConnectionError",
+    "ConnectionError"
+})
+
+class UploadResult(BaseModel):
+    file_path: str #local path of the uploaded file
+    bucket_name: str #bucket the file was uploaded to
+    object_name: str #key of the object in the bucket
+    success: bool #whether the object was stored in S3
+    error_code: Optional[str] = None #cause of the failure: FileNotFound, NoCredentials, the code returned by S3 (e.g. AccessDenied) or the name of the error (e.g. EndpointConnectionError)
+    status_code: Optional[int] = None #HTTP status of the response of S3, if there was one
+    error: Optional[str] = None #description of the failure
+    elapsed_seconds: float = 0 #time spent uploading the file, retries included
+    attempts: int = 1 #amount of times the upload was tried
+
+    @property
+    def retryable(self) -> bool:
+        """
+        Whether uploading the same file again may succeed: only transient failures (throttling, 5xx, timeouts and connection
+        errors). Others, e.g. NoSuchBucket or InvalidAccessKeyId, would fail again.
+        """
+        return not self.success and (self.error_code in TRANSIENT_ERROR_CODES or (self.status_code or 0) >= 500)
@@ -0,0 +1,28 @@
+import json
+try:
+    import orjson
+except ImportError:
+    #orjson is optional: install it to speed up the JSON encoding and decoding of log entries
+    orjson = None
+
+
+if orjson is not None:
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+    _loads = orjson.loads
+else:
+    _dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    _loads = json.loads
+
+
+class JsonBackend:
+    """
+    JSON encoder/decoder used in the ingestion hot path. It uses orjson when it's installed and falls back to the standard
+    library otherwise. Both produce compact JSON with non-ASCII characters kept as is, the same layout as pydantic's
+    model_dump_json().
+    """
+
+    accelerated = orjson is not None
+    name = "orjson" if orjson is not None else "json"
+    dumps = staticmethod(_dumps)
+    loads = staticmethod(_loads)
@@ -1,6 +1,8 @@
 from typing import List
+from functools import lru_cache
 import json
 from json import JSONDecodeError
+from src.Formatter.JsonBackend import JsonBackend
 
 class NewlineDelimitedJSON:
     """
@@ -34,4 +36,29 @@ class NewlineDelimitedJSON:
             except JSONDecodeError:
                 continue
                 #raise JSONDecodeError("Invalid JSON: {}".format(log_entry), log_entry)
-        return "".join(payload)
\ No newline at end of file
+        return "".join(payload)
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def action_line(index: str) -> str:
+        """
+        Bulk action line that indexes the following document in index. Computed once per index.
+        """
+        return JsonBackend.dumps({"index": {"_index": index}}) + "\n"
+
+    @staticmethod
+    def bulk_body(logs: List[str], index: str) -> bytes:
+        """
+        Builds the bulk request body for documents that are already valid JSON, such as the ones produced by LogParser.
+        Unlike ndjson, the documents are not parsed again: the body is built with a single join over the precomputed action line.
+
+        Args:
+            logs (List[str]): JSON documents, each one terminated by a newline
+
+        Returns:
+            bytes: UTF-8 encoded body, alternating the action line and each document
+        """
+        if not logs:
+            return b""
+        action = NewlineDelimitedJSON.action_line(index)
+        return (action + action.join(logs)).encode("utf-8")
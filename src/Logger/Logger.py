@@ -1,12 +1,25 @@
 """Class to log messages from different sources into a cloud solution"""
 import json
 import os
+import itertools
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from pydantic import ValidationError
 from src.LogEntry.LogEntry import LogEntry
+from src.Parser.LogParser import LogParser
+from src.Utils import Compression
 from src.FileTransferManager.FileUploader import FileUploader
 from src.ConfigManager.ConfigManager import ConfigManager
 from src.FileTransferManager.ElasticConnector import ElasticConnector
+from src.FileTransferManager.BulkIndexer import BulkChunksError
+from src.Logger.ShippingQueue import ShippingQueue
+from src.Logger.RollingBuffer import RollingBuffer, RolloverError
+from src.Spool.Spool import Spool
+from src.Spool.SpoolReplayer import SpoolReplayer
+from src.Metrics.Metrics import Metrics
 
 class Logger:   
     def __init__(self, file_transfer_manager: FileUploader, config: ConfigManager, elastic_connector: ElasticConnector):
@@ -17,20 +30,64 @@ class Logger:
         self._start_date = datetime.now(timezone.utc)
         #autoincrement ID to denote the i'th logfile of the day
         self._sequential_id = 1
+        #the file name allocation must not be shared by two shipping workers
+        self._flush_lock = threading.Lock()
+        #set by servers that ship the batches themselves (e.g. the asyncio server), see set_dispatcher
+        self._dispatcher = None
+        #called with every batch accepted, see add_listener
+        self._listeners = []
+        #opt-in asynchronous mode: the request returns once the parsed batch is queued, workers ship it to S3 and Elasticsearch.
+        async_config = self._config.config["logs"].get("async", {})
+        self._shipping_queue = None
+        if async_config.get("enabled", False):
+            self._shipping_queue = ShippingQueue(self._ship,
+                                                 queue_size=async_config.get("queueSize", 1000),
+                                                 workers=async_config.get("workers", 2),
+                                                 put_timeout=async_config.get("enqueueTimeout", 0))
+        #opt-in rollover: entries from many requests are grouped into one file, S3 object and bulk request.
+        rollover_config = self._config.config["logs"].get("rollover", {})
+        self._rolling_buffer = None
+        if rollover_config.get("enabled", False):
+            self._rolling_buffer = RollingBuffer(self._dispatch_rollover,
+                                                 max_bytes=rollover_config.get("maxBytes", 5242880),
+                                                 max_entries=rollover_config.get("maxEntries", 10000),
+                                                 max_age=rollover_config.get("maxAgeSeconds", 5),
+                                                 max_buffered_bytes=rollover_config.get("maxBufferedBytes", 52428800))
+        #opt-in streaming: large payloads are read in chunks and shipped in bounded units instead of being buffered whole.
+        streaming_config = self._config.config["logs"].get("streaming", {})
+        self._streaming = streaming_config.get("enabled", False)
+        self._stream_chunk_bytes = streaming_config.get("chunkBytes", 65536)
+        self._stream_unit_lines = streaming_config.get("unitLines", 10000)
+        #opt-in spool: entries are stored on local disk before the client is acknowledged and shipped from there by a
+        #background replayer, which keeps retrying while S3 or Elasticsearch are down.
+        spool_config = self._config.config["logs"].get("spool", {})
+        self._spool = None
+        self._spools = []
+        self._spool_replayers = []
+        if spool_config.get("enabled", False):
+            self._open_spools(os.path.join(Path(__file__).parent.parent, spool_config.get("path", "spool")), spool_config)
+        Metrics.register_gauge("logaggregator_queue_depth", self.queue_depth, queue="shipping")
+        Metrics.register_gauge("logaggregator_queue_depth", self.rollover_pending, queue="rollover")
+        Metrics.register_gauge("logaggregator_spool_pending_bytes", self.spool_pending_bytes)
             
     def log(self, header, payload: bytes):
         """
         Method to generate the log file and send it to the corresponding S3 bucket. If successful, the file is deleted from the server.
-        Otherwise it is stored in a queue for processing later.
+        Otherwise it is kept in the server.
+        With the spool enabled (logs.spool.enabled), the payload is stored on local disk and shipped by a background replayer,
+        which retries until S3 and Elasticsearch are reachable. The spool takes precedence over rollover and asynchronous mode.
+        In asynchronous mode (logs.async.enabled in config.json), this method returns as soon as the parsed payload is queued.
+        With rollover enabled (logs.rollover.enabled), the payload is added to a buffer that is shipped once it's big or old enough.
+        The buffer keeps the entries of the rollovers that failed, up to logs.rollover.maxBufferedBytes.
         Args:
             header (flask.Request): Flask header of the request that was received by LogAggregatror
             payload (bytes): Payload of the logged file to be pushed to S3
+        Raises:
+            queue.Full: in asynchronous mode, if the shipping queue has no room for the payload, or with rollover, if the
+            buffer is full.
         """
         try:
             parsed_payload = self.__parse(header, payload)
-            file_name = self.flush(parsed_payload)
-            self._delete_file(file_name)
-            self._elastic_connector.create_document(file_name, parsed_payload)
         except ValueError as exc:
             raise ValueError("Empty payload received") from exc
         # except exceptions.ClientError as e:
@@ -39,72 +96,343 @@ class Logger:
         #     import traceback
         #     traceback.print_exc()
         #     raise Exception(e.args)
+        self._accept(parsed_payload)
+
+    def log_stream(self, header, stream):
+        """
+        Streaming counterpart of log: the payload is read from the stream in chunks and cut into units of at most
+        logs.streaming.unitLines lines, each one parsed and shipped on its own (one file, S3 object and bulk request per unit),
+        so the memory used does not depend on the size of the payload.
+        Units are shipped as soon as they're parsed: if a line is invalid, the units before it were already accepted.
+        Args:
+            header (flask.Request): Flask header of the request that was received by LogAggregatror
+            stream (BinaryIO): stream with the payload (e.g. flask.Request.stream)
+        Returns:
+            int: amount of log entries accepted
+        """
+        lines = LogParser.iter_lines(stream, self._stream_chunk_bytes)
+        accepted = 0
+        while True:
+            unit = list(itertools.islice(lines, self._stream_unit_lines))
+            if not unit:
+                break
+            with Metrics.stage_timer("parse"):
+                parsed_payload = self._parse_documents(header, unit)
+            if parsed_payload:
+                self._accept(parsed_payload)
+                accepted += len(parsed_payload)
+        if not accepted:
+            raise ValueError("Empty payload received")
+        return accepted
+
+    @property
+    def streaming(self) -> bool:
+        """Whether payloads should be handed to log_stream instead of log (logs.streaming.enabled)"""
+        return self._streaming
+
+    def _accept(self, parsed_payload):
+        """
+        Appends the parsed payload to the spool or adds it to the rolling buffer, if enabled, or dispatches it right away.
+        The listeners are notified afterwards.
+        """
+        if self._spool:
+            self._spool.append(parsed_payload)
+        elif self._rolling_buffer:
+            self._rolling_buffer.add(parsed_payload)
+        else:
+            self._dispatch(parsed_payload)
+        for listener in self._listeners:
+            try:
+                listener(parsed_payload)
+            except Exception as e:
+                #the entries were accepted already: a listener must not fail the request
+                print("Error upon notifying listener {} of {} log entries: {}".format(listener, len(parsed_payload), e))
+
+    def _open_spools(self, root: str, spool_config: dict):
+        """
+        Opens the spool of this process, in root/<pid> so that worker processes don't write over each other's segments, and
+        adopts the spools left under root by processes that exited: they're drained by replayers of their own and removed.
+        """
+        own = os.path.join(root, str(os.getpid()))
+        self._spool = Spool(own,
+                            segment_bytes=spool_config.get("segmentBytes", 67108864),
+                            sync=spool_config.get("sync", True),
+                            sync_interval=spool_config.get("syncIntervalMs", 10) / 1000)
+        self._spools.append(self._spool)
+        for path in Spool.leftovers(root, own):
+            try:
+                self._spools.append(Spool(path, segment_bytes=spool_config.get("segmentBytes", 67108864), sync=False))
+            except BlockingIOError:
+                #still used by a running process, or adopted by another one in the meantime
+                continue
+            print("Adopted spool {}, left by a process that exited".format(path))
+        for spool in self._spools:
+            self._spool_replayers.append(SpoolReplayer(spool, self._ship_spooled,
+                                                       batch_bytes=spool_config.get("batchBytes", 5242880),
+                                                       retry_backoff=spool_config.get("retryBackoffSeconds", 1),
+                                                       max_backoff=spool_config.get("maxBackoffSeconds", 60),
+                                                       drain=spool is not self._spool))
+
+    def _dispatch(self, parsed_payload, wait: bool = False):
+        """
+        Ships the payload in the request thread, or queues it for the shipping workers in asynchronous mode.
+        If a dispatcher was set, the payload is handed to it instead.
+        """
+        if self._dispatcher:
+            self._dispatcher(parsed_payload, wait=wait)
+        elif self._shipping_queue:
+            self._shipping_queue.submit(parsed_payload, wait=wait)
+        else:
+            self._ship(parsed_payload)
+
+    def _dispatch_rollover(self, batch):
+        """
+        Ships a batch produced by the rolling buffer, whose entries were already acknowledged to the clients.
+        In synchronous mode it's shipped like a spooled batch (see _ship_spooled): if it fails, only the entries that were not
+        indexed are put back in the buffer, with a RolloverError, and a file that was not uploaded is kept in the server.
+        In asynchronous mode (or with a dispatcher) it's handed over, waiting for room in the queue instead of refusing it.
+        A failure of the shipping workers is only reported from then on, so rollover is at-most-once there.
+        """
+        if self._dispatcher or self._shipping_queue:
+            self._dispatch(batch, wait=True)
+            return
+        state = {}
+        try:
+            self._ship_spooled(batch, state)
+        except Exception as exc:
+            raise RolloverError(exc, state.get("pending", batch)) from exc
+
+    def _ship(self, parsed_payload):
+        """
+        Writes the parsed payload to a file, uploads it to S3 and indexes it in Elasticsearch.
+        Args:
+            parsed_payload (List[str]): JSON log entries produced by the parser
+        """
+        file_name, upload = self.stage(parsed_payload)
+        try:
+            self._elastic_connector.create_document(self._elastic_connector.index_name(file_name), parsed_payload)
+        finally:
+            self.handle_upload(upload.result())
+
+    def _ship_spooled(self, parsed_payload, state: dict):
+        """
+        Shipping function of the SpoolReplayer and of the synchronous rollovers. Unlike _ship, it raises if the file was not stored in S3 or if any entry
+        was not indexed because of a transient error, so the batch is not committed. What succeeded is recorded in state,
+        which is kept across the attempts of the batch: the file is written again under the same name (so the same S3 object
+        is overwritten instead of adding one) until it's uploaded, and only the entries not indexed yet are sent again.
+        Entries that Elasticsearch rejects for good (e.g. mapper_parsing_exception) are dead-lettered: reported, counted in
+        logaggregator_documents_dead_lettered_total and not sent again, so they don't block the spool. They're still in
+        the file stored in S3.
+        """
+        upload = None
+        if not state.get("uploaded"):
+            state["file_name"], upload = self.stage(parsed_payload, state.get("file_name"))
+        file_name = state["file_name"]
+        try:
+            pending = state.setdefault("pending", parsed_payload)
+            if pending:
+                self._index_spooled(file_name, pending, state)
+        finally:
+            if upload:
+                upload_result = upload.result()
+                self.handle_upload(upload_result)
+                state["uploaded"] = upload_result.success
+        if state["pending"]:
+            raise Exception("Error upon indexing {}: {} of {} log entries were not indexed".format(file_name, len(state["pending"]),
+                                                                                                len(parsed_payload)))
+        if not state["uploaded"]:
+            raise Exception("Error upon uploading {} to S3 ({}): {}".format(upload_result.object_name, upload_result.error_code,
+                                                                            upload_result.error))
+
+    def _index_spooled(self, file_name: str, documents: List[str], state: dict):
+        """
+        Indexes the documents of a spooled batch, leaving in state["pending"] those to be sent again: the ones of the chunks
+        that failed as a whole and the ones rejected with a transient error.
+        Raises:
+            BulkChunksError: if chunks failed as a whole
+        """
+        try:
+            result, error = self._elastic_connector.create_document(self._elastic_connector.index_name(file_name), documents), None
+            state["pending"] = result["retryable"]
+        except BulkChunksError as exc:
+            result, error = exc.result, exc
+            state["pending"] = exc.documents + result["retryable"]
+        dead_lettered = result["failed"] - len(result["retryable"])
+        if dead_lettered:
+            Metrics.increment("logaggregator_documents_dead_lettered_total", dead_lettered)
+            print("{} log entries of {} were rejected by Elasticsearch and won't be indexed: {}".format(dead_lettered, file_name,
+                                                                                                     result["errors"]))
+        if error:
+            raise error
+
+    def add_listener(self, listener: Callable[[List[str]], None]):
+        """
+        Calls listener(batch) with the JSON log entries of every batch accepted, in the request thread, once they're
+        spooled, buffered or dispatched. Listeners must be quick, as the client waits for them.
+        """
+        self._listeners.append(listener)
+
+    def set_dispatcher(self, dispatcher: Callable[..., None]):
+        """
+        Hands the parsed batches to dispatcher(batch, wait=...) instead of shipping them here. It must either accept the batch
+        or raise queue.Full (only when wait is False), like ShippingQueue.submit.
+        """
+        self._dispatcher = dispatcher
+
+    def stage(self, parsed_payload, file_name: str = None) -> Tuple[str, Future]:
+        """
+        Writes the parsed payload to a file and starts uploading it to S3 in the background, so the file is uploaded
+        while its entries are indexed in Elasticsearch.
+        Args:
+            file_name (str): name of the file, e.g. to write a batch again under the name it was given the first time.
+                Defaults to a new name, see flush.
+        Returns:
+            tuple: name of the file flushed and the future of its upload, to be handed to handle_upload once done
+        """
+        file_name = self.flush(parsed_payload, upload=False, file_name=file_name)
+        object_name = file_name + Compression.extension(self._config.config["logs"].get("compression"))
+        upload = self._file_transfer_manager.upload_async(self._log_file_path(object_name), self._config.config["S3"]["bucketName"],
+                                                          object_name)
+        return file_name, upload
+
+    def handle_upload(self, result):
+        """
+        Removes the local file once it's stored in S3. Otherwise the file is kept in the server, so it's not lost.
+        Args:
+            result (UploadResult): outcome of the upload of the file
+        """
+        if result.success:
+            self._delete_file(result.file_path)
+        else:
+            print("Error upon uploading {} to S3 ({}, {} attempts): {}. The file was kept in the server".format(
+                result.object_name, result.error_code, result.attempts, result.error))
+
+    def queue_depth(self) -> int:
+        """Amount of batches waiting to be shipped. Always 0 in synchronous mode."""
+        return self._shipping_queue.depth() if self._shipping_queue else 0
+
+    def rollover_pending(self) -> int:
+        """Amount of entries waiting for the next rollover. Always 0 without rollover."""
+        return self._rolling_buffer.pending() if self._rolling_buffer else 0
+
+    def spool_pending_bytes(self) -> int:
+        """Bytes of the entries in the spools (its own and the adopted ones) that were not shipped yet. Always 0 without spool."""
+        return sum(spool.pending_bytes() for spool in self._spools)
+
+    def close(self):
+        """
+        Ships whatever is still buffered or queued and stops the background threads (no-op in synchronous mode).
+        Entries still in the spool are kept on disk and shipped the next time the Logger starts, or by another process that
+        adopts the spool.
+        """
+        if self._spool:
+            for replayer in self._spool_replayers:
+                replayer.stop()
+            for spool in self._spools:
+                spool.close()
+            self._spool = None
+            self._spools = []
+            self._spool_replayers = []
+        if self._rolling_buffer:
+            self._rolling_buffer.close()
+            self._rolling_buffer = None
+        if self._shipping_queue:
+            self._shipping_queue.stop()
+            self._shipping_queue = None
 
     def __parse(self, header, message: bytes):
         """
         Args:
             message (bytes): message to be parsed into a dictionary
         """
-        parsed_message = []
-        message = str(message, encoding='utf-8').split("\n")
-        try:
-            for log_row in message:
-                if not log_row:
-                    break
-                log_row = log_row.split("-")
-                year, month = log_row[0:2]
-                day, time = log_row[2].split(" ")[:-1]
-                date = "{}-{}-{}".format(year, month, day)
-                #remove any extra blank spaces that parts of the message can have:
-                log_row = [row.strip(" ") for row in log_row]
-                parsed_message.append(
-                    LogEntry(
-                        application_server_ip=header.remote_addr,
-                        application_id=log_row[4],
-                        date=date,
-                        time=time,
-                        client_ip=log_row[3],
-                        level=log_row[5],
-                        method=log_row[6],
-                        component=log_row[7],
-                        message=log_row[8]
-                    ).model_dump_json() + '\n'
-                )
-        except ValueError as e:
-            raise ValueError("Error when parsing message {} : {}".format(log_row, e))
-        # except ValidationError as e:
-        #     e.add_note(e.json)
-        #     raise ValidationError.add_note(e.json())
-        if not parsed_message:
+        text = str(message, encoding='utf-8')
+        #JSON strings may hold line separators other than \n (e.g. U+2028), which splitlines would break
+        lines = text.split("\n") if self._is_ndjson(header) else text.splitlines()
+        with Metrics.stage_timer("parse"):
+            documents = self._parse_documents(header, lines)
+        if not documents:
             raise ValueError("Empty payload received")
-        return parsed_message
+        return documents
+
+    def _parse_documents(self, header, lines: List[str]) -> List[str]:
+        """
+        Parses the lines of a request into JSON documents: JSON lines (Content-Type application/x-ndjson) are checked and
+        kept as they were sent, see LogParser.parse_ndjson, text lines are parsed and serialized.
+        """
+        if self._is_ndjson(header):
+            return self._parse_lines(header.remote_addr, lines, LogParser.parse_ndjson)
+        return LogParser.serialize(self._parse_lines(header.remote_addr, lines))
+
+    @staticmethod
+    def _is_ndjson(header) -> bool:
+        return header.mimetype == "application/x-ndjson"
+
+    @staticmethod
+    def _parse_lines(application_server_ip: str, lines: List[str], parse: Callable = LogParser.parse) -> list:
+        """
+        LogParser.parse (or the given parser), counting the lines accepted and the lines refused along with an invalid one.
+        """
+        try:
+            rows = parse(application_server_ip, lines)
+        except (ValueError, ValidationError):
+            Metrics.increment("logaggregator_lines_rejected_total", len(lines))
+            raise
+        Metrics.increment("logaggregator_lines_accepted_total", len(rows))
+        return rows
 
-    def flush(self, log_entry: LogEntry):
+    def flush(self, log_entry: LogEntry, upload: bool = True, file_name: str = None):
         """
         Flushes the file to a temporary log file with name considering the current timestamp and how many files were created with this timestamp
+        If logs.compression is set (gzip or zstd), the file is compressed and its extension (.gz or .zst) is added to the name
+        of the file and of the S3 object, but not to the returned name.
 
         Args:
             log_entry (LogEntry): _description_
+            upload (bool): whether the file is uploaded to S3 before returning
+            file_name (str): name of the file, overwritten if it exists. Defaults to a new name.
         """
         log_creation_date = datetime.now(timezone.utc)
+        compression = self._config.config["logs"].get("compression")
+        extension = Compression.extension(compression)
+        if file_name:
+            log_files_path = self._log_file_path(file_name + extension)
+        else:
+            file_name, log_files_path = self._allocate_file_name(log_creation_date, extension)
+        # try:
+        with Metrics.stage_timer("file_write"):
+            with Compression.open_text(log_files_path, compression) as f:
+                f.writelines(log_entry)
+        if upload:
+            result = self._file_transfer_manager.transfer_file(log_files_path, self._config.config["S3"]["bucketName"], file_name + extension)
+            if not result.success:
+                print("Error upon uploading {} to S3 ({}, {} attempts): {}".format(result.object_name, result.error_code, result.attempts,
+                                                                                   result.error))
+        return file_name
+
+    def _allocate_file_name(self, log_creation_date: datetime, extension: str) -> Tuple[str, str]:
+        """
+        Returns:
+            tuple: name and local path of a log file that does not exist yet
+        """
         date = log_creation_date.strftime("%Y-%m-%d")
-        time = log_creation_date.strftime("%H:%M:%S")
-        if self._start_date.strftime("%Y-%m-%d") != date:
-            #different date as of previous logs: reset id and date
-            self._start_date = date
-            self._sequential_id = 1
-        file_name = "logaggregator_{}_{}.log".format(date, self._sequential_id)
-        log_files_path = os.path.join(Path(__file__).parent.parent, self._config.config["logs"]["path"], file_name)
-        while os.path.isfile(Path(__file__).parent.parent.parent.joinpath("{}{}".format(log_files_path,file_name))):
-            self._sequential_id += 1
+        with self._flush_lock:
+            if self._start_date.strftime("%Y-%m-%d") != date:
+                #different date as of previous logs: reset id and date
+                self._start_date = log_creation_date
+                self._sequential_id = 1
             file_name = "logaggregator_{}_{}.log".format(date, self._sequential_id)
-            log_files_path = os.path.join(Path(__file__).parent.parent, self._config.config["logs"]["path"], file_name)
-        # try:
-        with open(log_files_path, "wt", encoding='utf-8') as f:
-            f.writelines(log_entry)
+            log_files_path = self._log_file_path(file_name + extension)
+            while os.path.isfile(log_files_path):
+                self._sequential_id += 1
+                file_name = "logaggregator_{}_{}.log".format(date, self._sequential_id)
+                log_files_path = self._log_file_path(file_name + extension)
             self._sequential_id += 1
-        self._file_transfer_manager.transfer_file(log_files_path, self._config.config["S3"]["bucketName"], file_name)
-        return file_name 
+        return file_name, log_files_path
+
+    def _log_file_path(self, object_name: str) -> str:
+        """Path of the local copy of the log file uploaded as object_name"""
+        return os.path.join(Path(__file__).parent.parent, self._config.config["logs"]["path"], object_name)
+
     def _delete_file(self, file_name: str):
         try:
             os.remove(file_name)
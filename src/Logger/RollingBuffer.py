@@ -0,0 +1,147 @@
+"""Rolling buffer that groups the logs received in many requests into a single file, S3 object and bulk request"""
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, List
+from src.Metrics.Metrics import Metrics
+
+
+class RolloverError(Exception):
+    """
+    A rollover failed after some of its entries were shipped. Carries the entries that were not, which are the only ones
+    put back in the buffer.
+    """
+
+    def __init__(self, error: Exception, entries: List[str]):
+        super().__init__(str(error))
+        self.error = error
+        self.entries = entries
+
+
+class RollingBuffer:
+    """
+    Collects parsed log entries from several requests and hands them over as a single batch when the first of the
+    following thresholds is reached:
+        - max_bytes: total size of the serialized entries in the buffer;
+        - max_entries: amount of entries in the buffer;
+        - max_age: seconds elapsed since the oldest entry in the buffer was added.
+    Size-based rollovers happen in the thread that adds the entries, while age-based rollovers are done by a background
+    timer thread, so a quiet buffer is never kept for longer than max_age seconds.
+    If a rollover fails (e.g. Elasticsearch is down), the batch is put back at the head of the buffer, as its entries were
+    already acknowledged, and the next rollover is not tried before max_age seconds. A RolloverError puts back only the
+    entries it carries. While rollovers keep failing, the buffer grows up to max_buffered_bytes, past which new entries are
+    refused.
+    """
+
+    def __init__(self, rollover: Callable[[List[str]], None], max_bytes: int = 5242880, max_entries: int = 10000,
+                 max_age: float = 5, max_buffered_bytes: int = 52428800):
+        """
+        Args:
+            rollover (Callable): function that receives each full batch (e.g. the Logger dispatcher).
+            max_bytes (int): size of the serialized entries that triggers a rollover.
+            max_entries (int): amount of entries that triggers a rollover.
+            max_age (float): age in seconds of the oldest entry that triggers a rollover.
+            max_buffered_bytes (int): size of the serialized entries kept at most, e.g. while rollovers fail.
+        """
+        if max_bytes <= 0 or max_entries <= 0 or max_age <= 0:
+            raise ValueError("Rollover thresholds must be positive")
+        self._rollover = rollover
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._max_buffered_bytes = max_buffered_bytes
+        self._lock = threading.Lock()
+        self._entries = []
+        self._size = 0
+        self._oldest = None
+        #no rollover is tried before this time, set when one fails
+        self._retry_at = 0
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._watch_age, name="log-rollover-timer", daemon=True)
+        self._timer.start()
+
+    def add(self, entries: List[str]):
+        """
+        Adds the entries to the buffer, rolling it over if any of the size thresholds is reached.
+        Args:
+            entries (List[str]): serialized log entries
+        Raises:
+            queue.Full: if the buffer holds max_buffered_bytes already
+        """
+        batch = None
+        size = sum(len(entry) for entry in entries)
+        with self._lock:
+            if self._entries and self._size + size > self._max_buffered_bytes:
+                raise queue.Full("The rollover buffer holds {} bytes already".format(self._size))
+            if not self._entries:
+                self._oldest = time.monotonic()
+            self._entries.extend(entries)
+            self._size += size
+            if (self._size >= self._max_bytes or len(self._entries) >= self._max_entries) and time.monotonic() >= self._retry_at:
+                batch = self._take()
+        #the rollover does I/O, so it's done out of the lock to let other requests keep filling the buffer.
+        if batch:
+            try:
+                self._roll(*batch)
+            except Exception:
+                #the entries of this request are kept in the buffer like the others, so it's not refused
+                traceback.print_exc()
+
+    def flush(self):
+        """
+        Rolls over whatever is in the buffer, regardless of the thresholds.
+        Raises:
+            Exception: the error of the rollover, whose entries were put back in the buffer
+        """
+        with self._lock:
+            batch = self._take()
+        if batch[0]:
+            self._roll(*batch)
+
+    def pending(self) -> int:
+        """Amount of entries waiting for the next rollover"""
+        return len(self._entries)
+
+    def close(self):
+        """Stops the timer thread and rolls over the remaining entries"""
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+
+    def _take(self) -> tuple:
+        """Empties the buffer. Returns its entries, their size and when the oldest one was added."""
+        batch = (self._entries, self._size, self._oldest)
+        self._entries = []
+        self._size = 0
+        self._oldest = None
+        return batch
+
+    def _roll(self, entries: List[str], size: int, oldest: float):
+        try:
+            self._rollover(entries)
+        except Exception as exc:
+            Metrics.increment("logaggregator_rollover_failures_total")
+            if isinstance(exc, RolloverError):
+                entries = exc.entries
+                size = sum(len(entry) for entry in entries)
+            with self._lock:
+                #ahead of the entries added in the meantime, so the order is kept
+                self._entries = entries + self._entries
+                self._size += size
+                self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+                self._retry_at = time.monotonic() + self._max_age
+            raise
+
+    def _watch_age(self):
+        #checking a few times per max_age bounds how late an age-based rollover can be.
+        interval = min(self._max_age / 4, 1)
+        while not self._closed.wait(interval):
+            oldest = self._oldest
+            now = time.monotonic()
+            if oldest is None or now - oldest < self._max_age or now < self._retry_at:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
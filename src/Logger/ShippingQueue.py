@@ -0,0 +1,84 @@
+"""Bounded in-process queue used to ship parsed logs to S3 and Elasticsearch outside of the HTTP request"""
+import queue
+import threading
+import traceback
+from typing import Callable, List
+
+
+class ShippingQueue:
+    """
+    Decouples the reception of the logs from their shipping. The request thread only puts the parsed batch in a bounded queue
+    and a pool of worker threads is responsible for writing the file, uploading it to S3 and indexing it in Elasticsearch.
+    If the queue is full, the producer is blocked for at most put_timeout seconds before queue.Full is raised, so the caller
+    can refuse the request instead of piling up logs in memory.
+    """
+
+    _STOP = object()
+
+    def __init__(self, ship: Callable[[List[str]], None], queue_size: int = 1000, workers: int = 2, put_timeout: float = 0):
+        """
+        Args:
+            ship (Callable): function that ships a parsed batch (e.g. Logger._ship). Called from the worker threads.
+            queue_size (int): maximum amount of batches waiting to be shipped.
+            workers (int): amount of worker threads consuming the queue.
+            put_timeout (float): seconds to wait for a free slot when the queue is full. 0 does not wait at all.
+        """
+        if workers < 1:
+            raise ValueError("At least one shipping worker is required")
+        self._ship = ship
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._put_timeout = put_timeout
+        self._workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name="log-shipper-{}".format(i), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, batch: List[str], wait: bool = False):
+        """
+        Enqueues a parsed batch to be shipped by the workers.
+        Args:
+            batch (List[str]): parsed log entries.
+            wait (bool): waits for a free slot for as long as needed instead of honouring put_timeout. Used for batches
+            whose clients were already answered, which can't be refused anymore.
+        Raises:
+            queue.Full: if there's no room in the queue after put_timeout seconds.
+        """
+        if wait:
+            self._queue.put(batch)
+        elif self._put_timeout > 0:
+            self._queue.put(batch, timeout=self._put_timeout)
+        else:
+            self._queue.put_nowait(batch)
+
+    def depth(self) -> int:
+        """Amount of batches waiting to be shipped"""
+        return self._queue.qsize()
+
+    def join(self):
+        """Blocks until every batch submitted so far was processed"""
+        self._queue.join()
+
+    def stop(self, timeout: float = None):
+        """
+        Stops the workers after the batches already in the queue are shipped.
+        Args:
+            timeout (float): maximum time to wait for each worker to finish.
+        """
+        for _ in self._workers:
+            self._queue.put(self._STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _work(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is self._STOP:
+                    return
+                self._ship(batch)
+            except Exception:
+                #the client already received its answer, so the best we can do here is to report the failure.
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
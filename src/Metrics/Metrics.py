@@ -0,0 +1,407 @@
+"""Process-wide registry of the metrics of LogAggregator, rendered in the Prometheus text format"""
+import atexit
+import bisect
+import contextvars
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+
+class Metrics:
+    """
+    Counters, histograms and gauges of LogAggregator.
+    Recording takes no lock: every thread writes to its own shard, which is only read (never written) by the threads that
+    render the metrics. The shards of the threads that exited are folded into a single one when the metrics are rendered.
+    Gauges are callables evaluated when the metrics are rendered (e.g. the depth of a queue).
+    With several worker processes (e.g. gunicorn), every process writes its metrics to <pid>.json in metrics.multiprocessDir
+    every metrics.snapshotIntervalSeconds and /metrics adds up the files of every process, so any worker can be scraped.
+    A worker that exits adds its counters and histograms to exited.json and removes its own file, so the directory only
+    holds the files of the running workers. The files of the workers that died without doing so (e.g. killed) are folded
+    the same way by the next scrape, and not read as the ones of a running worker. The gauges of exited workers are dropped.
+    """
+
+    #seconds
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    _DESCRIPTIONS = {
+        "logaggregator_stage_seconds": ("histogram", "Time spent in each stage of the shipping of the logs"),
+        "logaggregator_request_seconds": ("histogram", "Time to serve a request, from reception to response"),
+        "logaggregator_lines_accepted_total": ("counter", "Log lines parsed and accepted"),
+        "logaggregator_lines_rejected_total": ("counter", "Log lines of the payloads refused because of an invalid line"),
+        "logaggregator_bytes_received_total": ("counter", "Bytes of the payloads received on /log, as sent by the clients"),
+        "logaggregator_bytes_sent_total": ("counter", "Bytes sent to each destination"),
+        "logaggregator_upload_failures_total": ("counter", "Uploads to S3 that failed after every retry, by error code"),
+        "logaggregator_queue_depth": ("gauge", "Items waiting to be shipped in each queue"),
+        "logaggregator_rollover_failures_total": ("counter", "Rollovers that failed, whose entries were put back in the buffer"),
+        "logaggregator_index_failures_total": ("counter", "Log entries that Elasticsearch did not index, at each attempt"),
+        "logaggregator_documents_dead_lettered_total": ("counter", "Log entries rejected for good by Elasticsearch, not sent again (spool and rollover)"),
+        "logaggregator_spool_pending_bytes": ("gauge", "Bytes of the records in the spool not committed yet (shipped or being shipped)"),
+        "logaggregator_token_cache": ("gauge", "Statistics of the cache of verified tokens"),
+        "logaggregator_search_cache": ("gauge", "Statistics of the cache of search results"),
+        "logaggregator_recent_logs": ("gauge", "Entries and bytes retained in the buffer of recent log entries"),
+        "logaggregator_tail_subscribers": ("gauge", "Viewers connected to the live tail"),
+        "logaggregator_tail_skipped_total": ("counter", "Entries of the live tail not delivered to a viewer that did not keep up"),
+        "logaggregator_tail_dropped_total": ("counter", "Viewers of the live tail disconnected for not keeping up"),
+    }
+
+    #stage timings of the request being served, collected only while it's being captured (see RequestProfiler)
+    request_stages = contextvars.ContextVar("request_stages", default=None)
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    #(thread, counters, histograms) of every thread that recorded something
+    _shards = []
+    _retired_counters = {}
+    _retired_histograms = {}
+    _gauges = {}
+    _pid = os.getpid()
+    #held while writing the file of this process, so none is written once the process exits
+    _write_lock = threading.Lock()
+    _EXITED = "exited.json"
+    _directory = None
+    _interval = 5
+    _writer = None
+
+    @classmethod
+    def configure(cls, config: dict):
+        """
+        Applies the metrics section of config.json.
+        Args:
+            config (dict): multiprocessDir (directory shared by the worker processes, None for a single process)
+            and snapshotIntervalSeconds
+        """
+        with cls._lock:
+            cls._interval = config.get("snapshotIntervalSeconds", 5)
+            cls._directory = config.get("multiprocessDir")
+            if cls._directory:
+                os.makedirs(cls._directory, exist_ok=True)
+                cls._restore()
+                cls._start_writer()
+
+    @classmethod
+    def increment(cls, name: str, amount: float = 1, **labels):
+        """Adds the amount to a counter"""
+        counters = cls._shard()[0]
+        key = (name, tuple(labels.items()))
+        counters[key] = counters.get(key, 0) + amount
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels):
+        """Records a value (in seconds) in a histogram"""
+        histograms = cls._shard()[1]
+        key = (name, tuple(labels.items()))
+        histogram = histograms.get(key)
+        if histogram is None:
+            #one count per bucket, plus +Inf and the sum of the values
+            histogram = histograms[key] = [0] * (len(cls.BUCKETS) + 2)
+        histogram[bisect.bisect_left(cls.BUCKETS, value)] += 1
+        histogram[-1] += value
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str, **labels):
+        """Records the time spent in the block in a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, time.perf_counter() - start, **labels)
+
+    @classmethod
+    def observe_stage(cls, stage: str, seconds: float):
+        """Records the time spent in a stage of the shipping of the logs, adding it to the request being captured, if any"""
+        cls.observe("logaggregator_stage_seconds", seconds, stage=stage)
+        stages = cls.request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0) + seconds
+
+    @classmethod
+    @contextmanager
+    def stage_timer(cls, stage: str):
+        """Records the time spent in the block as a stage of the shipping of the logs"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe_stage(stage, time.perf_counter() - start)
+
+    @classmethod
+    def register_gauge(cls, name: str, function: Callable[[], float], **labels):
+        """
+        Registers a gauge, replacing the one with the same name and labels.
+        Args:
+            function (Callable): returns the current value. Called when the metrics are rendered.
+        """
+        cls._gauges[(name, tuple(labels.items()))] = function
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+        Metrics of this process.
+        Returns:
+            dict: "counters", "histograms" and "gauges", each a list of [name, labels, value]
+        """
+        counters, histograms = cls._collect()
+        gauges = []
+        for (name, labels), function in list(cls._gauges.items()):
+            try:
+                gauges.append([name, labels, function()])
+            except Exception as e:
+                print("Error upon reading gauge {}: {}".format(name, e))
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+            "histograms": [[name, labels, value] for (name, labels), value in histograms.items()],
+            "gauges": gauges
+        }
+
+    @classmethod
+    def render(cls) -> str:
+        """Metrics of every worker process in the Prometheus text format"""
+        snapshots = [cls.snapshot()]
+        if cls._directory:
+            cls._write(snapshots[0])
+            snapshots = cls._read_all()
+        counters, histograms, gauges = cls._add_up(snapshots)
+        lines = []
+        described = set()
+        for metrics in (counters, gauges):
+            for (name, labels), value in sorted(metrics.items()):
+                cls._describe(lines, described, name)
+                lines.append("{}{} {}".format(name, cls._labels(labels), cls._number(value)))
+        for (name, labels), histogram in sorted(histograms.items()):
+            cls._describe(lines, described, name)
+            cumulative = 0
+            for bound, count in zip(cls.BUCKETS + ("+Inf",), histogram):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(name, cls._labels(labels + (("le", str(bound)),)), cumulative))
+            lines.append("{}_sum{} {}".format(name, cls._labels(labels), cls._number(histogram[-1])))
+            lines.append("{}_count{} {}".format(name, cls._labels(labels), cumulative))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _add_up(snapshots) -> Tuple[Dict, Dict, Dict]:
+        """Counters, histograms and gauges of the snapshots, keyed by name and labels"""
+        counters, histograms, gauges = {}, {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                histograms[key] = [a + b for a, b in zip(histograms.get(key, [0] * len(value)), value)]
+            for name, labels, value in snapshot["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        return counters, histograms, gauges
+
+    @classmethod
+    def reset(cls):
+        """Drops every metric recorded by this process, and its gauges"""
+        with cls._lock:
+            for _, counters, histograms in cls._shards:
+                counters.clear()
+                histograms.clear()
+            cls._retired_counters.clear()
+            cls._retired_histograms.clear()
+            cls._gauges.clear()
+
+    @classmethod
+    def _shard(cls) -> Tuple[Dict, Dict]:
+        shard = getattr(cls._local, "shard", None)
+        if shard is None:
+            shard = cls._local.shard = ({}, {})
+            with cls._lock:
+                cls._shards.append((threading.current_thread(), *shard))
+        return shard
+
+    @classmethod
+    def _after_fork(cls):
+        """The metrics inherited from the parent process (e.g. gunicorn --preload) are not the ones of the child"""
+        cls._lock = threading.Lock()
+        cls._write_lock = threading.Lock()
+        cls._local = threading.local()
+        cls._pid = os.getpid()
+        cls._shards = []
+        cls._retired_counters, cls._retired_histograms = {}, {}
+        if cls._directory:
+            cls._restore()
+            cls._start_writer()
+
+    @classmethod
+    def _collect(cls) -> Tuple[Dict, Dict]:
+        """Adds up the shards of every thread, folding those of the threads that exited into the retired metrics"""
+        with cls._lock:
+            alive = []
+            for shard in cls._shards:
+                if shard[0].is_alive():
+                    alive.append(shard)
+                else:
+                    #a thread that exited does not record anymore, so its shard is final
+                    cls._merge(cls._retired_counters, cls._retired_histograms, shard[1], shard[2])
+            cls._shards = alive
+            counters = dict(cls._retired_counters)
+            histograms = {key: list(value) for key, value in cls._retired_histograms.items()}
+            for _, shard_counters, shard_histograms in alive:
+                cls._merge(counters, histograms, shard_counters, shard_histograms)
+        return counters, histograms
+
+    @staticmethod
+    def _merge(counters: Dict, histograms: Dict, shard_counters: Dict, shard_histograms: Dict):
+        #copies are atomic, while the owner thread may be adding keys
+        for key, value in shard_counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in shard_histograms.copy().items():
+            histograms[key] = [a + b for a, b in zip(histograms.get(key, [0] * len(value)), list(value))]
+
+    @classmethod
+    def _restore(cls):
+        """Keeps the counters of a previous process with the same pid, so they don't go backwards"""
+        path = os.path.join(cls._directory, "{}.json".format(cls._pid))
+        try:
+            with open(path, "rt") as fp:
+                snapshot = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            cls._retired_counters[key] = cls._retired_counters.get(key, 0) + value
+        for name, labels, value in snapshot["histograms"]:
+            cls._retired_histograms[(name, tuple(map(tuple, labels)))] = value
+
+    @classmethod
+    def _start_writer(cls):
+        if cls._writer and cls._writer.is_alive():
+            return
+        cls._writer = threading.Thread(target=cls._write_periodically, name="metrics-writer", daemon=True)
+        cls._writer.start()
+
+    @classmethod
+    def _write_periodically(cls):
+        pid = os.getpid()
+        while cls._directory and cls._pid == pid:
+            time.sleep(cls._interval)
+            try:
+                cls._write(cls.snapshot())
+            except OSError as e:
+                print("Error upon writing the metrics of process {}: {}".format(pid, e))
+
+    @classmethod
+    def _write(cls, snapshot: dict):
+        with cls._write_lock:
+            if cls._pid != os.getpid():
+                return
+            cls._dump(os.path.join(cls._directory, "{}.json".format(cls._pid)), snapshot)
+
+    @staticmethod
+    def _dump(path: str, snapshot: dict):
+        temporary = path + ".tmp"
+        with open(temporary, "wt") as fp:
+            json.dump(snapshot, fp)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _load(path: str):
+        try:
+            with open(path, "rt") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    @contextmanager
+    def _exited_lock(cls):
+        """Serializes the processes that read or update exited.json, so the metrics of a worker are counted exactly once"""
+        with open(os.path.join(cls._directory, "exited.lock"), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    @classmethod
+    def _retire(cls, path: str, snapshot: Optional[dict]):
+        """
+        Adds the counters and histograms of a process that exited to exited.json, then removes its file.
+        Args:
+            snapshot (dict): metrics of the process, None if its file can't be read
+        """
+        if snapshot is not None:
+            exited_path = os.path.join(cls._directory, cls._EXITED)
+            exited = cls._load(exited_path) or {"counters": [], "histograms": [], "gauges": []}
+            counters, histograms, _ = cls._add_up([exited, dict(snapshot, gauges=[])])
+            cls._dump(exited_path, {
+                "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+                "histograms": [[name, labels, value] for (name, labels), value in histograms.items()],
+                "gauges": []
+            })
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def _exit(cls):
+        """Retires the metrics of this process when it exits (registered with atexit)"""
+        if not cls._directory:
+            return
+        with cls._write_lock:
+            pid, cls._pid = cls._pid, None
+        if pid != os.getpid():
+            return
+        try:
+            with cls._exited_lock():
+                cls._retire(os.path.join(cls._directory, "{}.json".format(pid)), cls.snapshot())
+        except OSError as e:
+            print("Error upon retiring the metrics of process {}: {}".format(pid, e))
+
+    @classmethod
+    def _read_all(cls):
+        with cls._exited_lock():
+            #the workers that died without retiring their metrics are retired first, so they're read from exited.json
+            for file_name in os.listdir(cls._directory):
+                pid = cls._pid_of(file_name)
+                if pid is not None and not cls._alive(pid):
+                    path = os.path.join(cls._directory, file_name)
+                    cls._retire(path, cls._load(path))
+            snapshots = [cls._load(os.path.join(cls._directory, file_name))
+                         for file_name in os.listdir(cls._directory) if file_name.endswith(".json")]
+        return [snapshot for snapshot in snapshots if snapshot is not None]
+
+    @staticmethod
+    def _pid_of(file_name: str):
+        """Process of a <pid>.json file, None for other files"""
+        name, extension = os.path.splitext(file_name)
+        return int(name) if extension == ".json" and name.isdigit() else None
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @classmethod
+    def _describe(cls, lines, described, name):
+        if name in described:
+            return
+        described.add(name)
+        metric_type, description = cls._DESCRIPTIONS.get(name, ("untyped", name))
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+
+    @staticmethod
+    def _labels(labels) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"')) for key, value in labels) + "}"
+
+    @staticmethod
+    def _number(value) -> str:
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+os.register_at_fork(after_in_child=Metrics._after_fork)
+atexit.register(Metrics._exit)
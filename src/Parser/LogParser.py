@@ -0,0 +1,175 @@
+"""High-throughput parsers for the log lines received by LogAggregator: dash-separated text and JSON lines"""
+import codecs
+import re
+from datetime import date as Date
+from json.encoder import encode_basestring
+from typing import BinaryIO, Iterable, Iterator, List
+from typing_extensions import TypedDict
+from pydantic import TypeAdapter
+from src.LogEntry.LogEntry import LogEntry, LogLevel
+from src.Formatter.JsonBackend import JsonBackend
+
+#same fields and types as LogEntry. Validating plain dicts spares building (and then dumping) one model per row.
+LogEntryRow = TypedDict("LogEntryRow", {name: field.annotation for name, field in LogEntry.model_fields.items()})
+
+
+class LogParser:
+    """
+    Parses log lines in the format
+        <yyyy-mm-dd> <time> - <client_ip> - <application_id> - <level> - <method> - <component> - <message>
+    into the fields of a LogEntry.
+    Fields are delimited by a dash surrounded by blanks, so hyphens inside words (e.g. method names) are kept, and everything
+    after the sixth delimiter belongs to the message, even if it contains " - " itself. Lines are scanned with str.split,
+    which runs in C, and the whole batch is validated against the LogEntry fields in a single pydantic call.
+    The date (yyyy-mm-dd) and time (HH:MM:SS with an optional fraction, e.g. 01:56:59,303) are checked here, as Elasticsearch
+    would reject an entry with a malformed date after the client was acknowledged, and times are compared as text.
+    """
+
+    _DELIMITER = " - "
+    _FIELDS = 7
+    _BATCH_ADAPTER = TypeAdapter(List[LogEntryRow])
+    #LogEntry.model_dump_json() layout, filled with the JSON encoded values of each row when orjson is not installed.
+    _JSON_TEMPLATE = "{" + ",".join('"{}":%s'.format(name) for name in LogEntry.model_fields) + "}\n"
+    #fields a JSON line must carry, application_server_ip being added by the aggregator
+    _NDJSON_FIELDS = tuple(name for name in LogEntry.model_fields if name != "application_server_ip")
+    _LEVELS = frozenset(level.value for level in LogLevel)
+    _DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+    _TIME = re.compile(r"([01]\d|2[0-3]):[0-5]\d:[0-5]\d([,.]\d{1,9})?")
+
+    @staticmethod
+    def parse(application_server_ip: str, lines: Iterable[str]) -> List[dict]:
+        """
+        Parses and validates the log lines. Blank lines are ignored.
+        Args:
+            application_server_ip (str): IP of the server that sent the logs
+            lines (Iterable[str]): log lines to be parsed
+        Raises:
+            ValueError: if a line does not follow the expected format, or its date or time is invalid
+            pydantic.ValidationError: if any of the parsed entries is not a valid LogEntry
+        Returns:
+            List[dict]: the fields of each entry, in the same order as they're declared in LogEntry
+        """
+        rows = []
+        dates = set()
+        delimiter, field_count = LogParser._DELIMITER, LogParser._FIELDS
+        for line in lines:
+            fields = line.split(delimiter, field_count - 1)
+            if len(fields) != field_count:
+                if line.strip():
+                    raise ValueError("Error when parsing message {} : missing fields".format(line))
+                continue
+            timestamp = fields[0].split()
+            if len(timestamp) != 2:
+                raise ValueError("Error when parsing message {} : expected date and time".format(line))
+            LogParser._check_timestamp(line, timestamp[0], timestamp[1], dates)
+            rows.append({
+                "application_server_ip": application_server_ip,
+                "application_id": fields[2].strip(),
+                "date": timestamp[0],
+                "time": timestamp[1],
+                "client_ip": fields[1].strip(),
+                "level": fields[3].strip(),
+                "method": fields[4].strip(),
+                "component": fields[5].strip(),
+                "message": fields[6].strip()
+            })
+        LogParser._BATCH_ADAPTER.validate_python(rows)
+        return rows
+
+    @staticmethod
+    def parse_ndjson(application_server_ip: str, lines: Iterable[str]) -> List[str]:
+        """
+        Fast path for clients that already send structured logs, one JSON object per line (application/x-ndjson).
+        Each line is decoded only to check that the LogEntry fields are there with the right types; the document is then
+        kept as it was sent, with application_server_ip spliced in front, instead of being validated into a model and
+        serialized again. Fields other than the ones of LogEntry are kept in the document (the S3 file and the _source of the
+        Elasticsearch document), but they're not indexed nor searchable, as the index template maps only the LogEntry fields
+        (dynamic: false). Blank lines are ignored.
+        Args:
+            application_server_ip (str): IP of the server that sent the logs
+            lines (Iterable[str]): JSON documents, one per line
+        Raises:
+            json.JSONDecodeError: if a line is not valid JSON
+            ValueError: if a document is not an object, misses a LogEntry field, has an invalid date or time or sets
+                application_server_ip
+        Returns:
+            List[str]: newline terminated JSON documents, as returned by serialize
+        """
+        documents = []
+        dates = set()
+        loads, required, levels = JsonBackend.loads, LogParser._NDJSON_FIELDS, LogParser._LEVELS
+        prefix = '{"application_server_ip":' + encode_basestring(application_server_ip) + ","
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            document = loads(line)
+            if not isinstance(document, dict):
+                raise ValueError("Error when parsing message {} : expected a JSON object".format(line))
+            for name in required:
+                if not isinstance(document.get(name), str):
+                    raise ValueError("Error when parsing message {} : missing or invalid field {}".format(line, name))
+            if document["level"] not in levels:
+                raise ValueError("Error when parsing message {} : invalid level {}".format(line, document["level"]))
+            LogParser._check_timestamp(line, document["date"], document["time"], dates)
+            if "application_server_ip" in document:
+                #set by the aggregator, as for text lines. A duplicated key would be refused by Elasticsearch.
+                raise ValueError("Error when parsing message {} : application_server_ip must not be set".format(line))
+            documents.append(prefix + line[1:] + "\n")
+        return documents
+
+    @staticmethod
+    def _check_timestamp(line: str, date: str, time: str, dates: set):
+        """
+        Checks the date and time of an entry. The entries of a batch mostly share their date, so the valid ones are kept in
+        dates and checked once.
+        Raises:
+            ValueError: if the date is not an existing yyyy-mm-dd day or the time is not HH:MM:SS[,fraction]
+        """
+        if date not in dates:
+            try:
+                if not LogParser._DATE.fullmatch(date):
+                    raise ValueError(date)
+                Date.fromisoformat(date)
+            except ValueError:
+                raise ValueError("Error when parsing message {} : invalid date {}, expected yyyy-mm-dd".format(line, date)) from None
+            dates.add(date)
+        if not LogParser._TIME.fullmatch(time):
+            raise ValueError("Error when parsing message {} : invalid time {}, expected HH:MM:SS,fff".format(line, time))
+
+    @staticmethod
+    def serialize(rows: List[dict]) -> List[str]:
+        """
+        Serializes validated rows into newline terminated JSON documents, matching LogEntry.model_dump_json().
+        Args:
+            rows (List[dict]): rows returned by parse
+        """
+        if JsonBackend.accelerated:
+            dumps = JsonBackend.dumps
+            return [dumps(row) + "\n" for row in rows]
+        template = LogParser._JSON_TEMPLATE
+        return [template % tuple(map(encode_basestring, row.values())) for row in rows]
+
+    @staticmethod
+    def iter_lines(stream: BinaryIO, chunk_size: int = 65536) -> Iterator[str]:
+        """
+        Lazily decodes a UTF-8 byte stream into lines, reading at most chunk_size bytes at a time, so only one chunk
+        and the line being assembled are kept in memory.
+        Args:
+            stream (BinaryIO): file-like object (e.g. flask.Request.stream)
+            chunk_size (int): amount of bytes read from the stream at once
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        remainder = ""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            #a multi-byte character split between two chunks is held by the decoder until it's complete
+            lines = (remainder + decoder.decode(chunk)).split("\n")
+            #the last line may continue in the next chunk. Trailing carriage returns are stripped by parse.
+            remainder = lines.pop()
+            yield from lines
+        remainder += decoder.decode(b"", final=True)
+        if remainder:
+            yield remainder
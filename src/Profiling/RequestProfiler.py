@@ -0,0 +1,129 @@
+"""Opt-in capture of the slow requests, and profiling of a sample of them"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+from flask import request
+from src.Metrics.Metrics import Metrics
+
+
+class RequestProfiler:
+    """
+    Wraps the handling of a request (e.g. LogService.log) to find out where the time of the slow ones went.
+    - Requests slower than slowThresholdMs are appended to the slow log (JSON lines) with their duration, status, payload
+      size and the time spent in each stage (parse, file_write, s3_upload, es_bulk, see Metrics.stage_timer). Stages run
+      after the response (asynchronous mode, rollover, spool) are not part of the request.
+    - A fraction sampleRate of the requests is run under cProfile, as is every request while toggleFile exists, so profiling
+      can be switched on and off at runtime in every worker process. Profiles are dumped to profileDir as .prof files
+      (to be read with pstats or snakeviz), keeping the latest maxProfiles. Only one request per process is profiled
+      at a time.
+    Settings are read from logs.profiling in config.json. When it's disabled, the RequestProfiler is not created at all.
+    """
+
+    #seconds between two checks of the toggle file
+    _TOGGLE_CHECK_INTERVAL = 1
+
+    def __init__(self, config: dict, base_path: str):
+        """
+        Args:
+            config (dict): logs.profiling section of config.json
+            base_path (str): directory the relative paths of the config are relative to
+        """
+        self._slow_threshold = config.get("slowThresholdMs", 1000) / 1000
+        self._slow_log_path = os.path.join(base_path, config.get("slowLogPath", "slow.log"))
+        self._sample_rate = config.get("sampleRate", 0)
+        self._profile_dir = os.path.join(base_path, config.get("profileDir", "profiles"))
+        self._max_profiles = config.get("maxProfiles", 100)
+        toggle_file = config.get("toggleFile")
+        self._toggle_file = os.path.join(base_path, toggle_file) if toggle_file else None
+        self._toggled = False
+        self._toggle_checked = 0
+        self._slow_log_lock = threading.Lock()
+        #cProfile can't profile two threads at the same time
+        self._profiling = threading.Lock()
+        self._profile_count = 0
+
+    def run(self, handler: Callable, *args):
+        """
+        Calls the handler of the request, capturing it if it's slow and profiling it if it's sampled.
+        Returns:
+            the response of the handler
+        """
+        stages = {}
+        token = Metrics.request_stages.set(stages)
+        profile = None
+        if self._sampled() and self._profiling.acquire(blocking=False):
+            profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            if profile:
+                response = profile.runcall(handler, *args)
+            else:
+                response = handler(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            Metrics.request_stages.reset(token)
+            profile_path = None
+            if profile:
+                self._profiling.release()
+                profile_path = self._dump(profile)
+        if elapsed >= self._slow_threshold:
+            self._log_slow(elapsed, response, stages, profile_path)
+        return response
+
+    def toggled(self) -> bool:
+        """Whether every request is profiled, i.e. toggleFile exists. Checked at most once per second."""
+        if not self._toggle_file:
+            return False
+        now = time.monotonic()
+        if now - self._toggle_checked >= self._TOGGLE_CHECK_INTERVAL:
+            self._toggled = os.path.exists(self._toggle_file)
+            self._toggle_checked = now
+        return self._toggled
+
+    def _sampled(self) -> bool:
+        return self.toggled() or (self._sample_rate > 0 and random.random() < self._sample_rate)
+
+    def _log_slow(self, elapsed: float, response, stages: dict, profile_path: str):
+        status = response[1] if isinstance(response, tuple) else getattr(response, "status_code", None)
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "path": request.path,
+            "remote_addr": request.remote_addr,
+            "status": status,
+            "payload_bytes": request.content_length,
+            "duration_ms": round(elapsed * 1000, 3),
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in stages.items()},
+            "profile": profile_path
+        }
+        try:
+            with self._slow_log_lock:
+                with open(self._slow_log_path, "at") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print("Error upon writing the slow request log {}: {}".format(self._slow_log_path, e))
+
+    def _dump(self, profile: cProfile.Profile) -> str:
+        """
+        Writes the profile to profileDir, removing the oldest profiles past maxProfiles.
+        Returns:
+            str: path of the profile, or None if it could not be written
+        """
+        self._profile_count += 1
+        path = os.path.join(self._profile_dir, "{}-{}-{}.prof".format(datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f"),
+                                                                     os.getpid(), self._profile_count))
+        try:
+            os.makedirs(self._profile_dir, exist_ok=True)
+            profile.dump_stats(path)
+            profiles = sorted(name for name in os.listdir(self._profile_dir) if name.endswith(".prof"))
+            for name in profiles[:max(0, len(profiles) - self._max_profiles)]:
+                os.remove(os.path.join(self._profile_dir, name))
+        except OSError as e:
+            print("Error upon writing the profile {}: {}".format(path, e))
+            return None
+        return path
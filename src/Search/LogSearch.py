@@ -0,0 +1,194 @@
+"""Search of the indexed logs with simple filters, cached in front of Elasticsearch"""
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+from src.ConfigManager.ConfigManager import ConfigManager
+from src.FileTransferManager.ElasticConnector import ElasticConnector
+from src.LogEntry.LogEntry import LogLevel
+from src.Search.RecentLogs import RecentLogs
+from src.Utils import SingleFlight, TTLCache
+
+
+class LogSearch:
+    """
+    Translates the filters of /search into Elasticsearch queries:
+        level: one or more levels (comma separated or repeated), e.g. ERROR,CRITICAL
+        application_id: one or more application IDs (comma separated or repeated)
+        component: one or more components (comma separated or repeated)
+        text: words that must all be in the message
+        from / to: UTC time range, ISO 8601 (e.g. 2025-03-15T01:45:00), from inclusive and to exclusive, to the second
+        last: relative time range ending now, e.g. 90s, 15m, 2h or 1d. Can't be combined with from
+        size: amount of entries returned, most recent first
+    Dashboards and on-call tooling repeat the same few queries, so results are cached for search.cacheTtlSeconds, keyed by the
+    normalized filters (order of the parameters and values, case of the levels and blanks in the text don't matter), and
+    concurrent identical queries are coalesced into a single request to Elasticsearch. A relative range is part of the key
+    as it was sent, so its results are at most cacheTtlSeconds old.
+    With a RecentLogs buffer (search.recent, single-process servers only), a relative range that it holds entirely is answered
+    from it, without reaching Elasticsearch nor the cache. There, entries are timed by when they were received, while
+    Elasticsearch filters them by the date and time stamped by the client, so an entry stamped late or received late can be
+    in one result and not in the other.
+    """
+
+    _DURATION = re.compile(r"^(\d+)([smhd]?)$")
+    _DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+    _LEVELS = frozenset(level.value for level in LogLevel)
+
+    def __init__(self, config: ConfigManager, elastic_connector: ElasticConnector, recent_logs: RecentLogs = None):
+        """
+        Args:
+            recent_logs (RecentLogs): entries received recently by this process. None searches Elasticsearch only.
+        """
+        search_config = config.config.get("search", {})
+        self._elastic_connector = elastic_connector
+        self._recent_logs = recent_logs
+        self._default_size = search_config.get("defaultSize", 100)
+        self._max_size = search_config.get("maxSize", 1000)
+        self._cache = TTLCache(max_size=search_config.get("cacheSize", 256), ttl=search_config.get("cacheTtlSeconds", 10))
+        self._in_flight = SingleFlight()
+
+    def set_recent_logs(self, recent_logs: RecentLogs):
+        """Searches the recent windows in recent_logs from now on, see LogAggregator.enable_recent_logs"""
+        self._recent_logs = recent_logs
+
+    def search(self, args) -> Tuple[dict, str]:
+        """
+        Args:
+            args (werkzeug.datastructures.MultiDict): filters of the request, see the class documentation
+        Raises:
+            ValueError: if a filter is invalid
+            Exception: if Elasticsearch can't run the search
+        Returns:
+            tuple: the total amount of matching entries and the entries returned ({"total", "logs"}), and where they came
+            from: LOCAL (RecentLogs), HIT (cache) or MISS (Elasticsearch)
+        """
+        key = self.normalize(args)
+        filters = dict(key)
+        if self._recent_logs and "last" in filters and "from" not in filters and "to" not in filters \
+                and self._recent_logs.covers(filters["last"]):
+            return self._recent_logs.search(filters["last"], filters["size"], level=filters.get("level", ()),
+                                            application_id=filters.get("application_id", ()),
+                                            component=filters.get("component", ()), text=filters.get("text", "")), "LOCAL"
+        result = self._cache.get(key)
+        if result is not None:
+            return result, "HIT"
+        return self._in_flight.do(key, lambda: self._fetch(key)), "MISS"
+
+    def normalize(self, args) -> tuple:
+        """
+        Validates the filters and puts them in a canonical form, used as the cache key.
+        Raises:
+            ValueError: if a filter is invalid
+        """
+        key = {}
+        levels = self._values(args, "level", str.upper)
+        if levels:
+            unknown = levels.difference(self._LEVELS)
+            if unknown:
+                raise ValueError("Unknown level {}. Please use one of {}".format(", ".join(sorted(unknown)), sorted(self._LEVELS)))
+            key["level"] = tuple(sorted(levels))
+        for name in ("application_id", "component"):
+            values = self._values(args, name)
+            if values:
+                key[name] = tuple(sorted(values))
+        text = " ".join(args.get("text", "").split()).lower()
+        if text:
+            key["text"] = text
+        if args.get("last") and args.get("from"):
+            raise ValueError("Please use either last or from, not both")
+        if args.get("last"):
+            key["last"] = self._seconds(args["last"])
+        for name in ("from", "to"):
+            if args.get(name):
+                key[name] = self._timestamp(name, args[name])
+        size = args.get("size", self._default_size)
+        try:
+            size = int(size)
+        except ValueError:
+            raise ValueError("size must be a number, got {}".format(size))
+        if not 0 < size <= self._max_size:
+            raise ValueError("size must be between 1 and {}".format(self._max_size))
+        key["size"] = size
+        return tuple(sorted(key.items()))
+
+    def query(self, key: tuple) -> dict:
+        """
+        Body of the _search request for the normalized filters. A relative range is resolved against the current time.
+        """
+        filters = dict(key)
+        clauses, must = [], []
+        if "level" in filters:
+            clauses.append({"terms": {"level": list(filters["level"])}})
+        for name in ("application_id", "component"):
+            if name in filters:
+                clauses.append({"terms": {name: list(filters[name])}})
+        if "text" in filters:
+            must.append({"match": {"message": {"query": filters["text"], "operator": "and"}}})
+        start = filters.get("from")
+        if "last" in filters:
+            start = (datetime.now(timezone.utc) - timedelta(seconds=filters["last"])).strftime("%Y-%m-%dT%H:%M:%S")
+        if start:
+            clauses.append(self._time_bound(start, "gt", "gte"))
+        if "to" in filters:
+            clauses.append(self._time_bound(filters["to"], "lt", "lt"))
+        return {
+            "query": {"bool": {"filter": clauses, "must": must}},
+            #an index without the field (e.g. created before the index template) sorts last instead of failing the search
+            "sort": [{"date": {"order": "desc", "unmapped_type": "date"}}, {"time": {"order": "desc", "unmapped_type": "keyword"}}],
+            "size": filters["size"],
+            "track_total_hits": True
+        }
+
+    def cache_stats(self) -> dict:
+        """hits, misses and size of the cache, and the amount of searches coalesced with one in flight"""
+        return dict(self._cache.stats(), coalesced=self._in_flight.coalesced())
+
+    def _fetch(self, key: tuple) -> dict:
+        #an identical search may have been cached while this one waited to run
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+        response = self._elastic_connector.search(self.query(key))
+        hits = response.get("hits", {})
+        result = {
+            "total": hits.get("total", {}).get("value", 0),
+            "logs": [hit["_source"] for hit in hits.get("hits", [])]
+        }
+        self._cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _time_bound(timestamp: str, date_operator: str, time_operator: str) -> dict:
+        """
+        Entries are stored with a date (yyyy-MM-dd) and a time keyword (HH:mm:ss,SSS), so a bound on the moment they were
+        logged is a bound on the date, or the same date and a bound on the time, which sorts as text.
+        """
+        date, time = timestamp.split("T")
+        return {"bool": {"should": [
+            {"range": {"date": {date_operator: date}}},
+            {"bool": {"filter": [{"term": {"date": date}}, {"range": {"time": {time_operator: time}}}]}}
+        ], "minimum_should_match": 1}}
+
+    @staticmethod
+    def _values(args, name: str, transform=str) -> set:
+        """Values of a filter sent either repeated or comma separated"""
+        values = set()
+        for value in args.getlist(name):
+            values.update(transform(item.strip()) for item in value.split(",") if item.strip())
+        return values
+
+    @staticmethod
+    def _seconds(duration: str) -> int:
+        match = LogSearch._DURATION.match(duration.strip().lower())
+        if not match or int(match.group(1)) == 0:
+            raise ValueError("last must be a duration such as 90s, 15m, 2h or 1d, got {}".format(duration))
+        return int(match.group(1)) * LogSearch._DURATION_UNITS[match.group(2)]
+
+    @staticmethod
+    def _timestamp(name: str, value: str) -> str:
+        try:
+            timestamp = datetime.fromisoformat(value.strip())
+        except ValueError:
+            raise ValueError("{} must be an ISO 8601 date and time, e.g. 2025-03-15T01:45:00, got {}".format(name, value))
+        if timestamp.tzinfo:
+            timestamp = timestamp.astimezone(timezone.utc)
+        return timestamp.strftime("%Y-%m-%dT%H:%M:%S")
@@ -0,0 +1,186 @@
+"""Bounded in-memory buffer of the entries received recently, indexed to answer recent-window searches locally"""
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+from typing import Iterable
+from src.Formatter.JsonBackend import JsonBackend
+
+
+class _Postings:
+    """
+    Sequence numbers of the entries indexed under a key, in ascending order. Like the entries, evicted ones are dropped from
+    the head in bulk, so the retained ones stay in a flat array that's bisected and indexed in O(1).
+    """
+
+    __slots__ = ("sequences", "head")
+
+    def __init__(self):
+        self.sequences = array("q")
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.sequences) - self.head
+
+    def popleft(self):
+        self.head += 1
+        if self.head > 1024 and self.head * 2 > len(self.sequences):
+            del self.sequences[:self.head]
+            self.head = 0
+
+    def since(self, first: int) -> int:
+        """Amount of sequence numbers from first on"""
+        return len(self.sequences) - bisect_left(self.sequences, first, lo=self.head)
+
+    def newest(self, count: int):
+        """The count highest sequence numbers, highest first"""
+        return islice(reversed(self.sequences), count)
+
+
+class RecentLogs:
+    """
+    Ring buffer of the log entries accepted by this process, oldest first, evicted once they're older than max_age seconds or
+    once the buffer takes more than max_bytes. Entries are kept as the JSON documents produced by the Logger (no copy, no
+    model), along with the keys they're indexed under: level, application_id, component and the lowercased words of the
+    message. Each key has the sequence numbers of its entries in an inverted index, in the order they were received, so a
+    search only visits the entries of its most selective filter.
+    Entries are timed by when they were received, not by the date and time they carry. Only the entries received by this
+    process are here: with several worker processes, each one has its own share.
+    """
+
+    _TOKEN = re.compile(r"\w+")
+    _FIELDS = ("level", "application_id", "component")
+    #estimated bytes of an entry besides its document and keys: the entry tuple and its slot in the buffer
+    _ENTRY_OVERHEAD = 96
+    #estimated bytes of a posting, an int in an array, with the slack of the arrays
+    _POSTING_OVERHEAD = 16
+    _NO_POSTINGS = _Postings()
+
+    def __init__(self, max_bytes: int = 67108864, max_age: float = 900):
+        """
+        Args:
+            max_bytes (int): memory budget of the entries and their postings, estimated
+            max_age (float): seconds an entry is kept
+        """
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        #(sequence number, monotonic time received, document, keys, estimated bytes). Evicted entries are dropped from the
+        #head of the list in bulk, _head being the first one still retained and _base the sequence number of the first one.
+        self._entries = []
+        self._head = 0
+        self._base = 0
+        self._next_sequence = 0
+        self._postings = {}
+        self._bytes = 0
+        #every entry received after this moment is still retained
+        self._complete_since = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, documents: Iterable[str]):
+        """
+        Adds the entries to the buffer. Meant to be a Logger listener.
+        Args:
+            documents (Iterable[str]): JSON log entries, as produced by the parser
+        """
+        loads = JsonBackend.loads
+        indexed = []
+        for document in documents:
+            entry = loads(document)
+            keys = {sys.intern("{}\x00{}".format(field, entry.get(field))) for field in self._FIELDS}
+            keys.update(sys.intern("token\x00" + token) for token in self._TOKEN.findall(str(entry.get("message", "")).lower()))
+            keys = frozenset(keys)
+            size = sys.getsizeof(document) + sys.getsizeof(keys) + self._ENTRY_OVERHEAD + self._POSTING_OVERHEAD * len(keys)
+            indexed.append((document, keys, size))
+        now = time.monotonic()
+        with self._lock:
+            for document, keys, size in indexed:
+                sequence = self._next_sequence
+                self._next_sequence += 1
+                self._entries.append((sequence, now, document, keys, size))
+                for key in keys:
+                    postings = self._postings.get(key)
+                    if postings is None:
+                        postings = self._postings[key] = _Postings()
+                    postings.sequences.append(sequence)
+                self._bytes += size
+            self._evict(now)
+
+    def covers(self, seconds: float) -> bool:
+        """Whether every entry received in the last seconds is still in the buffer"""
+        return seconds <= self._max_age and time.monotonic() - seconds > self._complete_since
+
+    def search(self, seconds: float, size: int, level: Iterable[str] = (), application_id: Iterable[str] = (),
+               component: Iterable[str] = (), text: str = "") -> dict:
+        """
+        Entries received in the last seconds matching every filter given (any of the values of a filter, every word of text),
+        most recent first.
+        Returns:
+            dict: the amount of matching entries ("total") and the size most recent ones ("logs")
+        """
+        groups = [{"{}\x00{}".format(field, value) for value in values}
+                  for field, values in (("level", level), ("application_id", application_id), ("component", component)) if values]
+        groups.extend({"token\x00" + token} for token in set(self._TOKEN.findall(text.lower())))
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entries, base = self._entries, self._base
+            first = bisect_left(entries, now - seconds, lo=self._head, key=lambda entry: entry[1]) + base
+            if groups:
+                #the entries of the most selective filter, newest first, checked against the other filters
+                postings = [[self._postings.get(key, self._NO_POSTINGS) for key in group] for group in groups]
+                smallest = min(range(len(groups)), key=lambda i: sum(map(len, postings[i])))
+                others = groups[:smallest] + groups[smallest + 1:]
+                #postings are in ascending order: the ones in the window are found by bisection
+                counts = [keys.since(first) for keys in postings[smallest]]
+                windows = [keys.newest(count) for keys, count in zip(postings[smallest], counts)]
+                candidates = windows[0] if len(windows) == 1 else merge(*windows, reverse=True)
+                if len(windows) == 1 and not others:
+                    #a single value of a single filter: its postings are the matches
+                    matches, total = list(islice(candidates, size)), counts[0]
+                else:
+                    matches = []
+                    for sequence in candidates:
+                        keys = entries[sequence - base][3]
+                        for group in others:
+                            if group.isdisjoint(keys):
+                                break
+                        else:
+                            matches.append(sequence)
+                    total = len(matches)
+                documents = [entries[sequence - base][2] for sequence in matches[:size]]
+            else:
+                total = len(entries) - (first - base)
+                documents = [entry[2] for entry in entries[len(entries) - min(size, total):][::-1]]
+        loads = JsonBackend.loads
+        return {"total": total, "logs": [loads(document) for document in documents]}
+
+    def stats(self) -> dict:
+        """Amount of entries retained and their estimated size in bytes"""
+        with self._lock:
+            return {"entries": len(self._entries) - self._head, "bytes": self._bytes}
+
+    def _evict(self, now: float):
+        """Drops the entries older than max_age, then the oldest ones until the buffer fits in max_bytes"""
+        entries, head = self._entries, self._head
+        while head < len(entries) and (now - entries[head][1] > self._max_age or self._bytes > self._max_bytes):
+            _, received, _, keys, size = entries[head]
+            #the document is released right away, the slot when the list is compacted
+            entries[head] = None
+            for key in keys:
+                postings = self._postings[key]
+                postings.popleft()
+                if not postings:
+                    del self._postings[key]
+            self._bytes -= size
+            self._complete_since = received
+            head += 1
+        #the list is compacted once most of it was evicted, so evicting an entry costs O(1) on average
+        if head > 1024 and head * 2 > len(entries):
+            del entries[:head]
+            self._base += head
+            head = 0
+        self._head = head
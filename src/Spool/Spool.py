@@ -0,0 +1,342 @@
+"""Durable append-only spool where log entries are stored before the client is acknowledged"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, Tuple
+
+
+class Spool:
+    """
+    Append-only queue of log entries kept in memory-mapped segment files of segment_bytes each.
+    Every append is a record framed by its length and CRC32, so a record torn by a crash is detected and dropped when the
+    spool is opened again. With sync enabled, appends wait for the next msync of the segment, which is done for all the
+    appends received in a sync_interval window (group commit) instead of once per append.
+    Records are read by a single consumer (see SpoolReplayer) from the position saved in the checkpoint file. Committing a
+    position saves it and removes the segments before it, so the records read but not committed are read again after a
+    restart (at-least-once delivery).
+    A spool is used by a single process, which holds an exclusive lock on its directory while it's open: worker processes
+    (e.g. gunicorn) each use their own directory (see leftovers for the ones left by processes that exited).
+    """
+
+    _HEADER = struct.Struct("<II")
+    _SEGMENT_SUFFIX = ".seg"
+    _CHECKPOINT = "checkpoint.json"
+    _LOCK = "lock"
+
+    def __init__(self, path: str, segment_bytes: int = 67108864, sync: bool = True, sync_interval: float = 0.01):
+        """
+        Args:
+            path (str): directory of the segment and checkpoint files. Created if it does not exist.
+            segment_bytes (int): size of each segment file. A record bigger than that gets a segment of its own.
+            sync (bool): whether appends wait until the record is flushed to disk
+            sync_interval (float): seconds to wait for other appends before flushing the segment
+        Raises:
+            BlockingIOError: if the spool is open in another process
+        """
+        if segment_bytes <= self._HEADER.size:
+            raise ValueError("Segment size must be bigger than {} bytes".format(self._HEADER.size))
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = self._acquire(path)
+        self._path = path
+        self._segment_bytes = segment_bytes
+        self._sync = sync
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        #notified when a record is appended and when appended records are flushed, respectively
+        self._appended = threading.Condition(self._lock)
+        self._synced = threading.Condition(self._lock)
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._closed = False
+        segment_ids = self._segment_ids()
+        checkpoint = self._load_checkpoint()
+        if segment_ids:
+            self._open_active(segment_ids[-1])
+            self._write_offset = self._recover(self._active_map)
+        else:
+            self._open_active(checkpoint[0] if checkpoint else 1)
+            self._write_offset = 0
+            segment_ids = [self._active_id]
+        if checkpoint and checkpoint[0] in segment_ids:
+            self._read_id, self._read_offset = checkpoint
+        else:
+            self._read_id, self._read_offset = segment_ids[0], 0
+        if self._read_id == self._active_id:
+            #without sync, the records after the checkpoint may have been lost in a crash
+            self._read_offset = min(self._read_offset, self._write_offset)
+        self._committed = (self._read_id, self._read_offset)
+        self._read_file = None
+        self._read_map = None
+        self._sync_thread = None
+        if self._sync:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="spool-sync", daemon=True)
+            self._sync_thread.start()
+
+    def append(self, entries: List[str]):
+        """
+        Appends the entries to the spool as a single record.
+        Args:
+            entries (List[str]): serialized log entries, each one a single line terminated by a newline
+        Raises:
+            ValueError: if the spool was closed
+            OSError: if the record can't be written (e.g. the disk is full)
+        """
+        data = "".join(entries).encode("utf-8")
+        if not data:
+            return
+        record = self._HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self._lock:
+            if self._closed:
+                raise ValueError("Spool is closed")
+            if self._write_offset + len(record) > len(self._active_map):
+                self._roll(len(record))
+            self._active_map[self._write_offset:self._write_offset + len(record)] = record
+            self._write_offset += len(record)
+            self._written_seq += 1
+            seq = self._written_seq
+            self._appended.notify_all()
+            while self._sync and self._synced_seq < seq and not self._closed:
+                self._synced.wait()
+
+    def read(self, max_bytes: int) -> Tuple[List[str], Tuple[int, int]]:
+        """
+        Reads the records after the last one read, until max_bytes of entries are read (at least one record if available).
+        Returns:
+            Tuple[List[str], Tuple[int, int]]: the entries read and the position after them, to be committed once the
+                entries are shipped
+        """
+        entries, size = [], 0
+        while size < max_bytes:
+            with self._lock:
+                write_id, write_offset = self._active_id, self._write_offset
+            if self._read_id == write_id and self._read_offset >= write_offset:
+                break
+            record = self._read_record(write_offset if self._read_id == write_id else None)
+            if record is None:
+                if self._read_id == write_id:
+                    break
+                #end of a finished segment: the next one is read
+                self._close_reader()
+                self._read_id, self._read_offset = min(i for i in self._segment_ids() if i > self._read_id), 0
+                continue
+            data, self._read_offset = record
+            entries.extend(line + "\n" for line in data.decode("utf-8").split("\n")[:-1])
+            size += len(data)
+        return entries, (self._read_id, self._read_offset)
+
+    def commit(self, position: Tuple[int, int]):
+        """
+        Saves the position returned by read in the checkpoint file, and removes the segments that were fully consumed.
+        """
+        segment_id, offset = position
+        checkpoint_path = os.path.join(self._path, self._CHECKPOINT)
+        with open(checkpoint_path + ".tmp", "w") as f:
+            json.dump({"segment": segment_id, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        self._committed = position
+        for consumed_id in self._segment_ids():
+            if consumed_id < segment_id:
+                os.remove(self._segment_path(consumed_id))
+
+    def pending_bytes(self) -> int:
+        """
+        Size of the records not committed yet, i.e. waiting to be shipped or being shipped. Segments that were filled count
+        with their whole size, which is at most one record more than their records.
+        """
+        committed_id, committed_offset = self._committed
+        with self._lock:
+            if self._closed:
+                return 0
+            active_id, write_offset = self._active_id, self._write_offset
+        pending = -committed_offset
+        for segment_id in range(committed_id, active_id):
+            try:
+                pending += os.path.getsize(self._segment_path(segment_id))
+            except FileNotFoundError:
+                #committed in the meantime
+                continue
+        return max(0, pending + write_offset)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits until there are records to be read or the timeout expires.
+        Returns:
+            bool: whether there are records to be read
+        """
+        with self._lock:
+            if not self._has_unread():
+                self._appended.wait(timeout)
+            return self._has_unread()
+
+    def wake(self):
+        """Wakes up the consumer waiting for records"""
+        with self._lock:
+            self._appended.notify_all()
+
+    def close(self):
+        """Flushes the active segment and closes the files. The records not committed are kept for the next time the spool is opened."""
+        self._close()
+        self._lock_file.close()
+
+    def remove(self):
+        """
+        Closes the spool and deletes its files, e.g. once the spool left by a process that exited was drained. The directory is
+        removed too, unless something else is left in it.
+        """
+        self._close()
+        for name in os.listdir(self._path):
+            if name.endswith(self._SEGMENT_SUFFIX) or name.startswith(self._CHECKPOINT):
+                os.remove(os.path.join(self._path, name))
+        #deleted while it's still locked, so no other process opens the spool in the meantime
+        os.remove(os.path.join(self._path, self._LOCK))
+        self._lock_file.close()
+        try:
+            os.rmdir(self._path)
+        except OSError:
+            pass
+
+    @classmethod
+    def leftovers(cls, root: str, own: str) -> List[str]:
+        """
+        Directories of the spools under root other than own, e.g. those of worker processes that exited. Whether one is still
+        in use is only known once it's opened. root itself is included if it holds segments (the layout of a single spool).
+        """
+        if not os.path.isdir(root):
+            return []
+        paths = [os.path.join(root, name) for name in sorted(os.listdir(root))]
+        paths = [path for path in paths if os.path.isdir(path) and os.path.abspath(path) != os.path.abspath(own)]
+        if any(name.endswith(cls._SEGMENT_SUFFIX) for name in os.listdir(root)):
+            paths.insert(0, root)
+        return paths
+
+    @classmethod
+    def _acquire(cls, path: str):
+        lock_file = open(os.path.join(path, cls._LOCK), "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as e:
+            lock_file.close()
+            raise BlockingIOError("Spool {} is used by another process".format(path)) from e
+        return lock_file
+
+    def _close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._appended.notify_all()
+            self._synced.notify_all()
+        if self._sync_thread:
+            self._sync_thread.join()
+        with self._lock:
+            self._active_map.flush()
+            self._active_map.close()
+            self._active_file.close()
+        self._close_reader()
+
+    def _has_unread(self) -> bool:
+        return self._read_id != self._active_id or self._read_offset < self._write_offset
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self._path, "{:020d}{}".format(segment_id, self._SEGMENT_SUFFIX))
+
+    def _segment_ids(self) -> List[int]:
+        return sorted(int(name[:-len(self._SEGMENT_SUFFIX)]) for name in os.listdir(self._path) if name.endswith(self._SEGMENT_SUFFIX))
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self._path, self._CHECKPOINT)) as f:
+                checkpoint = json.load(f)
+            return checkpoint["segment"], checkpoint["offset"]
+        except FileNotFoundError:
+            return None
+
+    def _open_active(self, segment_id: int, size: int = None):
+        path = self._segment_path(segment_id)
+        self._active_file = open(path, "r+b" if os.path.isfile(path) else "w+b")
+        if os.fstat(self._active_file.fileno()).st_size == 0:
+            #sparse file: the disk space is only used as records are written
+            self._active_file.truncate(size or self._segment_bytes)
+        self._active_map = mmap.mmap(self._active_file.fileno(), 0)
+        self._active_id = segment_id
+
+    def _roll(self, record_size: int):
+        """Closes the active segment and starts the next one, big enough for the record. Called with the lock held."""
+        self._active_map.flush()
+        self._active_map.close()
+        self._active_file.close()
+        self._open_active(self._active_id + 1, max(self._segment_bytes, record_size))
+        self._write_offset = 0
+
+    def _recover(self, segment: mmap.mmap) -> int:
+        """
+        Finds the end of the valid records of the segment and zeroes whatever comes after (i.e. a record torn by a crash).
+        Returns:
+            int: offset where the next record will be written
+        """
+        offset = 0
+        while True:
+            record = self._record_at(segment, offset, len(segment))
+            if record is None:
+                break
+            offset = record[1]
+        if any(segment[offset:offset + self._HEADER.size]):
+            segment[offset:] = bytes(len(segment) - offset)
+            segment.flush()
+        return offset
+
+    def _record_at(self, segment: mmap.mmap, offset: int, limit: int):
+        """
+        Returns:
+            tuple: data of the record at offset and the offset of the next one, or None if there's no valid record there
+        """
+        if offset + self._HEADER.size > limit:
+            return None
+        length, crc = self._HEADER.unpack_from(segment, offset)
+        end = offset + self._HEADER.size + length
+        if length == 0 or end > limit:
+            return None
+        data = segment[offset + self._HEADER.size:end]
+        if zlib.crc32(data) != crc:
+            return None
+        return data, end
+
+    def _read_record(self, limit: int = None):
+        if self._read_map is None:
+            self._read_file = open(self._segment_path(self._read_id), "rb")
+            self._read_map = mmap.mmap(self._read_file.fileno(), 0, access=mmap.ACCESS_READ)
+        record = self._record_at(self._read_map, self._read_offset, len(self._read_map) if limit is None else limit)
+        if record is None and limit is None and self._read_offset < len(self._read_map) and any(
+                self._read_map[self._read_offset:self._read_offset + self._HEADER.size]):
+            print("Spool segment {} is corrupted after offset {}: the rest of the segment was skipped".format(self._read_id, self._read_offset))
+        return record
+
+    def _close_reader(self):
+        if self._read_map is not None:
+            self._read_map.close()
+            self._read_file.close()
+            self._read_map = None
+            self._read_file = None
+
+    def _sync_loop(self):
+        while True:
+            with self._lock:
+                while self._synced_seq == self._written_seq and not self._closed:
+                    self._appended.wait()
+                if self._closed:
+                    return
+            #appends received in the meantime are flushed by the same msync
+            time.sleep(self._sync_interval)
+            with self._lock:
+                if self._closed:
+                    return
+                self._active_map.flush()
+                self._synced_seq = self._written_seq
+                self._synced.notify_all()
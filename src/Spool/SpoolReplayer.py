@@ -0,0 +1,76 @@
+"""Background worker that ships the entries stored in the spool"""
+import threading
+import traceback
+from typing import Callable, Dict, List
+from src.Spool.Spool import Spool
+
+
+class SpoolReplayer:
+    """
+    Reads the spool in batches of up to batch_bytes and hands each batch to the shipping function (e.g. Logger._ship_spooled,
+    which uploads it to S3 and indexes it in Elasticsearch). A batch is committed only once it was shipped: if shipping
+    fails, e.g. because Elasticsearch is down, the same batch is tried again with an exponential backoff, while new
+    entries keep being appended to the spool.
+    """
+
+    def __init__(self, spool: Spool, ship: Callable[[List[str], Dict], None], batch_bytes: int = 5242880, retry_backoff: float = 1,
+                 max_backoff: float = 60, drain: bool = False):
+        """
+        Args:
+            spool (Spool): spool to be drained
+            ship (Callable): function that receives each batch of entries and a dict kept across the attempts of the batch,
+                where it can record what was done already (e.g. the name of the file uploaded). It must raise an exception if
+                the batch was not shipped.
+            batch_bytes (int): size of the entries shipped at once
+            retry_backoff (float): seconds to wait before shipping a failed batch again. Doubles at every failure.
+            max_backoff (float): maximum seconds between two attempts
+            drain (bool): whether to stop and remove the spool once it's empty (e.g. the spool left by a process that exited)
+        """
+        self._spool = spool
+        self._ship = ship
+        self._batch_bytes = batch_bytes
+        self._retry_backoff = retry_backoff
+        self._max_backoff = max_backoff
+        self._drain = drain
+        self._failures = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._replay, name="spool-replayer", daemon=True)
+        self._thread.start()
+
+    @property
+    def failures(self) -> int:
+        """Amount of failed attempts to ship a batch since the replayer started"""
+        return self._failures
+
+    def stop(self, timeout: float = None):
+        """
+        Stops the replayer once the batch being shipped, if any, is done. Whatever is left in the spool is shipped the
+        next time it's opened.
+        """
+        self._stopped.set()
+        self._spool.wake()
+        self._thread.join(timeout)
+
+    def _replay(self):
+        while not self._stopped.is_set():
+            entries, position = self._spool.read(self._batch_bytes)
+            if not entries:
+                if self._drain:
+                    self._spool.remove()
+                    return
+                self._spool.wait(1)
+                continue
+            backoff = self._retry_backoff
+            state = {}
+            while True:
+                try:
+                    self._ship(entries, state)
+                    break
+                except Exception:
+                    traceback.print_exc()
+                    self._failures += 1
+                    #if stopped, the batch is not committed and will be shipped again
+                    if self._stopped.wait(backoff):
+                        return
+                    backoff = min(backoff * 2, self._max_backoff)
+            self._spool.commit(position)
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from collections import deque
+from typing import FrozenSet, List, Tuple
+
+
+class Subscription:
+    """
+    Entries of the live tail waiting to be sent to one viewer, in a queue of at most queue_size entries. The queue is filled
+    by the fan-out thread of the TailHub and emptied by the viewer's connection, either from a thread (poll) or from an
+    event loop (poll_async), so a slow viewer never blocks the others nor the ingestion. When the queue is full:
+        - sample: the entries that don't fit are skipped, and the viewer is told how many it missed;
+        - drop: the viewer is disconnected.
+    """
+
+    def __init__(self, hub, levels: FrozenSet[str], application_ids: FrozenSet[str], queue_size: int, slow_policy: str):
+        """
+        Args:
+            hub (TailHub): hub the subscription is registered in
+            levels (FrozenSet[str]): levels of the entries sent to the viewer. Empty sends every level.
+            application_ids (FrozenSet[str]): applications whose entries are sent to the viewer. Empty sends every application.
+            queue_size (int): maximum amount of entries waiting to be sent
+            slow_policy (str): sample or drop, what is done when the queue is full
+        """
+        self._hub = hub
+        self.levels = levels
+        self.application_ids = application_ids
+        self._queue_size = queue_size
+        self._slow_policy = slow_policy
+        self._entries = deque()
+        self._skipped = 0
+        #reason why the viewer was disconnected, None while it's subscribed
+        self._closed = None
+        self._condition = threading.Condition()
+        #wakes up the event loop waiting in poll_async, see offer
+        self._waker = None
+
+    def offer(self, entries: List[str]) -> int:
+        """
+        Queues the entries for the viewer, without blocking.
+        Returns:
+            int: amount of entries that were not queued
+        """
+        with self._condition:
+            if self._closed:
+                return len(entries)
+            room = self._queue_size - len(self._entries)
+            refused = max(0, len(entries) - room)
+            if refused:
+                if self._slow_policy == "drop":
+                    self._closed = "The viewer did not keep up with the logs and was disconnected"
+                    refused = len(entries)
+                    entries = []
+                else:
+                    self._skipped += refused
+                    entries = entries[:room]
+            self._entries.extend(entries)
+            self._condition.notify()
+            waker, self._waker = self._waker, None
+        if waker:
+            waker()
+        return refused
+
+    def skip(self, count: int):
+        """Tells the viewer that count entries were not delivered to it (e.g. the hub itself was behind)"""
+        with self._condition:
+            self._skipped += count
+            self._condition.notify()
+            waker, self._waker = self._waker, None
+        if waker:
+            waker()
+
+    def poll(self, timeout: float) -> Tuple[List[str], int, str]:
+        """
+        Waits up to timeout seconds for entries.
+        Returns:
+            tuple: the entries queued, how many were skipped since the last poll and, if the viewer was disconnected, why
+        """
+        with self._condition:
+            if not self._pending():
+                self._condition.wait(timeout)
+            return self._drain()
+
+    async def poll_async(self, timeout: float) -> Tuple[List[str], int, str]:
+        """poll for asyncio servers: the event loop is woken up by the fan-out thread instead of a thread waiting"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        with self._condition:
+            if self._pending():
+                return self._drain()
+            self._waker = lambda: loop.call_soon_threadsafe(ready.set)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._condition:
+            self._waker = None
+            return self._drain()
+
+    @property
+    def closed(self) -> str:
+        """Why the viewer was disconnected, or None while it's subscribed"""
+        return self._closed
+
+    def close(self):
+        """Unsubscribes the viewer, e.g. once it disconnected"""
+        self._hub.unsubscribe(self)
+
+    @staticmethod
+    def render(entries: List[str], skipped: int, closed: str) -> str:
+        """
+        Server-Sent Events of a poll: an event per entry, a skipped event with the amount of entries missed, a dropped event
+        once the viewer was disconnected, or a comment that keeps the connection alive if there's nothing to send.
+        """
+        events = ["data: {}\n\n".format(entry.rstrip("\n")) for entry in entries]
+        if skipped:
+            events.append('event: skipped\ndata: {{"skipped": {}}}\n\n'.format(skipped))
+        if closed:
+            events.append('event: dropped\ndata: {{"reason": "{}"}}\n\n'.format(closed))
+        return "".join(events) or ": keep-alive\n\n"
+
+    def _pending(self) -> bool:
+        return bool(self._entries or self._skipped or self._closed)
+
+    def _drain(self) -> Tuple[List[str], int, str]:
+        entries, skipped = list(self._entries), self._skipped
+        self._entries.clear()
+        self._skipped = 0
+        return entries, skipped, self._closed
@@ -0,0 +1,111 @@
+"""Publish/subscribe hub of the live tail: fans the entries accepted by the Logger out to the viewers of /log/tail"""
+import queue
+import threading
+from typing import Iterable, List
+from src.Formatter.JsonBackend import JsonBackend
+from src.Metrics.Metrics import Metrics
+from src.Tail.Subscription import Subscription
+
+
+class TailHub:
+    """
+    Receives every batch accepted by the Logger (it's a Logger listener) and hands the entries to the subscriptions whose
+    filters they match. Publishing only queues the batch, in a backlog of at most backlog batches, so ingestion never waits for
+    the viewers: a single fan-out thread filters the entries and offers them to each subscription, whose bounded queue
+    absorbs the differences of pace between viewers (see Subscription for what happens to the slow ones). If the fan-out
+    thread itself falls behind, batches that don't fit in the backlog are skipped for every viewer.
+    Without subscribers, publishing costs nothing.
+    The hub only knows the entries accepted by its own process: with several worker processes, each viewer gets the share of
+    the worker that serves it.
+    """
+
+    _SLOW_POLICIES = ("sample", "drop")
+
+    def __init__(self, queue_size: int = 1000, max_subscribers: int = 500, slow_policy: str = "sample", backlog: int = 1000,
+                 heartbeat: float = 15):
+        """
+        Args:
+            queue_size (int): maximum amount of entries waiting to be sent to each viewer
+            max_subscribers (int): maximum amount of viewers at once
+            slow_policy (str): sample (skip entries) or drop (disconnect), for viewers that don't keep up
+            backlog (int): maximum amount of batches waiting to be fanned out
+            heartbeat (float): seconds between two keep-alive comments sent to an idle viewer
+        """
+        if slow_policy not in self._SLOW_POLICIES:
+            raise Exception("Unknown slow subscribers policy {}. Please use one of {}".format(slow_policy, self._SLOW_POLICIES))
+        self._queue_size = queue_size
+        self._max_subscribers = max_subscribers
+        self._slow_policy = slow_policy
+        self.heartbeat = heartbeat
+        #replaced, never changed in place, so publishing reads it without a lock
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._batches = queue.Queue(maxsize=backlog)
+        self._thread = None
+        Metrics.register_gauge("logaggregator_tail_subscribers", self.subscribers)
+
+    def subscribe(self, levels: Iterable[str] = (), application_ids: Iterable[str] = ()) -> Subscription:
+        """
+        Registers a viewer of the entries with any of the levels and any of the application IDs (all of them if empty).
+        Raises:
+            queue.Full: if there are max_subscribers viewers already
+        """
+        subscription = Subscription(self, frozenset(levels), frozenset(application_ids), self._queue_size, self._slow_policy)
+        with self._lock:
+            if len(self._subscribers) >= self._max_subscribers:
+                raise queue.Full()
+            self._subscribers = self._subscribers + (subscription,)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._fan_out, name="tail-hub", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+
+    def publish(self, documents: List[str]):
+        """
+        Queues the entries to be fanned out to the viewers, without blocking. Meant to be a Logger listener.
+        Args:
+            documents (List[str]): JSON log entries, as produced by the parser
+        """
+        if not self._subscribers:
+            return
+        try:
+            self._batches.put_nowait(documents)
+        except queue.Full:
+            Metrics.increment("logaggregator_tail_skipped_total", len(documents) * len(self._subscribers))
+            for subscription in self._subscribers:
+                subscription.skip(len(documents))
+
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _fan_out(self):
+        while True:
+            documents = self._batches.get()
+            subscribers = self._subscribers
+            if not subscribers:
+                continue
+            fields = None
+            if any(s.levels or s.application_ids for s in subscribers):
+                #parsed once for every viewer
+                loads = JsonBackend.loads
+                fields = [(entry.get("level"), entry.get("application_id")) for entry in map(loads, documents)]
+            for subscription in subscribers:
+                levels, application_ids = subscription.levels, subscription.application_ids
+                if levels or application_ids:
+                    entries = [document for document, (level, application_id) in zip(documents, fields)
+                               if (not levels or level in levels) and (not application_ids or application_id in application_ids)]
+                else:
+                    entries = documents
+                if not entries:
+                    continue
+                refused = subscription.offer(entries)
+                if refused:
+                    Metrics.increment("logaggregator_tail_skipped_total", refused)
+                if subscription.closed:
+                    #dropped for being too slow: it gets nothing else
+                    Metrics.increment("logaggregator_tail_dropped_total")
+                    self.unsubscribe(subscription)
@@ -0,0 +1,119 @@
+import gzip
+import io
+import zlib
+from typing import BinaryIO, Optional
+from werkzeug.exceptions import RequestEntityTooLarge
+try:
+    import zstandard
+except ImportError:
+    #zstd support is optional: install the zstandard package to enable it
+    zstandard = None
+
+_DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class Compression:
+    """
+    Class to centralize the codecs used to compress the payloads received by LogAggregator and the log files it uploads to S3.
+    gzip is always available, while zstd depends on the optional zstandard package.
+    """
+
+    GZIP = "gzip"
+    ZSTD = "zstd"
+    _EXTENSIONS = {
+        GZIP: ".gz",
+        ZSTD: ".zst"
+    }
+
+    @staticmethod
+    def available(encoding: str) -> bool:
+        """
+        Whether the encoding (as in the Content-Encoding header) can be handled by this installation
+        """
+        if encoding == Compression.ZSTD:
+            return zstandard is not None
+        return encoding == Compression.GZIP
+
+    @staticmethod
+    def reader(stream: BinaryIO, encoding: str, max_size: Optional[int] = None) -> BinaryIO:
+        """
+        Wraps a compressed stream into a file-like object that decompresses it as it is read.
+        Corrupted data is reported as ValueError when read.
+        Args:
+            stream (BinaryIO): compressed stream (e.g. flask.Request.stream)
+            encoding (str): gzip or zstd
+            max_size (int): maximum amount of decompressed bytes. RequestEntityTooLarge is raised once it's exceeded,
+            which protects the aggregator from small payloads that decompress into huge ones.
+        """
+        if not Compression.available(encoding):
+            raise ValueError("Unsupported compression {}".format(encoding))
+        if encoding == Compression.GZIP:
+            decompressed = gzip.GzipFile(fileobj=stream, mode="rb")
+        else:
+            decompressed = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        return _DecompressingReader(decompressed, encoding, max_size)
+
+    @staticmethod
+    def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+        """
+        Decompresses a whole payload. Data without encoding is returned as is.
+        """
+        if not encoding:
+            return data
+        if not Compression.available(encoding):
+            raise ValueError("Unsupported compression {}".format(encoding))
+        if encoding == Compression.GZIP:
+            return gzip.decompress(data)
+        return Compression.reader(io.BytesIO(data), encoding).read()
+
+    @staticmethod
+    def open_text(path: str, encoding: Optional[str]):
+        """
+        Opens a text file for writing, compressing what is written to it with the encoding, if any.
+        """
+        if not encoding:
+            return open(path, "wt", encoding="utf-8")
+        if not Compression.available(encoding):
+            raise ValueError("Unsupported compression {}".format(encoding))
+        if encoding == Compression.GZIP:
+            return gzip.open(path, "wt", encoding="utf-8")
+        return zstandard.open(path, "wt", encoding="utf-8")
+
+    @staticmethod
+    def extension(encoding: Optional[str]) -> str:
+        """File extension appended to the name of files compressed with the encoding"""
+        return Compression._EXTENSIONS.get(encoding, "")
+
+    @staticmethod
+    def encoding_of(file_name: str) -> Optional[str]:
+        """Compression of a file, inferred from its extension. None for uncompressed files."""
+        for encoding, extension in Compression._EXTENSIONS.items():
+            if file_name.endswith(extension):
+                return encoding
+        return None
+
+
+class _DecompressingReader:
+    """
+    Read-only wrapper that reports corrupted compressed data as ValueError, like other malformed payloads,
+    and enforces the maximum decompressed size.
+    """
+
+    def __init__(self, stream: BinaryIO, encoding: str, max_size: Optional[int]):
+        self._stream = stream
+        self._encoding = encoding
+        self._max_size = max_size
+        self._size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            #read in chunks, so the size limit is checked before the whole payload is in memory
+            return b"".join(iter(lambda: self.read(65536), b""))
+        try:
+            data = self._stream.read(size)
+        except _DECOMPRESSION_ERRORS as exc:
+            raise ValueError("Invalid {} payload: {}".format(self._encoding, exc)) from exc
+        self._size += len(data)
+        if self._max_size is not None and self._size > self._max_size:
+            raise RequestEntityTooLarge("Decompressed payload exceeds {} bytes".format(self._max_size))
+        return data
@@ -6,10 +6,15 @@ class Constants(Enum):
     """
     HTTP_BAD_REQUEST = 400
     HTTP_CONFLICT = 409
+    HTTP_NOT_FOUND = 404
     HTTP_UNAUTHORIZED = 401
     HTTP_INTERNAL_SERVER_ERROR = 500
     HTTP_OK = 200
     HTTP_CREATED = 201
+    HTTP_PAYLOAD_TOO_LARGE = 413
+    HTTP_UNSUPPORTED_MEDIA_TYPE = 415
+    HTTP_BAD_GATEWAY = 502
+    HTTP_SERVICE_UNAVAILABLE = 503
     
     
     
\ No newline at end of file
@@ -0,0 +1,18 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasher:
+    """
+    Hashes and checks the passwords with werkzeug's scrypt, expensive on purpose. It runs in the calling thread: every caller
+    is a request thread of the Flask app (also under the asyncio server, through the WSGIBridge), which can't yield while
+    waiting, so handing the work to a pool would only add the wait for a free slot. Hashing releases the GIL, so the other
+    request threads keep running meanwhile.
+    """
+
+    @staticmethod
+    def hash(password: str) -> str:
+        return generate_password_hash(password)
+
+    @staticmethod
+    def check(password_hash: str, password: str) -> bool:
+        return check_password_hash(password_hash, password)
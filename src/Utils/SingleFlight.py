@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: while a call is in flight, callers asking for the same key wait for its
+    result instead of running their own. Nothing is kept once the call returns, see TTLCache for that.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._coalesced = 0
+
+    def do(self, key: Hashable, function: Callable):
+        """
+        Runs function(), unless a call for the key is already running, in which case its outcome is shared.
+        Raises:
+            whatever the running call raised
+        Returns:
+            the result of the call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self._coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def coalesced(self) -> int:
+        """Amount of calls that were answered by another call in flight"""
+        return self._coalesced
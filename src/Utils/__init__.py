@@ -1 +1,5 @@
-from .Constants import Constants
\ No newline at end of file
+from .Constants import Constants
+from .Compression import Compression
+from .TTLCache import TTLCache
+from .PasswordHasher import PasswordHasher
+from .SingleFlight import SingleFlight
\ No newline at end of file
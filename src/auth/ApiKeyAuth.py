@@ -0,0 +1,29 @@
+from functools import wraps
+from flask import g, jsonify, request
+from flask_jwt_extended import jwt_required
+from src.models import ApiKey
+from src.Utils import Constants
+
+
+API_KEY_HEADER = "X-API-Key"
+
+def api_key_or_jwt_required():
+    """
+    Decorator for endpoints that accept an API key (X-API-Key header) as an alternative to a JWT.
+    A valid key is stored in flask.g.api_key. Requests without the header go through the usual JWT verification.
+    """
+    def wrapper(fn):
+        jwt_protected = jwt_required()(fn)
+
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            key = request.headers.get(API_KEY_HEADER)
+            if key is None:
+                return jwt_protected(*args, **kwargs)
+            api_key = ApiKey.verify(key)
+            if not api_key:
+                return jsonify({"message" : "Invalid API key", "error" : "invalid_api_key"}), Constants.HTTP_UNAUTHORIZED.value
+            g.api_key = api_key
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
@@ -36,3 +36,17 @@ def delete_user():
     Endpoint to allow deletion of an user. Only users with admin rights can access this resource.
     """
     return AuthService.delete_user()
+
+@auth_bp.post("/apikey")
+def issue_api_key():
+    """
+    Endpoint to issue an API key for an application. Only the admin user can issue keys.
+    """
+    return AuthService.issue_api_key()
+
+@auth_bp.delete("/apikey/<key_id>")
+def revoke_api_key(key_id):
+    """
+    Endpoint to revoke an API key. Only the admin user can revoke keys.
+    """
+    return AuthService.revoke_api_key(key_id)
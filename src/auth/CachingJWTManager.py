@@ -0,0 +1,44 @@
+import hashlib
+import time
+from flask_jwt_extended import JWTManager
+from src.Utils import TTLCache
+
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that keeps the claims of the tokens it has already verified, so the clients sending the same bearer token
+    in every request skip the signature verification and the parsing of the token.
+    Tokens are cached by their SHA-256 digest until their own expiration (exp claim), in a LRU cache of
+    JWT_VERIFIED_CACHE_SIZE entries (app config). Blocklist and user loader callbacks, if any, still run in every request.
+    """
+
+    def __init__(self, app=None):
+        self._token_cache = TTLCache()
+        super().__init__(app)
+
+    def init_app(self, app):
+        super().init_app(app)
+        #a new app may use a different secret: tokens verified with the previous one must not be trusted
+        self._token_cache = TTLCache(max_size=app.config.get("JWT_VERIFIED_CACHE_SIZE", 4096))
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        key = hashlib.sha256(encoded_token.encode("utf-8") if isinstance(encoded_token, str) else encoded_token).digest()
+        claims = self._token_cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            if "exp" in claims:
+                self._token_cache.set(key, claims, ttl=claims["exp"] - time.time())
+        #a copy, so the request can't change the cached claims
+        return dict(claims)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns:
+            dict: hits, misses, size and hit rate of the verified token cache
+        """
+        stats = self._token_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -3,4 +3,5 @@ from enum import Enum
 class Constants(Enum):
     MISSING_AUTH = "missing authorization for requested resource"
     CLAIM_CREATE_USER = "create_user"
+    CLAIM_READ_LOGS = "read_logs"
     
\ No newline at end of file
@@ -1,5 +1,5 @@
-from flask_jwt_extended import JWTManager
 from flask import jsonify
+from src.auth.CachingJWTManager import CachingJWTManager
 
 
 class LogJWTManager:
@@ -12,7 +12,8 @@ class LogJWTManager:
         return cls._instance
     
     def __init__(self):
-        self._jwt = JWTManager()
+        #verified tokens are cached, see CachingJWTManager
+        self._jwt = CachingJWTManager()
     
     @classmethod
     def get_instance(cls):
@@ -20,6 +21,12 @@ class LogJWTManager:
             
     def get_jwt_manager(self):
         return self._jwt
+
+    @staticmethod
+    def token_cache_stats() -> dict:
+        """Hits, misses, size and hit rate of the verified token cache"""
+        jwt_manager = LogJWTManager.get_instance()
+        return jwt_manager._jwt.cache_stats() if jwt_manager else {}
     
     @staticmethod
     def initialize_manager(app):
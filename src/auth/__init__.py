@@ -1,3 +1,4 @@
 from .Auth import auth_bp
 from .PayloadValidator import PayloadValidator
-from .LogJWTManager import LogJWTManager
\ No newline at end of file
+from .LogJWTManager import LogJWTManager
+from .ApiKeyAuth import api_key_or_jwt_required
\ No newline at end of file
@@ -1 +1,3 @@
-from .log import LogBlueprint
\ No newline at end of file
+from .log import LogBlueprint
+from .metrics import MetricsBlueprint
+from .search import SearchBlueprint
\ No newline at end of file
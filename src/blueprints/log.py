@@ -1,17 +1,22 @@
 
 from flask import Blueprint
 from src.services.log_service import LogService
+from src.services.tail_service import TailService
 
 
 class LogBlueprint():
     
     @staticmethod
-    def create_log_blueprint(logger):
+    def create_log_blueprint(logger, profiler=None, tail_hub=None):
         """
         Creates the log functionality blueprint. This is the main functionality that calls the remainder of the methods to push to S3 and Elasticsearch
         Args:
             logger (src.Logger.Logger): An instance of a Logger object, which defines the logging utility (process, parse, send to S3, etc).
             This should be the LogAggregator's log instance as this blueprint will be registered in the LogAggregator class.
+            profiler (src.Profiling.RequestProfiler): captures the slow requests to /log and profiles a sample of them.
+            None (logs.profiling disabled) leaves the requests untouched.
+            tail_hub (src.Tail.TailHub): hub the accepted entries are published to, streamed by /log/tail. None (logs.tail
+            disabled) leaves /log/tail out.
 
         Returns:
             log_bp (Blueprint): the log blueprint to be used in the LogAggregator construction.
@@ -22,8 +27,18 @@ class LogBlueprint():
         def online():
             return LogService.online()
         
-        @log_bp.post("/log")
-        def log():
-            return LogService.log(logger)
-            
+        if profiler:
+            @log_bp.post("/log")
+            def log():
+                return profiler.run(LogService.log, logger)
+        else:
+            @log_bp.post("/log")
+            def log():
+                return LogService.log(logger)
+
+        if tail_hub:
+            @log_bp.get("/log/tail")
+            def tail():
+                return TailService.tail(tail_hub)
+
         return log_bp
\ No newline at end of file
@@ -0,0 +1,24 @@
+from flask import Blueprint
+from src.services.metrics_service import MetricsService
+
+
+class MetricsBlueprint():
+
+    @staticmethod
+    def create_metrics_blueprint():
+        """
+        Creates the metrics blueprint, which exposes /metrics to be scraped by Prometheus and times every request of the app.
+        Returns:
+            metrics_bp (Blueprint): the metrics blueprint to be used in the LogAggregator construction.
+        """
+        metrics_bp = Blueprint("metrics", __name__)
+
+        @metrics_bp.get("/metrics")
+        def metrics():
+            return MetricsService.metrics()
+
+        MetricsService.register_gauges()
+        metrics_bp.before_app_request(MetricsService.start_request)
+        metrics_bp.after_app_request(MetricsService.end_request)
+
+        return metrics_bp
@@ -0,0 +1,25 @@
+from flask import Blueprint
+from src.services.search_service import SearchService
+
+
+class SearchBlueprint():
+
+    @staticmethod
+    def create_search_blueprint(log_search, recent_logs=None):
+        """
+        Creates the search blueprint, which exposes /search to look up the indexed logs with simple filters.
+        Args:
+            log_search (src.Search.LogSearch): translates the filters into Elasticsearch queries and caches their results.
+            recent_logs (src.Search.RecentLogs): entries received recently, searched by log_search. Only used for the metrics.
+        Returns:
+            search_bp (Blueprint): the search blueprint to be used in the LogAggregator construction.
+        """
+        search_bp = Blueprint("search", __name__)
+
+        @search_bp.get("/search")
+        def search():
+            return SearchService.search(log_search)
+
+        SearchService.register_gauges(log_search, recent_logs)
+
+        return search_bp
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc, make_url, text
 #from src.models import * #import all models to initialize the database
 
 
@@ -32,10 +33,50 @@ class DB:
     
     @staticmethod
     def initialize_db(app):
+        """
+        Binds the database to the app and creates the tables. SQLite databases run in WAL mode, so readers don't wait for
+        a writer, and wait up to SQLITE_BUSY_TIMEOUT_MS (app config) for a lock instead of failing right away.
+        The connection pool can be tuned through SQLALCHEMY_ENGINE_OPTIONS. The options that are not set there get a default,
+        and the pool is sized only when it's a pool that accepts it (not with a poolclass of the caller, nor with the single
+        connection of an in-memory SQLite database).
+        """
+        options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        options.setdefault("pool_pre_ping", True)
+        if "poolclass" not in options and not DB._is_memory_sqlite(app.config.get("SQLALCHEMY_DATABASE_URI")):
+            options.setdefault("pool_size", 10)
+            options.setdefault("max_overflow", 20)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
         db = DB.db_instance()
         db.init_app(app)
         with app.app_context():
+            if db.engine.dialect.name == "sqlite":
+                busy_timeout = app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000)
+                event.listen(db.engine, "connect", lambda conn, _: DB._configure_sqlite(conn, busy_timeout))
+                #connections opened before the listener was added
+                db.engine.dispose()
             db.create_all()
+            #tables created before the username was indexed
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)"))
+            except exc.SQLAlchemyError as e:
+                print("Error upon creating the index on users.username (are there duplicated usernames?): {}".format(e))
+
+    @staticmethod
+    def _is_memory_sqlite(uri) -> bool:
+        """Whether uri is an in-memory SQLite database, which is served by a single connection (StaticPool)"""
+        if not uri:
+            return False
+        url = make_url(uri)
+        return url.get_backend_name() == "sqlite" and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory")
+
+    @staticmethod
+    def _configure_sqlite(conn, busy_timeout: int):
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout={}".format(int(busy_timeout)))
+        cursor.close()
             
     @staticmethod
     def end_db(app):
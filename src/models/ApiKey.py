@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timezone
+from uuid import uuid4
+from flask import current_app
+from src.database import DB
+
+
+db = DB.db_instance()
+
+class ApiKey(db.Model):
+    """
+    Long-lived key issued by the admin to an application, accepted on /log instead of a JWT (X-API-Key header).
+    Only a keyed HMAC-SHA256 digest of the key is stored: verifying a key costs one hash and one indexed lookup, instead of
+    the password hashing of a login.
+    """
+    __tablename__ = 'api_keys'
+    _KEY_PREFIX = "lak_"
+    id = db.Column(db.String(), primary_key=True, default=lambda: str(uuid4()), unique=True)
+    application = db.Column(db.String(), nullable=False) #application that uses the key to send its logs
+    digest = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    created_by = db.Column(db.String(), nullable=False)
+    created_at = db.Column(db.DateTime(), nullable=False, default=lambda: datetime.now(timezone.utc))
+    revoked = db.Column(db.Boolean(), nullable=False, default=False)
+
+    def __repr__(self):
+        return f"ApiKey {self.id} ({self.application})"
+
+    @staticmethod
+    def digest_of(key: str) -> str:
+        #API_KEY_SECRET allows rotating the JWT secret without invalidating the issued keys
+        secret = current_app.config.get("API_KEY_SECRET") or current_app.config["JWT_SECRET_KEY"]
+        return hmac.new(secret.encode("utf-8"), key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def issue(application: str, created_by: str):
+        """
+        Creates a key for the application. The key itself is only returned here, it can't be retrieved later.
+        Returns:
+            tuple: the stored ApiKey and the key to be handed over to the application
+        """
+        key = ApiKey._KEY_PREFIX + secrets.token_urlsafe(32)
+        api_key = ApiKey(application=application, digest=ApiKey.digest_of(key), created_by=created_by)
+        api_key.save()
+        return api_key, key
+
+    @staticmethod
+    def verify(key: str):
+        """
+        Returns:
+            ApiKey: the key record if the key was issued and not revoked, None otherwise
+        """
+        if not key or not key.startswith(ApiKey._KEY_PREFIX):
+            return None
+        digest = ApiKey.digest_of(key)
+        api_key = ApiKey.query.filter_by(digest=digest, revoked=False).first()
+        if not api_key or not hmac.compare_digest(api_key.digest, digest):
+            return None
+        return api_key
+
+    @staticmethod
+    def by_id(key_id: str):
+        return db.session.get(ApiKey, key_id)
+
+    def revoke(self):
+        self.revoked = True
+        self.save()
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
@@ -1,6 +1,8 @@
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
 from src.database import DB
+from src.Utils import PasswordHasher, TTLCache
 from uuid import uuid4
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 db = DB.db_instance()
@@ -8,34 +10,56 @@ db = DB.db_instance()
 class User(db.Model):
     __tablename__= 'users'
     id = db.Column(db.String(), primary_key=True, default=lambda: str(uuid4()), unique=True)
-    username = db.Column(db.String(),nullable=False)
+    username = db.Column(db.String(),nullable=False, unique=True, index=True)
     password = db.Column(db.Text(), nullable=False) #this CANNOT be commited like this. we need to store the cryptographed password value
-    
+    #users read recently, by database and username. Kept for USER_CACHE_TTL_SECONDS (app config), as other processes may change them.
+    _cache = TTLCache(max_size=1024)
+
     def __repr__(self):
         """
         Inherited from db.Model. Allows the representation of the data model as a human readable format
         """
         return f"User {self.username}"
-    
-    
+
+
     def set_password(self, password: str):
-        self.password = generate_password_hash(password)
-        
+        self.password = PasswordHasher.hash(password)
+
     def validate_password(self, password: str):
-        return check_password_hash(self.password, password)
-    
+        return PasswordHasher.check(self.password, password)
+
     @staticmethod
     def by_id(username):
-        return User.query.filter_by(username=username).first()
-    
+        """
+        Returns the user with the username, or None. Recently read users are taken from the cache, without querying the database.
+        """
+        key = User._cache_key(username)
+        snapshot = User._cache.get(key)
+        if snapshot:
+            user = User(**snapshot)
+            #the cached state is what's in the database: attached to the session as is, without loading it again
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+        user = User.query.filter_by(username=username).first()
+        if user:
+            User._cache.set(key, {"id": user.id, "username": user.username, "password": user.password},
+                            ttl=current_app.config.get("USER_CACHE_TTL_SECONDS", 5))
+        return user
+
+    @staticmethod
+    def _cache_key(username):
+        return (str(db.engine.url), username)
+
     def save(self):
         db.session.add(self)
         db.session.commit()
-        
+        User._cache.invalidate(User._cache_key(self.username))
+
     def delete(self):
         db.session.delete(self)
         db.session.commit()
-        
+        User._cache.invalidate(User._cache_key(self.username))
+
     @staticmethod
     def create_admin():
         """
@@ -43,11 +67,11 @@ class User(db.Model):
         In other words. we need to have basic authentication for the register endpoint. The objective is to control who can register users.
         In our application, we want the admin to distribute users for each of the apps, and not the app themselves generating users.
         """
+        created_admin = User.by_id("admin")
+        if created_admin:
+            return
         admin = User(
             username="admin",
         )
         admin.set_password("changeme")
-        created_admin = User.by_id("admin")
-        if created_admin:
-            return
-        admin.save()
\ No newline at end of file
+        admin.save()
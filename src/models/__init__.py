@@ -1 +1,2 @@
-from .User import User
\ No newline at end of file
+from .User import User
+from .ApiKey import ApiKey
@@ -1,2 +1,5 @@
 from src.services.auth_service import AuthService
-from src.services.log_service import LogService
\ No newline at end of file
+from src.services.log_service import LogService
+from src.services.metrics_service import MetricsService
+from src.services.search_service import SearchService
+from src.services.tail_service import TailService
\ No newline at end of file
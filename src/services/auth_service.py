@@ -1,7 +1,7 @@
 import base64
 from flask import request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt
-from src.models import User
+from src.models import User, ApiKey
 from src.auth.PayloadValidator import PayloadValidator
 from src.auth.Constants import Constants as AuthConstants
 from src.Utils import Constants
@@ -88,6 +88,8 @@ class AuthService:
         }
         if username == 'admin':
             additional_claims["perm"].append("create_user")
+            #reading the logs of every application is reserved to the admin, like managing the users
+            additional_claims["perm"].append("read_logs")
         return create_access_token(identity=username, additional_claims=additional_claims)
     
     @staticmethod
@@ -141,6 +143,57 @@ class AuthService:
                 "message": str(e)
             }), Constants.HTTP_BAD_REQUEST.value
 
+    @staticmethod
+    @jwt_required()
+    def issue_api_key():
+        """
+        Issues an API key for an application, to be sent in the X-API-Key header of /log requests. Only the admin can issue keys.
+        The key is returned only once: it's stored as a digest.
+        """
+        claims = get_jwt()
+        if AuthConstants.CLAIM_CREATE_USER.value not in claims["perm"]:
+            return jsonify({
+                "message": AuthConstants.MISSING_AUTH.value
+            }), Constants.HTTP_UNAUTHORIZED.value
+        try:
+            data = request.get_json(silent=True) or {}
+            PayloadValidator.validate_payload(data)
+            application = data["application"]
+            if not application:
+                raise ValueError("Empty application")
+        except (ValueError, KeyError):
+            return jsonify({
+                "message": "Illegal argument in your request. Please check your input"
+            }), Constants.HTTP_BAD_REQUEST.value
+        api_key, key = ApiKey.issue(application, claims["sub"])
+        return jsonify({
+            "message": "API key created",
+            "id": api_key.id,
+            "application": api_key.application,
+            "key": key
+        }), Constants.HTTP_CREATED.value
+
+    @staticmethod
+    @jwt_required()
+    def revoke_api_key(key_id: str):
+        """
+        Revokes an API key: requests sent with it are refused from now on. Only the admin can revoke keys.
+        """
+        claims = get_jwt()
+        if AuthConstants.CLAIM_CREATE_USER.value not in claims["perm"]:
+            return jsonify({
+                "message": AuthConstants.MISSING_AUTH.value
+            }), Constants.HTTP_UNAUTHORIZED.value
+        api_key = ApiKey.by_id(key_id)
+        if not api_key:
+            return jsonify({
+                "message": "API key not found"
+            }), Constants.HTTP_NOT_FOUND.value
+        api_key.revoke()
+        return jsonify({
+            "message": "API key revoked"
+        }), Constants.HTTP_OK.value
+
     @staticmethod
     def get_user():
         """Retrieves the user that will have their password changed"""
@@ -1,9 +1,12 @@
 import json
+import queue
 from json import JSONDecodeError
 from flask_jwt_extended import jwt_required, get_jwt, exceptions
 from pydantic import ValidationError
-from flask import request
-from src.Utils import Constants
+from flask import g, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from src.Utils import Constants, Compression
+from src.auth.ApiKeyAuth import api_key_or_jwt_required
 
 class LogService:
     """
@@ -18,7 +21,7 @@ class LogService:
         return "<h1> LogAggregator is online </h1>"
     
     @staticmethod
-    @jwt_required()
+    @api_key_or_jwt_required()
     def log(logger):
         """Method to log messages from different sources. The full structure of the logging messages is defined in class Logger.py
             this method logs the message using the Logger definition, returning to the client the origin IP of the logged messages.
@@ -27,12 +30,17 @@ class LogService:
             None
         """        
         try:
-            claims = get_jwt()
-            if "log" not in claims["perm"]:
+            #API keys are issued only to send logs
+            permissions = ["log"] if g.get("api_key") else get_jwt()["perm"]
+            if "log" not in permissions:
                 return json.dumps({
                     "error": "missing authorization for requested resource"
                 }), Constants.HTTP_UNAUTHORIZED.value
-            logger.log(request, request.data)
+            payload_stream = LogService._decompressed_stream()
+            if logger.streaming:
+                logger.log_stream(request, payload_stream or request.stream)
+            else:
+                logger.log(request, payload_stream.read() if payload_stream else request.data)
             return f"Log received from {request.remote_addr}", Constants.HTTP_OK.value
         except JSONDecodeError as e:
             return f"Invalid JSON: {e.args}, document is {e.doc}", Constants.HTTP_BAD_REQUEST.value
@@ -46,6 +54,26 @@ class LogService:
                 "Details" : e.errors()
             }
             return json.dumps(error_msg), Constants.HTTP_BAD_REQUEST.value
+        except UnsupportedMediaType:
+            return f"Unsupported Content-Encoding {request.content_encoding}. Send the payload uncompressed, or compressed with gzip or zstd.", Constants.HTTP_UNSUPPORTED_MEDIA_TYPE.value
+        except RequestEntityTooLarge:
+            return f"Payload larger than the maximum of {request.max_content_length} bytes accepted by the aggregator", Constants.HTTP_PAYLOAD_TOO_LARGE.value
+        except queue.Full:
+            return "The log shipping queue (or rollover buffer) is full. Please retry later.", Constants.HTTP_SERVICE_UNAVAILABLE.value
         except exceptions.NoAuthorizationError:
             return "Invalid authorization header. Please check your request header Authorization record", Constants.HTTP_BAD_REQUEST.value
-        
\ No newline at end of file
+
+    @staticmethod
+    def _decompressed_stream():
+        """
+        Returns a stream that decompresses the request body according to its Content-Encoding header (gzip, or zstd if the
+        zstandard package is installed), or None for uncompressed bodies. The decompressed size is capped by MAX_CONTENT_LENGTH.
+        Raises:
+            UnsupportedMediaType: if the body is compressed with an encoding that is not supported
+        """
+        encoding = request.content_encoding
+        if not encoding or encoding == "identity":
+            return None
+        if not Compression.available(encoding):
+            raise UnsupportedMediaType()
+        return Compression.reader(request.stream, encoding, request.max_content_length)
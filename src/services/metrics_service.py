@@ -0,0 +1,44 @@
+import time
+from flask import g, request
+from src.Metrics.Metrics import Metrics
+from src.auth.LogJWTManager import LogJWTManager
+from src.Utils import Constants
+
+
+class MetricsService:
+    """
+    Metrics logic to be called in the blueprint definition: renders the metrics and times every request served by the app.
+    """
+
+    _CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    @staticmethod
+    def metrics():
+        """
+        Metrics of every worker process of LogAggregator, in the Prometheus text format.
+        """
+        return Metrics.render(), Constants.HTTP_OK.value, {"Content-Type": MetricsService._CONTENT_TYPE}
+
+    @staticmethod
+    def register_gauges():
+        """Gauges of the components shared by the whole app"""
+        for stat in ("hits", "misses", "size"):
+            Metrics.register_gauge("logaggregator_token_cache", lambda stat=stat: LogJWTManager.token_cache_stats().get(stat, 0), stat=stat)
+
+    @staticmethod
+    def start_request():
+        g.request_start = time.perf_counter()
+
+    @staticmethod
+    def end_request(response):
+        """
+        Records the time taken by the request and, for /log, the size of its payload as sent by the client.
+        """
+        start = g.get("request_start")
+        if start is not None:
+            #the rule, not the path, so the amount of series does not depend on the URLs requested
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            Metrics.observe("logaggregator_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+            if endpoint == "/log" and request.content_length:
+                Metrics.increment("logaggregator_bytes_received_total", request.content_length)
+        return response
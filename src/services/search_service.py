@@ -0,0 +1,45 @@
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt, jwt_required
+from src.auth.Constants import Constants as AuthConstants
+from src.Metrics.Metrics import Metrics
+from src.Utils import Constants
+
+
+class SearchService:
+    """
+    Search logic to be called in the blueprint definition: looks up the indexed logs matching the filters of the request.
+    """
+
+    @staticmethod
+    @jwt_required()
+    def search(log_search):
+        """
+        Entries matching the filters of the query string, most recent first. See src.Search.LogSearch for the filters.
+        The X-Cache header tells whether the result came from the recent entries of the process (LOCAL), from the cache (HIT)
+        or from Elasticsearch (MISS). Requires the read_logs permission, as the logs of every application are searched.
+        Args:
+            log_search (src.Search.LogSearch): search shared by the whole app, holding the cache
+        """
+        if AuthConstants.CLAIM_READ_LOGS.value not in get_jwt()["perm"]:
+            return jsonify({
+                "message": AuthConstants.MISSING_AUTH.value
+            }), Constants.HTTP_UNAUTHORIZED.value
+        try:
+            result, source = log_search.search(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), Constants.HTTP_BAD_REQUEST.value
+        except Exception as e:
+            print("Error upon searching the logs with {}: {}".format(request.query_string.decode("utf-8", "replace"), e))
+            return jsonify({
+                "message": "Error upon searching the logs. Please contact the system's administrator."
+            }), Constants.HTTP_BAD_GATEWAY.value
+        return jsonify(result), Constants.HTTP_OK.value, {"X-Cache": source}
+
+    @staticmethod
+    def register_gauges(log_search, recent_logs=None):
+        """Efficiency of the search cache, and size of the buffer of recent entries if there's one"""
+        for stat in ("hits", "misses", "size", "coalesced"):
+            Metrics.register_gauge("logaggregator_search_cache", lambda stat=stat: log_search.cache_stats()[stat], stat=stat)
+        if recent_logs:
+            for stat in ("entries", "bytes"):
+                Metrics.register_gauge("logaggregator_recent_logs", lambda stat=stat: recent_logs.stats()[stat], stat=stat)
@@ -0,0 +1,92 @@
+import queue
+from flask import Response, jsonify, request
+from flask_jwt_extended import get_jwt, jwt_required
+from src.auth.Constants import Constants as AuthConstants
+from src.LogEntry.LogEntry import LogLevel
+from src.Tail.Subscription import Subscription
+from src.Utils import Constants
+
+
+class TailService:
+    """
+    Live tail logic to be called in the blueprint definition: streams the entries accepted by the aggregator as Server-Sent
+    Events, as they arrive.
+    """
+
+    _LEVELS = frozenset(level.value for level in LogLevel)
+    #proxies (e.g. nginx) must not buffer the stream
+    HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    @staticmethod
+    def tail(tail_hub):
+        """
+        Streams the entries matching the level and application_id filters of the query string (comma separated or repeated).
+        Each entry is a message event with the JSON document. Viewers that miss entries get a skipped event with the amount
+        missed, and viewers disconnected for being too slow a dropped event.
+        A viewer holds its request thread for as long as it watches, so the tail is refused by servers that aren't threaded
+        (wsgi.multithread), like the sync workers of gunicorn: it would take the only thread of the worker, and /log with it.
+        Each worker process only streams the entries it accepted itself.
+        Args:
+            tail_hub (src.Tail.TailHub): hub the entries accepted by the Logger are published to
+        """
+        if not request.environ.get("wsgi.multithread", False):
+            return jsonify({
+                "message": "The live tail needs a threaded server (e.g. gunicorn --threads) or the asyncio server"
+            }), Constants.HTTP_SERVICE_UNAVAILABLE.value
+        subscription = TailService.subscribe(tail_hub)
+        if not isinstance(subscription, Subscription):
+            return subscription
+        return Response(TailService.events(subscription, tail_hub.heartbeat), mimetype="text/event-stream",
+                        headers=TailService.HEADERS)
+
+    @staticmethod
+    @jwt_required()
+    def subscribe(tail_hub):
+        """
+        Subscribes the viewer to the hub with the filters of the request. Requires the read_logs permission, as the entries
+        of every application are streamed.
+        Returns:
+            Subscription: the viewer's subscription, or the error response if the viewer is not allowed to read the logs,
+            the filters are invalid or the hub is full
+        """
+        if AuthConstants.CLAIM_READ_LOGS.value not in get_jwt()["perm"]:
+            return jsonify({
+                "message": AuthConstants.MISSING_AUTH.value
+            }), Constants.HTTP_UNAUTHORIZED.value
+        levels = TailService._values("level", str.upper)
+        unknown = levels.difference(TailService._LEVELS)
+        if unknown:
+            return jsonify({
+                "message": "Unknown level {}. Please use one of {}".format(", ".join(sorted(unknown)), sorted(TailService._LEVELS))
+            }), Constants.HTTP_BAD_REQUEST.value
+        try:
+            return tail_hub.subscribe(levels, TailService._values("application_id"))
+        except queue.Full:
+            return jsonify({
+                "message": "Too many viewers of the live tail. Please retry later."
+            }), Constants.HTTP_SERVICE_UNAVAILABLE.value
+
+    @staticmethod
+    def events(subscription: Subscription, heartbeat: float):
+        """
+        Server-Sent Events of the subscription, until the viewer disconnects or is dropped. A comment is sent every heartbeat
+        seconds without entries, so proxies keep the connection open and a viewer that left is noticed.
+        """
+        try:
+            #sent right away, so the viewer knows it's subscribed
+            yield ": subscribed\n\n"
+            while True:
+                entries, skipped, closed = subscription.poll(heartbeat)
+                yield Subscription.render(entries, skipped, closed)
+                if closed:
+                    return
+        finally:
+            subscription.close()
+
+    @staticmethod
+    def _values(name: str, transform=str) -> set:
+        """Values of a filter sent either repeated or comma separated"""
+        values = set()
+        for value in request.args.getlist(name):
+            values.update(transform(item.strip()) for item in value.split(",") if item.strip())
+        return values
@@ -0,0 +1,79 @@
+"""Unit tests for the API keys accepted on /log as an alternative to a JWT"""
+import unittest
+import os
+import sys
+import base64
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+from src.models import ApiKey
+from src.Utils import Constants, PasswordHasher
+from test.test_app_factory import TestAppFactory
+
+
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "src"))
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent)))
+
+LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+class test_api_key(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.client_app = self.app.test_client()
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    def token(self, username: str, password: str) -> dict:
+        auth_pass = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("utf-8")
+        token = self.client_app.get("/auth/login", headers={"Authorization": f"Basic {auth_pass}"}).get_json()["token"]["access"]
+        return {"Authorization": f"Bearer {token}"}
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_issued_key_is_accepted_until_revoked(self, ship_mock):
+        admin = self.token("admin", "changeme")
+        response = self.client_app.post("/auth/apikey", json={"application": "billing"}, headers=admin)
+        self.assertEqual(response.status_code, Constants.HTTP_CREATED.value)
+        key_id, key = response.get_json()["id"], response.get_json()["key"]
+        with patch.object(PasswordHasher, "check") as check_password_mock:
+            response = self.client_app.post("/log", data=LINE, headers={"X-API-Key": key})
+            check_password_mock.assert_not_called()
+        self.assertEqual(response.status_code, Constants.HTTP_OK.value)
+        self.assertEqual(ship_mock.call_count, 1)
+        response = self.client_app.delete(f"/auth/apikey/{key_id}", headers=admin)
+        self.assertEqual(response.status_code, Constants.HTTP_OK.value)
+        response = self.client_app.post("/log", data=LINE, headers={"X-API-Key": key})
+        self.assertEqual(response.status_code, Constants.HTTP_UNAUTHORIZED.value)
+
+    def test_key_is_stored_as_digest(self):
+        with self.app.app_context():
+            api_key, key = ApiKey.issue("billing", "admin")
+            self.assertNotIn(key, (api_key.digest, api_key.id))
+            self.assertEqual(ApiKey.verify(key).id, api_key.id)
+            self.assertIsNone(ApiKey.verify(key[:-1]))
+
+    def test_only_admin_issues_keys(self):
+        user = self.token(*self.test_factory.get_credentials())
+        response = self.client_app.post("/auth/apikey", json={"application": "billing"}, headers=user)
+        self.assertEqual(response.status_code, Constants.HTTP_UNAUTHORIZED.value)
+        response = self.client_app.delete("/auth/apikey/unknown", headers=self.token("admin", "changeme"))
+        self.assertEqual(response.status_code, Constants.HTTP_NOT_FOUND.value)
+
+    def test_invalid_key_is_refused(self):
+        response = self.client_app.post("/log", data=LINE, headers={"X-API-Key": "lak_notakey"})
+        self.assertEqual(response.status_code, Constants.HTTP_UNAUTHORIZED.value)
+        self.assertEqual(response.get_json()["error"], "invalid_api_key")
@@ -0,0 +1,85 @@
+"""Unit tests for compressed request bodies and compressed log files"""
+import unittest
+import gzip
+import os
+import sys
+import base64
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from src.Logger.Logger import Logger
+from src.Utils import Constants
+from test.test_app_factory import TestAppFactory
+
+
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "src"))
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent)))
+
+LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+class test_compression(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.client_app = self.app.test_client()
+        username, password = self.test_factory.get_credentials()
+        auth_pass = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("utf-8")
+        token = self.client_app.get("/auth/login", headers={"Authorization": f"Basic {auth_pass}"}).get_json()["token"]["access"]
+        self.token_auth = {"Authorization": f"Bearer {token}"}
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_gzip_body_is_decompressed(self, ship_mock):
+        payload = gzip.compress("\n".join([LINE] * 3).encode("utf-8"))
+        headers = dict(self.token_auth, **{"Content-Encoding": "gzip"})
+        response = self.client_app.post("/log", data=payload, headers=headers)
+        self.assertEqual(response.status_code, Constants.HTTP_OK.value)
+        self.assertEqual(len(ship_mock.call_args.args[0]), 3)
+
+    def test_corrupted_gzip_body_is_refused(self):
+        headers = dict(self.token_auth, **{"Content-Encoding": "gzip"})
+        response = self.client_app.post("/log", data=b"this is not gzip", headers=headers)
+        self.assertEqual(response.status_code, Constants.HTTP_BAD_REQUEST.value)
+
+    def test_unknown_encoding_is_refused(self):
+        headers = dict(self.token_auth, **{"Content-Encoding": "compress"})
+        response = self.client_app.post("/log", data=LINE, headers=headers)
+        self.assertEqual(response.status_code, Constants.HTTP_UNSUPPORTED_MEDIA_TYPE.value)
+
+    def test_decompressed_size_is_limited(self):
+        """
+        A small compressed body must not be able to expand past MAX_CONTENT_LENGTH.
+        """
+        self.app.config["MAX_CONTENT_LENGTH"] = 10000
+        payload = gzip.compress("\n".join([LINE] * 1000).encode("utf-8"))
+        self.assertLess(len(payload), 10000)
+        headers = dict(self.token_auth, **{"Content-Encoding": "gzip"})
+        response = self.client_app.post("/log", data=payload, headers=headers)
+        self.assertEqual(response.status_code, Constants.HTTP_PAYLOAD_TOO_LARGE.value)
+
+    def test_flushed_file_is_compressed(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            config = MagicMock()
+            config.config = {"logs": {"path": log_dir, "compression": "gzip"}, "S3": {"bucketName": "bucket"}}
+            uploader = MagicMock()
+            file_name = Logger(uploader, config, MagicMock()).flush(["{\"message\": \"hello\"}\n"])
+            file_path, _, object_name = uploader.transfer_file.call_args.args
+            self.assertEqual(object_name, file_name + ".gz")
+            with gzip.open(file_path, "rt", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "{\"message\": \"hello\"}\n")
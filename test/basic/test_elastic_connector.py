@@ -0,0 +1,220 @@
+"""Unit tests for the Elasticsearch connector, with the HTTP session replaced by a mock"""
+import unittest
+import json
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+import requests
+from src.FileTransferManager.ElasticConnector import ElasticConnector
+from src.FileTransferManager.BulkIndexer import BulkIndexer, BulkChunksError
+from src.Metrics.Metrics import Metrics
+from src.Formatter.NewlineDelimitedJSON import NewlineDelimitedJSON
+
+CONFIG = {
+    "elastic": {
+        "host": "localhost",
+        "port": 9200,
+        "auth": {"username": "elastic", "password": "<mypassword>"},
+        "endpoints": {"indexQuery": "/_cat/indices/{}"},
+        "pool": {"connections": 1, "maxSize": 4},
+        "indexCache": {"maxSize": 16, "ttlSeconds": 300}
+    }
+}
+
+
+def response(status_code: int, body):
+    resp = MagicMock(status_code=status_code)
+    resp.json.return_value = body
+    return resp
+
+
+class test_elastic_connector(unittest.TestCase):
+
+    def setUp(self):
+        config_manager = MagicMock()
+        config_manager.config = CONFIG
+        self.session = MagicMock()
+        with patch("src.FileTransferManager.ElasticConnector.requests.Session", return_value=self.session):
+            self.connector = ElasticConnector(config_manager)
+        self.session.get.return_value = response(200, [{"index": "logs"}])
+        self.session.post.return_value = response(200, {"errors": False, "items": []})
+
+    def tearDown(self):
+        ElasticConnector._instance = None
+
+    def test_known_index_is_not_queried_again(self):
+        """
+        Once an index is known to exist, the following batches must cost a single bulk request.
+        """
+        self.connector.create_document("logs", ["{\"message\":\"a\"}\n"])
+        self.connector.create_document("logs", ["{\"message\":\"b\"}\n"])
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertEqual(self.session.post.call_count, 2)
+        self.session.put.assert_not_called()
+
+    def test_missing_index_is_created_once(self):
+        self.session.get.return_value = response(404, {})
+        self.session.put.return_value = response(200, {"acknowledged": True})
+        self.connector.create_document("logs", ["{\"message\":\"a\"}\n"])
+        self.connector.create_document("logs", ["{\"message\":\"b\"}\n"])
+        self.assertEqual(self.session.put.call_count, 1)
+
+    def test_index_not_found_invalidates_cache(self):
+        """
+        If a cached index was deleted, the connector must recreate it and retry the bulk request.
+        """
+        self.connector.create_document("logs", ["{\"message\":\"a\"}\n"])
+        self.session.get.return_value = response(404, {})
+        self.session.put.return_value = response(200, {"acknowledged": True})
+        self.session.post.side_effect = [
+            response(404, {"error": {"type": "index_not_found_exception"}}),
+            response(200, {"errors": False, "items": []})
+        ]
+        result = self.connector.create_document("logs", ["{\"message\":\"b\"}\n"])
+        self.assertEqual(result["indexed"], 1)
+        self.assertEqual(self.session.put.call_count, 1)
+        self.assertEqual(self.session.post.call_count, 3)
+
+    def test_only_failed_chunks_are_sent_again(self):
+        """
+        If the index disappears while a batch is sent in several chunks, the chunks already indexed must not be sent twice.
+        """
+        self.connector._bulk_indexer = BulkIndexer(self.session, chunk_bytes=100, workers=1)
+        self.connector.create_document("logs", ["{\"message\":\"a\"}\n"])
+        self.session.get.return_value = response(404, {})
+        self.session.put.return_value = response(200, {"acknowledged": True})
+        self.session.post.side_effect = [
+            response(200, {"errors": False}),
+            response(404, {"error": {"type": "index_not_found_exception"}}),
+            response(200, {"errors": False})
+        ]
+        documents = ["{{\"message\":\"{}\"}}\n".format(i) for i in range(4)]
+        result = self.connector.create_document("logs", documents)
+        self.assertEqual(result, {"indexed": 4, "failed": 0, "errors": [], "retryable": []})
+        bodies = [call.kwargs["data"] for call in self.session.post.call_args_list[1:]]
+        self.assertEqual(bodies[2], bodies[1])
+        self.assertEqual(sum(body.count(b"\"message\"") for body in bodies), 6)
+
+    def test_daily_index_name(self):
+        """
+        With the default strategy, all the files flushed in a day must go to the same index.
+        """
+        today = datetime.now(timezone.utc).strftime("%Y.%m.%d")
+        self.assertEqual(self.connector.index_name("logaggregator_2025-03-15_1.log"), "logaggregator-{}".format(today))
+        self.assertEqual(self.connector.index_name("logaggregator_2025-03-15_2.log"), "logaggregator-{}".format(today))
+
+    def test_template_is_registered_after_failure(self):
+        """
+        If Elasticsearch is offline at startup, the template must be registered before the next index is created.
+        """
+        self.connector._template_config = {"enabled": True}
+        self.session.put.side_effect = Exception("Connection refused")
+        with patch("builtins.print"):
+            self.connector.register_index_template()
+        self.session.put.side_effect = None
+        self.session.put.return_value = response(200, {"acknowledged": True})
+        self.connector.create_document("logaggregator-2025.03.15", ["{\"message\":\"a\"}\n"])
+        template_call = self.session.put.call_args_list[-1]
+        self.assertTrue(template_call.kwargs["url"].endswith("/_index_template/logaggregator"))
+        self.assertEqual(template_call.kwargs["json"]["template"]["mappings"]["properties"]["level"], {"type": "keyword"})
+        self.assertFalse(self.connector._template_pending)
+
+    def test_unreachable_chunks_keep_the_summary(self):
+        """
+        A chunk that can't reach Elasticsearch fails like a refused one: the chunks indexed are summed up, the documents of
+        the other are carried along, and every bulk request is sent with a timeout.
+        """
+        self.session.post.side_effect = [response(200, {"errors": False}), requests.ConnectionError("connection refused")]
+        indexer = BulkIndexer(self.session, chunk_bytes=100, workers=1, timeout=5)
+        documents = ["{{\"message\":\"{}\"}}\n".format(i) for i in range(4)]
+        self.connector._bulk_indexer = indexer
+        with self.assertRaises(BulkChunksError) as context:
+            self.connector.create_document("logs", documents)
+        self.assertEqual(context.exception.result["indexed"], 2)
+        self.assertEqual(context.exception.documents, documents[2:])
+        self.assertIn("connection refused", str(context.exception))
+        self.assertTrue(all(call.kwargs["timeout"] == 5 for call in self.session.post.call_args_list))
+
+    def test_failed_documents_are_counted(self):
+        self.session.post.return_value = response(200, {"errors": True, "items": [
+            {"index": {"status": 201}}, {"index": {"status": 400, "error": {"type": "mapper_parsing_exception"}}}]})
+        with patch("builtins.print"), patch.object(Metrics, "increment") as increment_mock:
+            self.connector.create_document("logs", ["{\"message\":\"a\"}\n", "{\"message\":\"b\"}\n"])
+        increment_mock.assert_any_call("logaggregator_index_failures_total", 1)
+
+    def test_search_targets_the_indices_of_the_template(self):
+        """
+        Legacy indices named after the files (logaggregator_<date>_<n>.log) may have dynamic mappings, so they're left out.
+        """
+        self.session.post.return_value = response(200, {"hits": {"total": {"value": 0}, "hits": []}})
+        self.connector.search({"query": {"match_all": {}}})
+        self.assertEqual(self.session.post.call_args.kwargs["url"], "https://localhost:9200/logaggregator-*/_search")
+
+
+class test_bulk_indexer(unittest.TestCase):
+
+    def setUp(self):
+        self.session = MagicMock()
+        self.documents = ["{{\"message\":\"{}\"}}\n".format(i) for i in range(10)]
+
+    def test_batch_is_split_in_chunks(self):
+        """
+        No bulk body may be bigger than chunk_bytes, and every document must be sent exactly once.
+        """
+        self.session.post.return_value = response(200, {"errors": False})
+        indexer = BulkIndexer(self.session, chunk_bytes=150, workers=2)
+        result = indexer.index("https://localhost:9200/logs/_bulk", "logs", self.documents)
+        self.assertEqual(result, {"indexed": 10, "failed": 0, "errors": [], "retryable": []})
+        bodies = [call.kwargs["data"] for call in self.session.post.call_args_list]
+        self.assertGreater(len(bodies), 1)
+        self.assertTrue(all(len(body) <= 150 for body in bodies))
+        self.assertEqual(sum(body.count(b"\"message\"") for body in bodies), 10)
+        self.assertEqual(self.session.post.call_args.kwargs["params"], {"filter_path": "errors,items.*.status,items.*.error"})
+
+    def test_chunks_are_measured_in_bytes(self):
+        """
+        Non-ASCII documents take more bytes than characters: no body may go over chunk_bytes anyway.
+        """
+        self.session.post.return_value = response(200, {"errors": False})
+        indexer = BulkIndexer(self.session, chunk_bytes=150, workers=2)
+        indexer.index("https://localhost:9200/logs/_bulk", "logs", ["{{\"message\":\"ação {}\"}}\n".format("é" * 20)] * 6)
+        bodies = [call.kwargs["data"] for call in self.session.post.call_args_list]
+        self.assertEqual(len(bodies), 6)
+        self.assertTrue(all(len(body) <= 150 for body in bodies))
+
+    def test_only_rejected_items_are_retried(self):
+        """
+        Items rejected with 429 must be sent again, while other item errors are reported as failures.
+        """
+        self.session.post.side_effect = [
+            response(200, {"errors": True, "items": [{"index": {"status": 201}}, {"index": {"status": 429}},
+                                                     {"index": {"status": 400, "error": {"type": "mapper_parsing_exception"}}}]}),
+            response(200, {"errors": False})
+        ]
+        indexer = BulkIndexer(self.session, retry_backoff=0)
+        result = indexer.index("https://localhost:9200/logs/_bulk", "logs", self.documents[:3])
+        self.assertEqual(result["indexed"], 2)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(result["errors"], [{"type": "mapper_parsing_exception"}])
+        self.assertEqual(result["retryable"], [])
+        retried = self.session.post.call_args_list[1].kwargs["data"]
+        self.assertIn(self.documents[1].encode("utf-8"), retried)
+        self.assertNotIn(self.documents[0].encode("utf-8"), retried)
+
+    def test_rejections_stop_after_max_retries(self):
+        self.session.post.return_value = response(429, {})
+        indexer = BulkIndexer(self.session, max_retries=2, retry_backoff=0)
+        result = indexer.index("https://localhost:9200/logs/_bulk", "logs", self.documents[:2])
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual(result["retryable"], self.documents[:2])
+        self.assertEqual(self.session.post.call_count, 3)
+
+    def test_bulk_body_matches_ndjson(self):
+        """
+        Joining the serialized documents must produce the same bulk request as parsing and dumping each one of them.
+        """
+        documents = self.documents[:3] + ["{\"message\":\"ação \\\"quoted\\\"\"}\n"]
+        body = NewlineDelimitedJSON.bulk_body(documents, "logs").decode("utf-8")
+        expected = NewlineDelimitedJSON.ndjson(documents, "logs")
+        self.assertTrue(body.endswith("\n"))
+        self.assertEqual([json.loads(line) for line in body.splitlines()], [json.loads(line) for line in expected.splitlines()])
+        self.assertEqual(NewlineDelimitedJSON.bulk_body([], "logs"), b"")
@@ -0,0 +1,110 @@
+"""Unit tests for the S3 backfill, run against an in-memory stand-in of the S3 API"""
+import unittest
+import gzip
+import io
+import threading
+import time
+from unittest.mock import MagicMock
+from src.FileTransferManager.FileReader import FileReader
+
+
+class FakeS3:
+    """
+    Implements the subset of the S3 client used by FileReader: paginated list_objects_v2 and get_object. Keeps track of
+    how many bytes are being downloaded at the same time.
+    """
+
+    def __init__(self, objects: dict, download_delay: float = 0):
+        self.objects = objects
+        self.download_delay = download_delay
+        self.list_calls = []
+        self.downloading = 0
+        self.max_downloading = 0
+        self._lock = threading.Lock()
+
+    def list_objects_v2(self, Bucket, MaxKeys=1000, Prefix="", StartAfter="", ContinuationToken=None):
+        self.list_calls.append({"StartAfter": StartAfter, "ContinuationToken": ContinuationToken})
+        keys = sorted(key for key in self.objects if key.startswith(Prefix) and key > (ContinuationToken or StartAfter))
+        page = keys[:MaxKeys]
+        response = {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "Contents": [{"Key": key, "Size": len(self.objects[key])} for key in page],
+            "IsTruncated": len(keys) > MaxKeys
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def get_object(self, Bucket, Key):
+        with self._lock:
+            self.downloading += len(self.objects[Key])
+            self.max_downloading = max(self.max_downloading, self.downloading)
+        time.sleep(self.download_delay)
+        with self._lock:
+            self.downloading -= len(self.objects[Key])
+        return {"ResponseMetadata": {"HTTPStatusCode": 200}, "Body": io.BytesIO(self.objects[Key])}
+
+
+class test_file_reader(unittest.TestCase):
+
+    def setUp(self):
+        self.objects = {"logaggregator_2025-03-15_{:03d}.log".format(i): "line {}\n".format(i).encode("utf-8") * 10
+                        for i in range(25)}
+        self.control = MagicMock()
+        self.control.unread_files.side_effect = lambda keys: keys
+        self.config = MagicMock()
+        self.config.config = {"S3": {"bucketName": "bucket", "backfill": {"pageSize": 10, "workers": 4, "maxInFlightBytes": 200}}}
+
+    def tearDown(self):
+        FileReader._instance = None
+
+    def reader(self, s3: FakeS3) -> FileReader:
+        return FileReader(self.config, self.control, s3_client=s3)
+
+    def test_all_pages_are_read_in_order(self):
+        s3 = FakeS3(self.objects)
+        files = list(self.reader(s3).backfill())
+        self.assertEqual([key for key, _ in files], sorted(self.objects))
+        self.assertEqual(files[3][1], "line 3\n" * 10)
+        self.assertEqual(len(s3.list_calls), 3)
+
+    def test_keys_sorting_before_last_one_are_read(self):
+        """
+        By default every backfill lists the whole bucket: a file uploaded later whose key sorts before the last one read
+        (e.g. _9.log after _10.log) must not be skipped.
+        """
+        read = set()
+        self.control.unread_files.side_effect = lambda keys: [key for key in keys if key not in read]
+        s3 = FakeS3({"logaggregator_2025-03-15_10.log": b"ten\n"})
+        reader = self.reader(s3)
+        read.update(key for key, _ in reader.backfill())
+        s3.objects["logaggregator_2025-03-15_9.log"] = b"nine\n"
+        self.assertEqual(list(reader.backfill()), [("logaggregator_2025-03-15_9.log", "nine\n")])
+        self.assertEqual(s3.list_calls[-1]["StartAfter"], "")
+
+    def test_watermark_resumes_listing(self):
+        """
+        With resumeFromWatermark, a second backfill must start the listing after the last file consumed, and see only the new files.
+        """
+        self.config.config["S3"]["backfill"]["resumeFromWatermark"] = True
+        s3 = FakeS3(self.objects)
+        reader = self.reader(s3)
+        list(reader.backfill())
+        s3.objects["logaggregator_2025-03-16_000.log.gz"] = gzip.compress(b"new line\n")
+        self.assertEqual(list(reader.backfill()), [("logaggregator_2025-03-16_000.log.gz", "new line\n")])
+        self.assertEqual(s3.list_calls[-1]["StartAfter"], "logaggregator_2025-03-15_024.log")
+
+    def test_processed_files_are_skipped(self):
+        self.control.unread_files.side_effect = lambda keys: [key for key in keys if not key.endswith("0.log")]
+        keys = [key for key, _ in self.reader(FakeS3(self.objects)).backfill()]
+        self.assertEqual(len(keys), 22)
+        self.assertFalse(any(key.endswith("0.log") for key in keys))
+
+    def test_in_flight_bytes_are_bounded(self):
+        """
+        Files are 70 bytes each: with a 200 bytes budget, at most 2 of them may be downloading or waiting for the consumer.
+        """
+        s3 = FakeS3(self.objects, download_delay=0.01)
+        self.assertEqual(len(list(self.reader(s3).backfill())), 25)
+        self.assertLessEqual(s3.max_downloading, 200)
+        self.assertGreater(s3.max_downloading, 70)
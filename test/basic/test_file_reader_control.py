@@ -0,0 +1,77 @@
+"""Unit tests for the ledger of files already indexed in Elasticsearch"""
+import unittest
+import os
+import sqlite3
+import tempfile
+import threading
+from src.FileTransferManager.FileReaderControl import FileReaderControl
+
+
+class test_file_reader_control(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.db_dir.name, "db", "file_sync.db")
+        self.control = FileReaderControl(self.db_path)
+
+    def tearDown(self):
+        FileReaderControl._instance = None
+        self.db_dir.cleanup()
+
+    def reopen(self, cache_size: int = 100000) -> FileReaderControl:
+        """Opens the same database without the names cached in memory"""
+        FileReaderControl._instance = None
+        return FileReaderControl(self.db_path, cache_size)
+
+    def count_queries(self, control: FileReaderControl) -> list:
+        """Statements run by the connection of the current thread are appended to the returned list"""
+        statements = []
+        control._connection().set_trace_callback(statements.append)
+        return statements
+
+    def test_added_files_are_recorded_once(self):
+        self.control.add_file("a.log", "2025-03-15T01:56:59")
+        self.control.add_files(["a.log", "b.log"])
+        self.assertTrue(self.control.check_if_read("a.log"))
+        self.assertFalse(self.control.check_if_read("c.log"))
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM files").fetchone()[0], 2)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_unread_files_are_checked_in_batches(self):
+        """
+        Pages bigger than the SQLite variable limit must be checked against the database, keeping their order.
+        """
+        keys = ["{:05d}.log".format(i) for i in range(2500)]
+        self.control.add_files(keys[::2])
+        self.assertEqual(self.reopen().unread_files(keys), keys[1::2])
+
+    def test_files_added_by_other_threads_are_visible(self):
+        thread = threading.Thread(target=self.control.add_files, args=(["a.log"],))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.reopen().unread_files(["a.log", "b.log"]), ["b.log"])
+
+    def test_lookup_of_many_keys_is_batched(self):
+        keys = ["logaggregator_2025-03-15_{}.log".format(i) for i in range(100000)]
+        self.control.add_files(keys[:50000])
+        control = self.reopen()
+        statements = self.count_queries(control)
+        self.assertEqual(control.unread_files(keys), keys[50000:])
+        self.assertEqual(len(statements), -(-100000 // FileReaderControl._BATCH_SIZE))
+        #the processed names are cached, only the unread ones are looked up again
+        statements.clear()
+        self.assertEqual(control.unread_files(keys), keys[50000:])
+        self.assertEqual(len(statements), -(-50000 // FileReaderControl._BATCH_SIZE))
+
+    def test_cache_is_bounded(self):
+        keys = ["{}.log".format(i) for i in range(10)]
+        control = self.reopen(cache_size=4)
+        control.add_files(keys)
+        self.assertEqual(list(control._read_files), keys[-4:])
+        control.unread_files(keys[6:7])
+        self.assertEqual(list(control._read_files), keys[7:] + keys[6:7])
+        #evicted names are still known through the database
+        statements = self.count_queries(control)
+        self.assertEqual(control.unread_files(keys[:2]), [])
+        self.assertEqual(len(statements), 1)
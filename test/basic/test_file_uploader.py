@@ -0,0 +1,107 @@
+"""Unit tests for the S3 uploads, with the boto3 client replaced by a mock"""
+import unittest
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError, EndpointConnectionError, NoCredentialsError
+from src.FileTransferManager.FileUploader import FileUploader
+from src.FileTransferManager.UploadResult import UploadResult
+from src.Logger.Logger import Logger
+from src.Metrics.Metrics import Metrics
+
+
+class test_file_uploader(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.log_dir.name, "logaggregator_2025-03-15_1.log")
+        with open(self.file_path, "w") as f:
+            f.write("{\"message\":\"hello\"}\n")
+        config = MagicMock()
+        config.config = {"S3": {"bucketName": "bucket", "upload": {"multipartThreshold": 1024, "multipartChunkSize": 1024,
+                                                                   "maxConcurrency": 2, "workers": 2,
+                                                                   "maxRetries": 2, "retryBackoffSeconds": 0}}}
+        self.s3 = MagicMock()
+        with patch("src.FileTransferManager.FileUploader.boto3.client", return_value=self.s3):
+            self.uploader = FileUploader(config)
+
+    def tearDown(self):
+        FileUploader._instance = None
+        self.log_dir.cleanup()
+
+    def test_upload_uses_transfer_config(self):
+        result = self.uploader.upload_async(self.file_path, "bucket", "file.log").result()
+        self.assertTrue(result.success)
+        transfer_config = self.s3.upload_file.call_args.kwargs["Config"]
+        self.assertEqual((transfer_config.multipart_threshold, transfer_config.max_concurrency), (1024, 2))
+
+    def test_failures_are_returned(self):
+        """
+        Errors are reported in the result, with a code the caller can use to decide whether to try again.
+        """
+        result = self.uploader.transfer_file(os.path.join(self.log_dir.name, "missing.log"), "bucket", "missing.log")
+        self.assertEqual((result.success, result.error_code, result.retryable), (False, "FileNotFound", False))
+        self.s3.upload_file.assert_not_called()
+        self.s3.upload_file.side_effect = NoCredentialsError()
+        self.assertEqual(self.uploader.transfer_file(self.file_path, "bucket", "file.log").error_code, "NoCredentials")
+        try:
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+        except ClientError:
+            try:
+                raise S3UploadFailedError("Failed to upload")
+            except S3UploadFailedError as e:
+                self.s3.upload_file.side_effect = e
+        result = self.uploader.transfer_file(self.file_path, "bucket", "file.log")
+        self.assertEqual((result.error_code, result.retryable), ("SlowDown", True))
+
+    def test_only_transient_failures_are_retryable(self):
+        for code, status, retryable in (("NoSuchBucket", 404, False), ("InvalidAccessKeyId", 403, False),
+                                        ("SignatureDoesNotMatch", 403, False), ("RequestTimeout", 400, True),
+                                        ("InternalError", 500, True), ("SomethingNew", 502, True)):
+            self.s3.upload_file.side_effect = ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+                                                          "PutObject")
+            result = self.uploader.transfer_file(self.file_path, "bucket", "file.log")
+            self.assertEqual((result.status_code, result.retryable), (status, retryable), code)
+            self.assertEqual(result.attempts, 3 if retryable else 1)
+        self.s3.upload_file.side_effect = EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+        result = self.uploader.transfer_file(self.file_path, "bucket", "file.log")
+        self.assertEqual((result.error_code, result.retryable), ("EndpointConnectionError", True))
+
+    def test_retryable_failures_are_retried(self):
+        """
+        Throttled uploads are tried again up to maxRetries times, while uploads that can't succeed are not.
+        """
+        self.s3.upload_file.side_effect = NoCredentialsError()
+        self.assertEqual(self.uploader.transfer_file(self.file_path, "bucket", "file.log").attempts, 1)
+        self.s3.upload_file.reset_mock()
+        self.s3.upload_file.side_effect = [ClientError({"Error": {"Code": "SlowDown"}}, "PutObject"), None]
+        result = self.uploader.transfer_file(self.file_path, "bucket", "file.log")
+        self.assertEqual((result.success, result.attempts), (True, 2))
+        self.s3.upload_file.side_effect = ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+        with patch.object(Metrics, "increment") as increment:
+            result = self.uploader.transfer_file(self.file_path, "bucket", "file.log")
+        self.assertEqual((result.success, result.attempts), (False, 3))
+        increment.assert_called_with("logaggregator_upload_failures_total", error_code="SlowDown")
+
+    def test_logger_deletes_file_only_after_upload(self):
+        """
+        The entries are indexed while the file is uploaded. The local file is removed only if the upload succeeded.
+        """
+        config = MagicMock()
+        config.config = {"logs": {"path": self.log_dir.name}, "S3": {"bucketName": "bucket"}}
+        uploader, connector = MagicMock(), MagicMock()
+        connector.index_name.return_value = "logs"
+        logger = Logger(uploader, config, connector)
+        for success in (False, True):
+            upload = Future()
+            uploader.upload_async.return_value = upload
+            #the upload finishes only once the entries are being indexed
+            connector.create_document.side_effect = lambda *args: upload.set_result(
+                UploadResult(**dict(zip(("file_path", "bucket_name", "object_name"), uploader.upload_async.call_args.args)),
+                             success=success))
+            with patch("builtins.print"):
+                logger._ship(["{\"message\":\"hello\"}\n"])
+            file_path = uploader.upload_async.call_args.args[0]
+            self.assertEqual(os.path.isfile(file_path), not success)
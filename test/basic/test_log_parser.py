@@ -0,0 +1,102 @@
+"""Unit tests for the log line parser"""
+import unittest
+import io
+import json
+from unittest.mock import patch
+from pydantic import ValidationError
+from src.LogEntry.LogEntry import LogEntry
+from src.Parser.LogParser import LogParser
+
+
+class test_log_parser(unittest.TestCase):
+
+    def test_hyphens_are_kept_inside_fields(self):
+        """
+        Hyphens that are not surrounded by blanks belong to the field, and the message keeps everything after the last delimiter.
+        """
+        line = "2025-03-15 01:56:59,303 - 127.0.0.1  - dns-resolver - INFO - get-dns - dns-server.py - Querying DNS - www.your-site.com"
+        rows = LogParser.parse("10.0.0.1", [line])
+        self.assertEqual(rows, [{
+            "application_server_ip": "10.0.0.1",
+            "application_id": "dns-resolver",
+            "date": "2025-03-15",
+            "time": "01:56:59,303",
+            "client_ip": "127.0.0.1",
+            "level": "INFO",
+            "method": "get-dns",
+            "component": "dns-server.py",
+            "message": "Querying DNS - www.your-site.com"
+        }])
+
+    def test_blank_lines_are_ignored(self):
+        payload = "\n2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - first\n\n" \
+                  "   2025-03-15 01:58:29,388 - 127.0.0.1 - 4160 - ERROR - get_dns - server.py - second\r\n  \n"
+        rows = LogParser.parse("10.0.0.1", payload.splitlines())
+        self.assertEqual([row["message"] for row in rows], ["first", "second"])
+
+    def test_malformed_line_is_refused(self):
+        with self.assertRaises(ValueError):
+            LogParser.parse("10.0.0.1", ["2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO"])
+
+    def test_invalid_timestamp_is_refused(self):
+        """
+        Elasticsearch would reject a malformed date after the client was acknowledged, so it's refused when parsing.
+        """
+        for timestamp in ("2025-3-15 01:56:59,303", "2025-02-30 01:56:59,303", "15/03/2025 01:56:59,303", "2025-03-15 1:56:59"):
+            with self.assertRaises(ValueError):
+                LogParser.parse("10.0.0.1", [timestamp + " - 127.0.0.1 - 4109 - INFO - get_dns - server.py - message"])
+        document = '{"application_id":"4109","date":"2025-13-01","time":"01:56:59,303","client_ip":"127.0.0.1","level":"INFO",' \
+                   '"method":"get_dns","component":"server.py","message":"m"}'
+        with self.assertRaises(ValueError):
+            LogParser.parse_ndjson("10.0.0.1", [document])
+        self.assertEqual(len(LogParser.parse("10.0.0.1", ["2025-03-15 01:56:59 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - m"])), 1)
+
+    def test_invalid_level_is_refused(self):
+        with self.assertRaises(ValidationError):
+            LogParser.parse("10.0.0.1", ["2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - LOUD - get_dns - server.py - message"])
+
+    def test_serialization_matches_log_entry(self):
+        """
+        The serialized rows must be the same documents LogEntry.model_dump_json() produces, including escaped characters.
+        """
+        line = '2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - WARNING - get_dns - server.py - "quoted" \\ ação'
+        rows = LogParser.parse("10.0.0.1", [line])
+        self.assertEqual(LogParser.serialize(rows), [LogEntry(**rows[0]).model_dump_json() + "\n"])
+        with patch("src.Parser.LogParser.JsonBackend.accelerated", False):
+            self.assertEqual(LogParser.serialize(rows), [LogEntry(**rows[0]).model_dump_json() + "\n"])
+
+    def test_lines_split_across_chunks(self):
+        """
+        Lines and multi-byte characters split between two chunks of the stream must be reassembled.
+        """
+        payload = "primeira linha ação\r\nsecond line\n\nção".encode("utf-8")
+        for chunk_size in range(1, len(payload) + 1):
+            lines = list(LogParser.iter_lines(io.BytesIO(payload), chunk_size))
+            self.assertEqual([line.rstrip("\r") for line in lines], ["primeira linha ação", "second line", "", "ção"])
+
+    def test_json_lines_are_kept_as_sent(self):
+        """
+        JSON lines must reach the bulk body byte for byte, with application_server_ip spliced in front and extra fields kept.
+        """
+        line = '{"application_id":"4109","date":"2025-03-15","time":"01:56:59,303","client_ip":"127.0.0.1","level":"INFO",' \
+               '"method":"get_dns","component":"server.py","message":"a \\"quoted\\" ação","trace_id":"abc"}'
+        documents = LogParser.parse_ndjson("10.0.0.1", ["", line + "\r", "  "])
+        self.assertEqual(documents, ['{"application_server_ip":"10.0.0.1",' + line[1:] + "\n"])
+        self.assertEqual(json.loads(documents[0])["application_server_ip"], "10.0.0.1")
+
+    def test_json_line_missing_fields_is_refused(self):
+        documents = [
+            '{"application_id":"4109","date":"2025-03-15","time":"01:56:59,303","client_ip":"127.0.0.1","level":"INFO"}',
+            '{"application_id":4109,"date":"2025-03-15","time":"01:56:59,303","client_ip":"127.0.0.1","level":"INFO",'
+            '"method":"get_dns","component":"server.py","message":"m"}',
+            '{"application_id":"4109","date":"2025-03-15","time":"01:56:59,303","client_ip":"127.0.0.1","level":"LOUD",'
+            '"method":"get_dns","component":"server.py","message":"m"}',
+            '["not", "an", "object"]'
+        ]
+        for document in documents:
+            with self.assertRaises(ValueError):
+                LogParser.parse_ndjson("10.0.0.1", [document])
+
+    def test_invalid_json_line_is_refused(self):
+        with self.assertRaises(json.JSONDecodeError):
+            LogParser.parse_ndjson("10.0.0.1", ['{"application_id": "4109",'])
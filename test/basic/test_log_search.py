@@ -0,0 +1,133 @@
+"""Unit tests for the cached search of the indexed logs"""
+import unittest
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from flask_jwt_extended import create_access_token
+from werkzeug.datastructures import MultiDict
+from src.Search.LogSearch import LogSearch
+from test.test_app_factory import TestAppFactory
+
+RESPONSE = {"hits": {"total": {"value": 1}, "hits": [{"_source": {"level": "ERROR", "message": "Bad request"}}]}}
+
+
+class test_log_search(unittest.TestCase):
+
+    def log_search(self, connector=None, **search_config) -> LogSearch:
+        config = MagicMock()
+        config.config = {"search": search_config}
+        return LogSearch(config, connector or MagicMock())
+
+    def test_equivalent_filters_share_the_key(self):
+        log_search = self.log_search()
+        key = log_search.normalize(MultiDict([("level", "error,Critical"), ("application_id", "b"), ("application_id", "a"),
+                                              ("text", "  DNS   timeout ")]))
+        self.assertEqual(key, log_search.normalize(MultiDict([("text", "dns timeout"), ("application_id", "a,b"),
+                                                              ("level", "CRITICAL"), ("level", "ERROR"), ("size", "100")])))
+        self.assertEqual(log_search.normalize(MultiDict([("from", "2025-03-15T04:45:00+03:00")])),
+                         log_search.normalize(MultiDict([("from", "2025-03-15T01:45:00")])))
+        for args in ([("level", "LOUD")], [("last", "15x")], [("last", "15m"), ("from", "2025-03-15T01:45:00")],
+                     [("from", "yesterday")], [("size", "0")], [("size", "1001")], [("size", "many")]):
+            with self.assertRaises(ValueError):
+                log_search.normalize(MultiDict(args))
+
+    def test_filters_are_translated(self):
+        log_search = self.log_search(defaultSize=10)
+        query = log_search.query(log_search.normalize(MultiDict([("level", "ERROR"), ("application_id", "4109"), ("text", "DNS"),
+                                                                 ("from", "2025-03-15T01:45:00"), ("to", "2025-03-16T00:00:00")])))
+        self.assertEqual(query["size"], 10)
+        self.assertEqual(query["query"]["bool"]["must"], [{"match": {"message": {"query": "dns", "operator": "and"}}}])
+        clauses = query["query"]["bool"]["filter"]
+        self.assertEqual(clauses[:2], [{"terms": {"level": ["ERROR"]}}, {"terms": {"application_id": ["4109"]}}])
+        self.assertEqual(clauses[2]["bool"]["should"], [
+            {"range": {"date": {"gt": "2025-03-15"}}},
+            {"bool": {"filter": [{"term": {"date": "2025-03-15"}}, {"range": {"time": {"gte": "01:45:00"}}}]}}
+        ])
+        self.assertEqual(clauses[3]["bool"]["should"][0], {"range": {"date": {"lt": "2025-03-16"}}})
+        with patch("src.Search.LogSearch.datetime") as datetime_mock:
+            datetime_mock.now.return_value = datetime(2025, 3, 15, 2, 0, tzinfo=timezone.utc)
+            query = log_search.query(log_search.normalize(MultiDict([("last", "15m")])))
+        self.assertEqual(query["query"]["bool"]["filter"][0]["bool"]["should"][1]["bool"]["filter"][1],
+                         {"range": {"time": {"gte": "01:45:00"}}})
+
+    def test_concurrent_identical_searches_are_coalesced(self):
+        """
+        Identical searches running at the same time must cost a single request to Elasticsearch, and later ones none.
+        """
+        release = threading.Event()
+        connector = MagicMock()
+        connector.search.side_effect = lambda query: release.wait(5) and RESPONSE
+        log_search = self.log_search(connector)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(log_search.search(MultiDict([("level", "ERROR")]))))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while log_search.cache_stats()["coalesced"] < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(connector.search.call_count, 1)
+        self.assertEqual([result for result, _ in results], [{"total": 1, "logs": [{"level": "ERROR", "message": "Bad request"}]}] * 8)
+        self.assertEqual(log_search.search(MultiDict([("level", "error")]))[1], "HIT")
+        self.assertEqual(connector.search.call_count, 1)
+        connector.search.side_effect = Exception("Elasticsearch is offline")
+        with self.assertRaises(Exception):
+            log_search.search(MultiDict([("level", "INFO")]))
+        #failures are not cached
+        connector.search.side_effect = None
+        connector.search.return_value = RESPONSE
+        self.assertEqual(log_search.search(MultiDict([("level", "INFO")]))[1], "MISS")
+        self.assertEqual(connector.search.call_count, 3)
+
+
+class test_search_endpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.client_app = self.app.test_client()
+        with self.app.app_context():
+            token = create_access_token(identity="johndoe", additional_claims={"perm": ["log", "read_logs"]})
+            log_token = create_access_token(identity="johndoe", additional_claims={"perm": ["log"]})
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.log_headers = {"Authorization": f"Bearer {log_token}"}
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    @patch("src.FileTransferManager.ElasticConnector.ElasticConnector.search")
+    def test_search_is_cached(self, search_mock):
+        search_mock.return_value = RESPONSE
+        self.assertEqual(self.client_app.get("/search?level=ERROR").status_code, 401)
+        #a token allowed only to send logs can't read them
+        self.assertEqual(self.client_app.get("/search?level=ERROR", headers=self.log_headers).status_code, 401)
+        response = self.client_app.get("/search?level=ERROR&last=15m", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(response.get_json()["total"], 1)
+        response = self.client_app.get("/search?last=15m&level=error", headers=self.headers)
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+        self.assertEqual(search_mock.call_count, 1)
+        self.assertEqual(self.client_app.get("/search?level=LOUD", headers=self.headers).status_code, 400)
+        search_mock.side_effect = Exception("Elasticsearch is offline")
+        with patch("builtins.print") as print_mock:
+            self.assertEqual(self.client_app.get("/search?level=INFO", headers=self.headers).status_code, 502)
+        print_mock.assert_called_once_with("Error upon searching the logs with level=INFO: Elasticsearch is offline")
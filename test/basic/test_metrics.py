@@ -0,0 +1,124 @@
+"""Unit tests for the metrics registry and the /metrics endpoint"""
+import unittest
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+from src.Metrics.Metrics import Metrics
+from src.Utils import Constants
+from test.test_app_factory import TestAppFactory
+
+LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+class test_metrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        Metrics.reset()
+
+    def tearDown(self):
+        Metrics._directory = None
+        Metrics.reset()
+
+    def test_shards_of_every_thread_are_added_up(self):
+        def record():
+            for _ in range(100):
+                Metrics.increment("logaggregator_lines_accepted_total")
+                Metrics.observe("logaggregator_stage_seconds", 0.002, stage="parse")
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record()
+        rendered = Metrics.render()
+        self.assertIn("logaggregator_lines_accepted_total 500\n", rendered)
+        self.assertIn('logaggregator_stage_seconds_bucket{stage="parse",le="0.001"} 0\n', rendered)
+        self.assertIn('logaggregator_stage_seconds_bucket{stage="parse",le="0.0025"} 500\n', rendered)
+        self.assertIn('logaggregator_stage_seconds_bucket{stage="parse",le="+Inf"} 500\n', rendered)
+        self.assertIn('logaggregator_stage_seconds_count{stage="parse"} 500\n', rendered)
+        self.assertIn("# TYPE logaggregator_stage_seconds histogram\n", rendered)
+        #the shards of the threads that exited were folded, and are not counted twice
+        self.assertIn("logaggregator_lines_accepted_total 500\n", Metrics.render())
+
+    def test_metrics_of_every_worker_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        #a worker that died without retiring its metrics: its counters are kept, its gauges dropped
+        worker = subprocess.Popen([sys.executable, "-c", "pass"])
+        worker.wait()
+        with open(os.path.join(directory, "{}.json".format(worker.pid)), "wt") as fp:
+            json.dump({"counters": [["logaggregator_lines_accepted_total", [], 7]],
+                       "histograms": [],
+                       "gauges": [["logaggregator_queue_depth", [["queue", "shipping"]], 3]]}, fp)
+        Metrics.configure({"multiprocessDir": directory, "snapshotIntervalSeconds": 60})
+        Metrics.increment("logaggregator_lines_accepted_total", 5)
+        Metrics.register_gauge("logaggregator_queue_depth", lambda: 2, queue="shipping")
+        rendered = Metrics.render()
+        self.assertIn("logaggregator_lines_accepted_total 12\n", rendered)
+        self.assertIn('logaggregator_queue_depth{queue="shipping"} 2\n', rendered)
+        self.assertTrue(os.path.isfile(os.path.join(directory, "{}.json".format(os.getpid()))))
+        #its file was folded into exited.json, and is not counted twice
+        self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith(".json")),
+                         ["{}.json".format(os.getpid()), "exited.json"])
+        self.assertIn("logaggregator_lines_accepted_total 12\n", Metrics.render())
+
+    def test_workers_retire_their_metrics_when_exiting(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = "\n".join([
+            "from src.Metrics.Metrics import Metrics",
+            "Metrics.configure({{'multiprocessDir': {!r}, 'snapshotIntervalSeconds': 60}})".format(directory),
+            "Metrics.increment('logaggregator_lines_accepted_total', 7)",
+            "Metrics.render()"
+        ])
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", worker], cwd=Path(__file__).parent.parent.parent, check=True)
+        self.assertEqual([name for name in os.listdir(directory) if name.endswith(".json")], ["exited.json"])
+        Metrics.configure({"multiprocessDir": directory, "snapshotIntervalSeconds": 60})
+        self.assertIn("logaggregator_lines_accepted_total 14\n", Metrics.render())
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_log_requests_are_measured(self, ship_mock):
+        test_factory = TestAppFactory()
+        self.addCleanup(test_factory.destroy_test_app)
+        app = test_factory.get_test_app()
+        with app.app_context():
+            token = create_access_token(identity="johndoe", additional_claims={"perm": ["log"]})
+        client = app.test_client()
+        payload = "\n".join([LINE, LINE])
+        self.assertEqual(client.post("/log", data=payload, headers={"Authorization": f"Bearer {token}"}).status_code,
+                         Constants.HTTP_OK.value)
+        self.assertEqual(client.post("/log", data=LINE + "\nnot a log line", headers={"Authorization": f"Bearer {token}"}).status_code,
+                         Constants.HTTP_BAD_REQUEST.value)
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, Constants.HTTP_OK.value)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        rendered = response.get_data(as_text=True)
+        self.assertIn("logaggregator_lines_accepted_total 2\n", rendered)
+        self.assertIn("logaggregator_lines_rejected_total 2\n", rendered)
+        self.assertIn("logaggregator_bytes_received_total {}\n".format(len(payload) + len(LINE) + len("\nnot a log line")), rendered)
+        self.assertIn('logaggregator_stage_seconds_count{stage="parse"} 2\n', rendered)
+        self.assertIn('logaggregator_request_seconds_count{endpoint="/log"} 2\n', rendered)
+        self.assertIn('logaggregator_queue_depth{queue="shipping"} 0\n', rendered)
+        self.assertIn('logaggregator_token_cache{stat="misses"} 1\n', rendered)
+        self.assertIn("logaggregator_spool_pending_bytes 0\n", rendered)
+        #every metric is described
+        self.assertNotIn("untyped", rendered)
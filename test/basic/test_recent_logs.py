@@ -0,0 +1,107 @@
+"""Unit tests for the in-memory buffer of recent log entries"""
+import unittest
+import json
+from unittest.mock import MagicMock, patch
+from werkzeug.datastructures import MultiDict
+from src.Logger.Logger import Logger
+from src.Search.LogSearch import LogSearch
+from src.Search.RecentLogs import RecentLogs
+
+
+def document(message: str, level: str = "INFO", application_id: str = "4109", component: str = "server.py") -> str:
+    return json.dumps({"application_server_ip": "10.0.0.1", "application_id": application_id, "date": "2025-03-15",
+                       "time": "01:56:59,303", "client_ip": "127.0.0.1", "level": level, "method": "get_dns",
+                       "component": component, "message": message}) + "\n"
+
+
+class test_recent_logs(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.time_patch = patch("src.Search.RecentLogs.time")
+        time_mock = self.time_patch.start()
+        time_mock.monotonic.side_effect = lambda: self.now
+
+    def tearDown(self):
+        self.time_patch.stop()
+
+    def test_filters_use_the_inverted_indexes(self):
+        recent_logs = RecentLogs()
+        recent_logs.add([document("Querying DNS server for www.yoursite.com"),
+                         document("Bad request: www.yoursite.com does not exist", level="ERROR"),
+                         document("Bad request: www.other.com does not exist", level="ERROR", application_id="4160"),
+                         document("DNS server timeout", level="CRITICAL", component="resolver.py")])
+        result = recent_logs.search(60, 10, level=("ERROR", "CRITICAL"))
+        self.assertEqual(result["total"], 3)
+        self.assertEqual([entry["level"] for entry in result["logs"]], ["CRITICAL", "ERROR", "ERROR"])
+        result = recent_logs.search(60, 10, level=("ERROR",), application_id=("4109",), text="YOURSITE does")
+        self.assertEqual([entry["message"] for entry in result["logs"]], ["Bad request: www.yoursite.com does not exist"])
+        self.assertEqual(recent_logs.search(60, 10, component=("resolver.py",), text="dns")["total"], 1)
+        self.assertEqual(recent_logs.search(60, 10, text="dns missing")["total"], 0)
+        result = recent_logs.search(60, 2)
+        self.assertEqual((result["total"], [entry["level"] for entry in result["logs"]]), (4, ["CRITICAL", "ERROR"]))
+
+    def test_entries_are_evicted_by_age_and_size(self):
+        recent_logs = RecentLogs(max_age=60)
+        self.now += 60
+        recent_logs.add([document("first", level="ERROR")])
+        self.now += 30
+        recent_logs.add([document("second", level="ERROR")])
+        self.assertEqual(recent_logs.search(10, 10, level=("ERROR",))["total"], 1)
+        self.assertTrue(recent_logs.covers(60))
+        self.assertFalse(recent_logs.covers(120))
+        self.now += 45
+        self.assertEqual([entry["message"] for entry in recent_logs.search(60, 10, level=("ERROR",))["logs"]], ["second"])
+        self.assertEqual(recent_logs.stats()["entries"], 1)
+        #the first entry, received 75 seconds ago, is gone
+        self.assertTrue(recent_logs.covers(60))
+        self.assertFalse(recent_logs.covers(80))
+
+        recent_logs = RecentLogs(max_bytes=20000)
+        for i in range(200):
+            recent_logs.add([document("message number {}".format(i))])
+        stats = recent_logs.stats()
+        self.assertLessEqual(stats["bytes"], 20000)
+        self.assertLess(stats["entries"], 200)
+        result = recent_logs.search(60, 1, text="message")
+        self.assertEqual((result["total"], result["logs"][0]["message"]), (stats["entries"], "message number 199"))
+        #no posting of an evicted entry is left behind
+        self.assertEqual(recent_logs.search(60, 200, text="0")["total"], 0)
+
+    def test_postings_are_compacted(self):
+        """
+        Postings evicted from the head are dropped in bulk: searches still see exactly the retained entries afterwards.
+        """
+        recent_logs = RecentLogs(max_age=60)
+        recent_logs.add([document("old {}".format(i), level="ERROR") for i in range(3000)])
+        self.now += 50
+        recent_logs.add([document("new {}".format(i), level="ERROR" if i % 2 else "INFO") for i in range(100)])
+        self.now += 20
+        recent_logs.add([document("newest", level="ERROR")])
+        self.assertLess(len(recent_logs._postings["level\x00ERROR"].sequences), 1000)
+        result = recent_logs.search(60, 3, level=("ERROR",))
+        self.assertEqual(result["total"], 51)
+        self.assertEqual([entry["message"] for entry in result["logs"]], ["newest", "new 99", "new 97"])
+        self.assertEqual(recent_logs.search(60, 10, level=("ERROR",), text="old")["total"], 0)
+
+    def test_recent_windows_are_searched_locally(self):
+        recent_logs = RecentLogs(max_age=1800)
+        #nothing received before the buffer was created is known
+        self.assertFalse(recent_logs.covers(900))
+        self.now += 1200
+        logger = Logger(MagicMock(), MagicMock(config={"logs": {"path": "static"}}), MagicMock())
+        logger.add_listener(recent_logs.add)
+        logger.add_listener(MagicMock(side_effect=Exception("listener failure")))
+        with patch.object(Logger, "_ship"):
+            logger._accept([document("Bad request", level="ERROR")])
+        self.now += 10
+        config = MagicMock(config={"search": {}})
+        connector = MagicMock()
+        connector.search.return_value = {"hits": {"total": {"value": 0}, "hits": []}}
+        log_search = LogSearch(config, connector, recent_logs)
+        result, source = log_search.search(MultiDict([("level", "error"), ("last", "15m")]))
+        self.assertEqual((source, result["total"]), ("LOCAL", 1))
+        #longer than the buffer keeps entries, or bounded by an absolute time
+        self.assertEqual(log_search.search(MultiDict([("level", "error"), ("last", "1d")]))[1], "MISS")
+        self.assertEqual(log_search.search(MultiDict([("last", "15m"), ("to", "2025-03-16T00:00:00")]))[1], "MISS")
+        self.assertEqual(connector.search.call_count, 2)
@@ -0,0 +1,74 @@
+"""Unit tests for the capture of slow requests and the profiling of requests"""
+import unittest
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from flask import Flask
+from src.Metrics.Metrics import Metrics
+from src.Profiling.RequestProfiler import RequestProfiler
+
+
+def handler(delay: float = 0):
+    with Metrics.stage_timer("parse"):
+        time.sleep(delay)
+    Metrics.observe_stage("s3_upload", 0.25)
+    return "Log received from 127.0.0.1", 200
+
+
+class test_request_profiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def profiler(self, **config) -> RequestProfiler:
+        return RequestProfiler(config, self.directory.name)
+
+    def slow_log(self):
+        path = os.path.join(self.directory.name, "slow.log")
+        if not os.path.exists(path):
+            return []
+        with open(path, "rt") as f:
+            return [json.loads(line) for line in f]
+
+    def test_slow_request_is_logged_with_its_stages(self):
+        profiler = self.profiler(slowThresholdMs=10)
+        with self.app.test_request_context("/log", method="POST", data=b"0123456789"):
+            self.assertEqual(profiler.run(handler, 0.02), ("Log received from 127.0.0.1", 200))
+            profiler.run(handler)
+        entries = self.slow_log()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual((entries[0]["path"], entries[0]["status"], entries[0]["payload_bytes"]), ("/log", 200, 10))
+        self.assertGreaterEqual(entries[0]["stages_ms"]["parse"], 20)
+        self.assertEqual(entries[0]["stages_ms"]["s3_upload"], 250)
+        self.assertIsNone(entries[0]["profile"])
+        #stages out of a captured request are not collected
+        self.assertIsNone(Metrics.request_stages.get())
+
+    def test_toggle_file_profiles_every_request(self):
+        profiler = self.profiler(slowThresholdMs=0, toggleFile="profiling.on", maxProfiles=2)
+        profile_dir = os.path.join(self.directory.name, "profiles")
+        with self.app.test_request_context("/log", method="POST"):
+            profiler.run(handler)
+            self.assertFalse(os.path.exists(profile_dir))
+            open(os.path.join(self.directory.name, "profiling.on"), "w").close()
+            with patch.object(RequestProfiler, "_TOGGLE_CHECK_INTERVAL", 0):
+                for _ in range(3):
+                    profiler.run(handler)
+        self.assertEqual(len(os.listdir(profile_dir)), 2)
+        entries = self.slow_log()
+        self.assertIsNone(entries[0]["profile"])
+        self.assertTrue(entries[-1]["profile"].endswith(".prof"))
+        self.assertTrue(os.path.exists(entries[-1]["profile"]))
+
+    def test_sampled_requests_are_profiled(self):
+        profiler = self.profiler(sampleRate=1)
+        with self.app.test_request_context("/log", method="POST"):
+            profiler.run(handler)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory.name, "profiles"))), 1)
+        self.assertEqual(self.slow_log(), [])
@@ -0,0 +1,119 @@
+"""Unit tests for the size- and time-based rollover of the Logger buffer"""
+import unittest
+import queue
+import tempfile
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+from src.FileTransferManager.UploadResult import UploadResult
+from src.Logger.Logger import Logger
+from src.Logger.RollingBuffer import RollingBuffer, RolloverError
+
+
+class test_rolling_buffer(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def tearDown(self):
+        self.buffer.close()
+
+    def test_rollover_on_entry_count(self):
+        """
+        Entries from several requests must be shipped as a single batch once max_entries is reached.
+        """
+        self.buffer = RollingBuffer(self.batches.append, max_bytes=1000000, max_entries=3, max_age=60)
+        self.buffer.add(["a\n"])
+        self.buffer.add(["b\n"])
+        self.assertEqual(self.batches, [])
+        self.buffer.add(["c\n"])
+        self.assertEqual(self.batches, [["a\n", "b\n", "c\n"]])
+        self.assertEqual(self.buffer.pending(), 0)
+
+    def test_rollover_on_size(self):
+        """
+        The buffer must roll over once the serialized entries reach max_bytes.
+        """
+        self.buffer = RollingBuffer(self.batches.append, max_bytes=10, max_entries=1000, max_age=60)
+        self.buffer.add(["12345\n"])
+        self.assertEqual(self.batches, [])
+        self.buffer.add(["67890\n"])
+        self.assertEqual(self.batches, [["12345\n", "67890\n"]])
+
+    def test_rollover_on_age(self):
+        """
+        A buffer that does not reach any size threshold must still be shipped after max_age seconds.
+        """
+        self.buffer = RollingBuffer(self.batches.append, max_bytes=1000000, max_entries=1000, max_age=0.2)
+        self.buffer.add(["a\n"])
+        deadline = time.monotonic() + 5
+        while not self.batches and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.batches, [["a\n"]])
+
+    def test_close_flushes_pending_entries(self):
+        """
+        Closing the buffer must not lose the entries that did not reach any threshold.
+        """
+        self.buffer = RollingBuffer(self.batches.append, max_bytes=1000000, max_entries=1000, max_age=60)
+        self.buffer.add(["a\n", "b\n"])
+        self.buffer.close()
+        self.assertEqual(self.batches, [["a\n", "b\n"]])
+
+    def test_failed_rollover_keeps_entries(self):
+        """
+        Entries already acknowledged must not be lost when shipping their batch fails: they're shipped with the next rollover.
+        """
+        failures = [Exception("Elasticsearch is down")]
+
+        def rollover(batch):
+            if failures:
+                raise failures.pop()
+            self.batches.append(batch)
+
+        self.buffer = RollingBuffer(rollover, max_bytes=1000000, max_entries=2, max_age=60)
+        with patch("traceback.print_exc"):
+            self.buffer.add(["a\n", "b\n"])
+        self.assertEqual(self.buffer.pending(), 2)
+        #no rollover is tried again before max_age
+        self.buffer.add(["c\n"])
+        self.assertEqual(self.batches, [])
+        self.buffer.flush()
+        self.assertEqual(self.batches, [["a\n", "b\n", "c\n"]])
+
+    def test_only_the_entries_not_shipped_are_kept(self):
+        """
+        A rollover that failed after shipping part of its batch puts back only the rest, and the buffer refuses new entries
+        past max_buffered_bytes.
+        """
+        failures = [RolloverError(Exception("Elasticsearch is overloaded"), ["b\n"])]
+
+        def rollover(batch):
+            if failures:
+                raise failures.pop()
+            self.batches.append(batch)
+
+        self.buffer = RollingBuffer(rollover, max_bytes=1000000, max_entries=2, max_age=60, max_buffered_bytes=4)
+        with patch("traceback.print_exc"):
+            self.buffer.add(["a\n", "b\n"])
+        self.assertEqual(self.buffer.pending(), 1)
+        self.buffer.add(["c\n"])
+        with self.assertRaises(queue.Full):
+            self.buffer.add(["d\n"])
+        self.buffer.flush()
+        self.assertEqual(self.batches, [["b\n", "c\n"]])
+
+    def test_logger_puts_back_the_entries_not_indexed(self):
+        self.buffer = RollingBuffer(self.batches.append)
+        with tempfile.TemporaryDirectory() as path:
+            config = MagicMock()
+            config.config = {"logs": {"path": path}, "S3": {"bucketName": "bucket"}}
+            uploader, connector = MagicMock(), MagicMock()
+            upload = Future()
+            upload.set_result(UploadResult(file_path="missing", bucket_name="bucket", object_name="file.log", success=True))
+            uploader.upload_async.return_value = upload
+            connector.create_document.return_value = {"indexed": 1, "failed": 1, "errors": [], "retryable": ["b\n"]}
+            logger = Logger(uploader, config, connector)
+            with self.assertRaises(RolloverError) as context:
+                logger._dispatch_rollover(["a\n", "b\n"])
+        self.assertEqual(context.exception.entries, ["b\n"])
@@ -53,4 +53,28 @@ class test_log_message(unittest.TestCase):
         payload_data = """2025-03-15 01:56:59,303 - 127.0.0.1  - 4109 - INFO - get_dns - server.py - Querying DNS server for address www.yoursite.com"\n
                           2025-03-15 01:58:29,388 - 127.0.0.1  - 4160 - ERROR - get_dns - server.py - Bad request: www.yoursite.com does not exist"""
         response = self.client_app.post("/log", data=payload_data, headers=token_auth)
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_json_lines_sent(self, ship_mock):
+        """
+        Test that structured logs sent as application/x-ndjson are shipped as they were sent, tagged with the sender's IP.
+        """
+        auth_pass = f"{self._COMMON_USERNAME}:{self._COMMON_USERNAME_PASSWORD}"
+        auth = {
+            "Authorization" : f"Basic {base64.b64encode(auth_pass.encode("utf-8")).decode("utf-8")}"
+        }
+        response = self.client_app.get("/auth/login", headers=auth).get_json()
+        token_auth = {
+            "Authorization" : f"Bearer {response['token']['access']}",
+            "Content-Type" : "application/x-ndjson"
+        }
+        line = '{"application_id":"4109","date":"2025-03-15","time":"01:56:59,303","client_ip":"127.0.0.1","level":"INFO",' \
+               '"method":"get_dns","component":"server.py","message":"Querying DNS server for address www.yoursite.com"}'
+        response = self.client_app.post("/log", data=line + "\n" + line + "\n", headers=token_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ship_mock.call_args.args[0], ['{"application_server_ip":"127.0.0.1",' + line[1:] + "\n"] * 2)
+        response = self.client_app.post("/log", data=line.replace('"level":"INFO"', '"level":"LOUD"'), headers=token_auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.client_app.post("/log", data=line[:-1], headers=token_auth)
+        self.assertEqual(response.status_code, 400)
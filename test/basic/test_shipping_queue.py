@@ -0,0 +1,58 @@
+"""Unit tests for the asynchronous shipping queue used by the Logger"""
+import unittest
+import queue
+import threading
+from unittest.mock import patch
+from src.Logger.ShippingQueue import ShippingQueue
+
+
+class test_shipping_queue(unittest.TestCase):
+
+    def test_batches_are_shipped_by_workers(self):
+        """
+        Every submitted batch must be shipped once by the worker threads, outside of the caller's thread.
+        """
+        shipped = []
+        caller = threading.current_thread()
+        def ship(batch):
+            self.assertIsNot(threading.current_thread(), caller)
+            shipped.append(batch)
+        shipping_queue = ShippingQueue(ship, queue_size=10, workers=2)
+        for i in range(5):
+            shipping_queue.submit(["entry {}\n".format(i)])
+        shipping_queue.join()
+        shipping_queue.stop()
+        self.assertEqual(sorted(shipped), [["entry {}\n".format(i)] for i in range(5)])
+
+    def test_full_queue_refuses_batch(self):
+        """
+        When the workers can't keep up, the queue must refuse new batches instead of growing unbounded.
+        """
+        release = threading.Event()
+        shipping_queue = ShippingQueue(lambda batch: release.wait(), queue_size=1, workers=1)
+        shipping_queue.submit(["first\n"])
+        #wait for the worker to pick the first batch, leaving room for exactly one more
+        while shipping_queue.depth():
+            pass
+        shipping_queue.submit(["second\n"])
+        with self.assertRaises(queue.Full):
+            shipping_queue.submit(["third\n"])
+        release.set()
+        shipping_queue.stop()
+
+    @patch("src.Logger.ShippingQueue.traceback.print_exc")
+    def test_failed_shipping_does_not_stop_worker(self, print_exc_mock):
+        """
+        A failure when shipping a batch must not kill the worker.
+        """
+        shipped = []
+        def ship(batch):
+            if batch == ["bad\n"]:
+                raise Exception("Elasticsearch is offline")
+            shipped.append(batch)
+        shipping_queue = ShippingQueue(ship, queue_size=10, workers=1)
+        shipping_queue.submit(["bad\n"])
+        shipping_queue.submit(["good\n"])
+        shipping_queue.stop()
+        self.assertEqual(shipped, [["good\n"]])
+        print_exc_mock.assert_called_once()
@@ -0,0 +1,209 @@
+"""Unit tests for the durable spool and its replayer"""
+import unittest
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+from src.FileTransferManager.UploadResult import UploadResult
+from src.Logger.Logger import Logger
+from src.Metrics.Metrics import Metrics
+from src.Spool.Spool import Spool
+from src.Spool.SpoolReplayer import SpoolReplayer
+
+
+def entries(first: int, amount: int):
+    return ["{{\"message\":\"{}\"}}\n".format(i) for i in range(first, first + amount)]
+
+
+class test_spool(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.path = self.spool_dir.name
+
+    def tearDown(self):
+        self.spool_dir.cleanup()
+
+    def test_uncommitted_entries_survive_reopening(self):
+        spool = Spool(self.path, segment_bytes=4096)
+        spool.append(entries(0, 3))
+        spool.append(entries(3, 2))
+        read, position = spool.read(1)
+        self.assertEqual(read, entries(0, 3))
+        spool.commit(position)
+        spool.close()
+        spool = Spool(self.path, segment_bytes=4096)
+        self.assertEqual(spool.read(4096)[0], entries(3, 2))
+        spool.close()
+
+    def test_torn_record_is_dropped(self):
+        """
+        A record partially written when the process crashed must be ignored, and new records written over it.
+        """
+        spool = Spool(self.path, segment_bytes=4096, sync=False)
+        spool.append(entries(0, 2))
+        spool.close()
+        segment = os.path.join(self.path, sorted(os.listdir(self.path))[0])
+        with open(segment, "r+b") as f:
+            f.seek(Spool._HEADER.size + len("".join(entries(0, 2))))
+            f.write(Spool._HEADER.pack(100, 12345) + b"{\"message\":")
+        spool = Spool(self.path, segment_bytes=4096, sync=False)
+        spool.append(entries(2, 1))
+        self.assertEqual(spool.read(4096)[0], entries(0, 3))
+        spool.close()
+
+    def test_consumed_segments_are_removed(self):
+        #a single record fits in each segment
+        spool = Spool(self.path, segment_bytes=32)
+        for i in range(5):
+            spool.append(entries(i, 1))
+        self.assertEqual(len([name for name in os.listdir(self.path) if name.endswith(".seg")]), 5)
+        read, position = spool.read(1 << 20)
+        self.assertEqual(read, entries(0, 5))
+        #read but not committed yet: 4 full segments and the record of the active one
+        self.assertEqual(spool.pending_bytes(), 4 * 32 + Spool._HEADER.size + len(entries(4, 1)[0]))
+        spool.commit(position)
+        self.assertEqual(spool.pending_bytes(), 0)
+        self.assertEqual(len([name for name in os.listdir(self.path) if name.endswith(".seg")]), 1)
+        spool.close()
+
+    def test_concurrent_appends_are_synced_together(self):
+        """
+        Appends waiting for the same sync window must share a single flush: one flush per append would take at least 2 seconds.
+        """
+        spool = Spool(self.path, sync_interval=0.1)
+        threads = [threading.Thread(target=spool.append, args=(entries(i, 1),)) for i in range(20)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(sorted(spool.read(1 << 20)[0]), sorted(entries(0, 20)))
+        spool.close()
+
+    def test_replayer_retries_until_shipped(self):
+        """
+        While the downstream is failing, the batch is kept and retried. It's committed once it's shipped.
+        """
+        spool = Spool(self.path)
+        shipped = threading.Event()
+        ship_calls = []
+
+        def ship(batch, state):
+            ship_calls.append(batch)
+            if len(ship_calls) < 3:
+                raise ConnectionError("Elasticsearch is down")
+            shipped.set()
+        spool.append(entries(0, 2))
+        with patch("traceback.print_exc"):
+            replayer = SpoolReplayer(spool, ship, retry_backoff=0.01)
+            self.assertTrue(shipped.wait(5))
+            replayer.stop()
+        self.assertEqual(ship_calls, [entries(0, 2)] * 3)
+        self.assertEqual(replayer.failures, 2)
+        spool.close()
+        spool = Spool(self.path)
+        self.assertEqual(spool.read(4096)[0], [])
+        spool.close()
+
+    def test_logger_acknowledges_while_downstream_is_down(self):
+        config = MagicMock()
+        config.config = {"logs": {"path": self.path, "spool": {"enabled": True, "path": os.path.join(self.path, "spool"),
+                                                                "retryBackoffSeconds": 10}},
+                         "S3": {"bucketName": "bucket"}}
+        connector = MagicMock()
+        connector.create_document.side_effect = ConnectionError("Elasticsearch is down")
+        logger = Logger(MagicMock(), config, connector)
+        with patch("traceback.print_exc"), patch("builtins.print"):
+            logger._accept(entries(0, 2))
+            logger.close()
+        spool = Spool(os.path.join(self.path, "spool", str(os.getpid())))
+        self.assertEqual(spool.read(4096)[0], entries(0, 2))
+        spool.close()
+
+    def test_failed_upload_is_not_committed(self):
+        """
+        A batch whose file was not stored in S3 is shipped again, under the same file name, without indexing its entries twice.
+        """
+        config = MagicMock()
+        config.config = {"logs": {"path": self.path}, "S3": {"bucketName": "bucket"}}
+        uploader, connector = MagicMock(), MagicMock()
+        connector.create_document.return_value = {"indexed": 2, "failed": 0, "errors": [], "retryable": []}
+        logger = Logger(uploader, config, connector)
+        state = {}
+        for success in (False, True):
+            upload = Future()
+            upload.set_result(UploadResult(file_path="missing", bucket_name="bucket", object_name="file.log", success=success))
+            uploader.upload_async.return_value = upload
+            with patch("builtins.print"):
+                if success:
+                    logger._ship_spooled(entries(0, 2), state)
+                else:
+                    self.assertRaises(Exception, logger._ship_spooled, entries(0, 2), state)
+        self.assertEqual(connector.create_document.call_count, 1)
+        first, second = [call.args[2] for call in uploader.upload_async.call_args_list]
+        self.assertEqual(first, second)
+
+    def test_rejected_entries_do_not_block_the_spool(self):
+        """
+        An entry that Elasticsearch always rejects is dead-lettered, an entry rejected by an overloaded cluster is sent again
+        alone, and the entries indexed are never sent twice.
+        """
+        config = MagicMock()
+        config.config = {"logs": {"path": self.path, "spool": {"enabled": True, "path": os.path.join(self.path, "spool"),
+                                                                "retryBackoffSeconds": 0.01}},
+                         "S3": {"bucketName": "bucket"}}
+        uploader, connector = MagicMock(), MagicMock()
+        upload = Future()
+        upload.set_result(UploadResult(file_path="missing", bucket_name="bucket", object_name="file.log", success=True))
+        uploader.upload_async.return_value = upload
+        sent = []
+
+        def create_document(index_name, documents):
+            sent.append(list(documents))
+            retryable = entries(0, 1) if len(sent) == 1 else []
+            rejected = [document for document in documents if document in entries(1, 1)]
+            return {"indexed": len(documents) - len(retryable) - len(rejected), "failed": len(retryable) + len(rejected),
+                    "errors": [{"type": "mapper_parsing_exception"}] * len(rejected), "retryable": retryable}
+
+        connector.create_document.side_effect = create_document
+        logger = Logger(uploader, config, connector)
+        with patch("traceback.print_exc"), patch("builtins.print"), patch.object(Metrics, "increment") as increment_mock:
+            logger._accept(entries(0, 3))
+            deadline = time.monotonic() + 5
+            while logger.spool_pending_bytes() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            logger.close()
+        self.assertEqual(sent, [entries(0, 3), entries(0, 1)])
+        increment_mock.assert_any_call("logaggregator_documents_dead_lettered_total", 1)
+        spool = Spool(os.path.join(self.path, "spool", str(os.getpid())))
+        self.assertEqual(spool.read(4096)[0], [])
+        spool.close()
+
+    def test_spools_of_exited_processes_are_adopted(self):
+        """
+        Each process writes to a spool of its own. The spool of a process that exited is drained by the next one, then removed.
+        """
+        root = os.path.join(self.path, "spool")
+        left = Spool(os.path.join(root, "1"))
+        left.append(entries(0, 2))
+        #still open: another process can't use it
+        self.assertRaises(BlockingIOError, Spool, os.path.join(root, "1"))
+        left.close()
+        config = MagicMock()
+        config.config = {"logs": {"path": self.path, "spool": {"enabled": True, "path": root}}, "S3": {"bucketName": "bucket"}}
+        shipped = []
+        with patch.object(Logger, "_ship_spooled", side_effect=lambda batch, state: shipped.append(batch)), patch("builtins.print"):
+            logger = Logger(MagicMock(), config, MagicMock())
+            deadline = time.monotonic() + 5
+            while os.path.exists(os.path.join(root, "1")) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            logger._accept(entries(2, 1))
+            while len(shipped) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            logger.close()
+        self.assertEqual(shipped, [entries(0, 2), entries(2, 1)])
+        self.assertEqual(os.listdir(root), [str(os.getpid())])
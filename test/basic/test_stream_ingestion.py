@@ -0,0 +1,76 @@
+"""Unit tests for the streaming ingestion of large payloads"""
+import unittest
+import io
+import os
+import sys
+import base64
+import shutil
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from src.Logger.Logger import Logger
+from test.test_app_factory import TestAppFactory
+from src.Utils import Constants
+
+
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "src"))
+sys.path.insert(0, os.path.join(os.path.abspath(Path(__file__).parent.parent.parent)))
+
+LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+class test_stream_ingestion(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def _streaming_logger(self, unit_lines: int):
+        config = MagicMock()
+        config.config = {
+            "logs": {
+                "path": "static",
+                "streaming": {"enabled": True, "chunkBytes": 64, "unitLines": unit_lines}
+            }
+        }
+        return Logger(MagicMock(), config, MagicMock())
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_large_payload_is_shipped_in_units(self, ship_mock):
+        """
+        A payload with more lines than unitLines must be shipped in several bounded units.
+        """
+        logger = self._streaming_logger(unit_lines=10)
+        header = MagicMock(remote_addr="10.0.0.1")
+        payload = "\n".join([LINE] * 25).encode("utf-8")
+        accepted = logger.log_stream(header, io.BytesIO(payload))
+        self.assertEqual(accepted, 25)
+        self.assertEqual([len(call.args[0]) for call in ship_mock.call_args_list], [10, 10, 5])
+
+    def test_empty_stream_is_refused(self):
+        logger = self._streaming_logger(unit_lines=10)
+        with self.assertRaises(ValueError):
+            logger.log_stream(MagicMock(remote_addr="10.0.0.1"), io.BytesIO(b"\n\n"))
+
+    def test_payload_over_limit_is_refused(self):
+        """
+        Payloads bigger than logs.maxPayloadBytes must be refused with 413 without being parsed.
+        """
+        test_factory = TestAppFactory()
+        try:
+            app = test_factory.get_test_app()
+            app.config["MAX_CONTENT_LENGTH"] = 100
+            client_app = app.test_client()
+            username, password = test_factory.get_credentials()
+            auth_pass = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("utf-8")
+            token = client_app.get("/auth/login", headers={"Authorization": f"Basic {auth_pass}"}).get_json()["token"]["access"]
+            response = client_app.post("/log", data="\n".join([LINE] * 5), headers={"Authorization": f"Bearer {token}"})
+            self.assertEqual(response.status_code, Constants.HTTP_PAYLOAD_TOO_LARGE.value)
+        finally:
+            test_factory.destroy_test_app()
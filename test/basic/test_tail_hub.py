@@ -0,0 +1,134 @@
+"""Unit tests for the live tail: the publish/subscribe hub and the /log/tail Server-Sent Events endpoint"""
+import unittest
+import json
+import os
+import queue
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+from flask_jwt_extended import create_access_token
+from aiohttp.test_utils import TestClient, TestServer
+from src.AsyncServer.AsyncServer import AsyncServer
+from src.AsyncServer.AsyncShipper import AsyncShipper
+from src.Logger.Logger import Logger
+from src.Tail.Subscription import Subscription
+from src.Tail.TailHub import TailHub
+from src.Utils import Constants
+from test.test_app_factory import TestAppFactory
+
+ERROR_LINE = "2025-03-15 01:58:29,388 - 127.0.0.1 - 4160 - ERROR - get_dns - server.py - Bad request: www.yoursite.com does not exist"
+INFO_LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+def document(level: str, application_id: str = "4109") -> str:
+    return json.dumps({"level": level, "application_id": application_id, "message": "m"}) + "\n"
+
+
+class test_tail_hub(unittest.TestCase):
+
+    def test_entries_are_fanned_out_to_matching_subscribers(self):
+        hub = TailHub()
+        errors = hub.subscribe(levels=["ERROR"])
+        application = hub.subscribe(application_ids=["4160"])
+        everything = hub.subscribe()
+        hub.publish([document("INFO"), document("ERROR"), document("INFO", "4160")])
+        self.assertEqual(errors.poll(5), ([document("ERROR")], 0, None))
+        self.assertEqual(application.poll(5), ([document("INFO", "4160")], 0, None))
+        self.assertEqual(len(everything.poll(5)[0]), 3)
+        everything.close()
+        self.assertEqual(hub.subscribers(), 2)
+        #nothing published: the viewer gets a keep-alive comment
+        self.assertEqual(Subscription.render(*errors.poll(0.01)), ": keep-alive\n\n")
+
+    def test_slow_subscribers_are_sampled_or_dropped(self):
+        hub = TailHub(queue_size=2, max_subscribers=1)
+        sampled = hub.subscribe()
+        with self.assertRaises(queue.Full):
+            hub.subscribe()
+        hub.publish([document("INFO")] * 5)
+        entries, skipped, closed = sampled.poll(5)
+        self.assertEqual((len(entries), skipped, closed), (2, 3, None))
+        self.assertIn('event: skipped\ndata: {"skipped": 3}', Subscription.render(entries, skipped, closed))
+        sampled.close()
+
+        hub = TailHub(queue_size=2, slow_policy="drop")
+        dropped, patient = hub.subscribe(), hub.subscribe(levels=["ERROR"])
+        hub.publish([document("INFO")] * 3)
+        hub.publish([document("ERROR")])
+        self.assertEqual(patient.poll(5), ([document("ERROR")], 0, None))
+        entries, skipped, closed = dropped.poll(5)
+        self.assertEqual(entries, [])
+        self.assertIn("event: dropped", Subscription.render(entries, skipped, closed))
+        self.assertEqual(hub.subscribers(), 1)
+
+
+class test_tail_endpoint(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        with open(cls.source_file, "rt") as f:
+            config = json.load(f)
+        config["logs"]["tail"].update(enabled=True, heartbeatSeconds=5)
+        with open(cls.dest_file, "wt") as f:
+            json.dump(config, f)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.hub = self.test_factory.log_aggregator.get_tail_hub()
+        with self.app.app_context():
+            token = create_access_token(identity="johndoe", additional_claims={"perm": ["log", "read_logs"]})
+            log_token = create_access_token(identity="johndoe", additional_claims={"perm": ["log"]})
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.log_headers = {"Authorization": f"Bearer {log_token}"}
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    @patch.object(Logger, "_ship")
+    def test_entries_are_streamed_as_they_are_accepted(self, ship_mock):
+        client = self.app.test_client()
+        #a viewer would hold the only thread of a sync worker
+        response = client.get("/log/tail", headers=self.headers, environ_overrides={"wsgi.multithread": False})
+        self.assertEqual(response.status_code, Constants.HTTP_SERVICE_UNAVAILABLE.value)
+        self.assertEqual(self.hub.subscribers(), 0)
+        threaded = {"wsgi.multithread": True}
+        self.assertEqual(client.get("/log/tail", environ_overrides=threaded).status_code, Constants.HTTP_UNAUTHORIZED.value)
+        #a token allowed only to send logs can't watch them
+        self.assertEqual(client.get("/log/tail", headers=self.log_headers, environ_overrides=threaded).status_code,
+                         Constants.HTTP_UNAUTHORIZED.value)
+        self.assertEqual(client.get("/log/tail?level=LOUD", headers=self.headers, environ_overrides=threaded).status_code,
+                         Constants.HTTP_BAD_REQUEST.value)
+        response = client.get("/log/tail?level=ERROR", headers=self.headers, environ_overrides=threaded)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = iter(response.response)
+        self.assertEqual(next(events), b": subscribed\n\n")
+        self.assertEqual(client.post("/log", data=INFO_LINE + "\n" + ERROR_LINE, headers=self.headers).status_code, Constants.HTTP_OK.value)
+        event = next(events).decode("utf-8")
+        self.assertTrue(event.startswith("data: "))
+        self.assertEqual(json.loads(event[len("data: "):])["message"], "Bad request: www.yoursite.com does not exist")
+        #the viewer left
+        response.close()
+        self.assertEqual(self.hub.subscribers(), 0)
+
+    @patch.object(AsyncShipper, "ship", new_callable=AsyncMock)
+    async def test_asyncio_server_streams_from_the_event_loop(self, ship_mock):
+        server = AsyncServer(log_aggregator=self.test_factory.log_aggregator)
+        async with TestClient(TestServer(server.app)) as client:
+            response = await client.get("/log/tail")
+            self.assertEqual(response.status, Constants.HTTP_UNAUTHORIZED.value)
+            response = await client.get("/log/tail", headers=self.log_headers)
+            self.assertEqual(response.status, Constants.HTTP_UNAUTHORIZED.value)
+            response = await client.get("/log/tail?application_id=4109", headers=self.headers)
+            self.assertEqual(response.headers["Content-Type"], "text/event-stream")
+            self.assertEqual(await response.content.readuntil(b"\n\n"), b": subscribed\n\n")
+            await client.post("/log", data=INFO_LINE + "\n" + ERROR_LINE, headers=self.headers)
+            event = (await response.content.readuntil(b"\n\n")).decode("utf-8")
+            self.assertEqual(json.loads(event[len("data: "):])["message"], "Querying DNS server for www.yoursite.com")
+            response.close()
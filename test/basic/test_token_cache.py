@@ -0,0 +1,60 @@
+"""Unit tests for the cache of verified JWTs"""
+import unittest
+import os
+import shutil
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+from flask_jwt_extended.tokens import _decode_jwt
+from src.auth import LogJWTManager
+from src.Utils import Constants
+from test.test_app_factory import TestAppFactory
+
+LINE = "2025-03-15 01:56:59,303 - 127.0.0.1 - 4109 - INFO - get_dns - server.py - Querying DNS server for www.yoursite.com"
+
+
+class test_token_cache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.client_app = self.app.test_client()
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    def token(self, expires_delta: timedelta) -> dict:
+        with self.app.app_context():
+            token = create_access_token(identity="johndoe", additional_claims={"perm": ["log"]}, expires_delta=expires_delta)
+        return {"Authorization": f"Bearer {token}"}
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_repeated_token_is_verified_once(self, ship_mock):
+        headers = self.token(timedelta(minutes=15))
+        with patch("flask_jwt_extended.jwt_manager._decode_jwt", wraps=_decode_jwt) as decode_mock:
+            for _ in range(3):
+                self.assertEqual(self.client_app.post("/log", data=LINE, headers=headers).status_code, Constants.HTTP_OK.value)
+        self.assertEqual(decode_mock.call_count, 1)
+        stats = LogJWTManager.token_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 1, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+    @patch("src.Logger.Logger.Logger._ship")
+    def test_cached_token_expires_with_token(self, ship_mock):
+        headers = self.token(timedelta(seconds=1))
+        self.assertEqual(self.client_app.post("/log", data=LINE, headers=headers).status_code, Constants.HTTP_OK.value)
+        time.sleep(1.1)
+        self.assertEqual(self.client_app.post("/log", data=LINE, headers=headers).status_code, Constants.HTTP_UNAUTHORIZED.value)
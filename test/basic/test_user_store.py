@@ -0,0 +1,76 @@
+"""Unit tests for the user store: indexes, SQLite settings and the cache of users"""
+import unittest
+import os
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+from flask import Flask
+from sqlalchemy import exc, text
+from src.database import DB
+from src.models import User
+from test.test_app_factory import TestAppFactory
+
+
+class test_user_store(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.source_file = os.path.join(os.path.abspath(Path(__file__).parent.parent), "config.json")
+        cls.dest_file = os.path.join(os.path.abspath(Path(__file__).parent.parent.parent), "config.json")
+        shutil.copyfile(cls.source_file, cls.dest_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.dest_file):
+            os.remove(cls.dest_file)
+
+    def setUp(self):
+        self.test_factory = TestAppFactory()
+        self.app = self.test_factory.get_test_app()
+        self.db = DB.db_instance()
+
+    def tearDown(self):
+        self.test_factory.destroy_test_app()
+
+    def test_database_settings(self):
+        with self.app.app_context():
+            with self.db.engine.connect() as conn:
+                self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            with self.assertRaises(exc.IntegrityError):
+                self.db.session.add(User(username="johndoe", password="hash"))
+                self.db.session.commit()
+            self.db.session.rollback()
+
+    def test_cached_user_is_not_queried_again(self):
+        with self.app.app_context():
+            User.by_id("johndoe")
+        with self.app.app_context():
+            with patch.object(User, "query") as query_mock:
+                user = User.by_id("johndoe")
+                query_mock.filter_by.assert_not_called()
+            self.assertTrue(user.validate_password("mypass"))
+            #the cached user is attached to the session, so it can be changed
+            user.set_password("newpass")
+            user.save()
+        with self.app.app_context():
+            self.assertTrue(User.by_id("johndoe").validate_password("newpass"))
+
+    def test_deleted_user_is_not_cached(self):
+        with self.app.app_context():
+            User.by_id("johndoe").delete()
+            self.assertIsNone(User.by_id("johndoe"))
+
+    def test_pool_options_fit_the_database(self):
+        """
+        An in-memory SQLite database has a single connection: sizing its pool must not break the engine, and the options set
+        by the caller are kept.
+        """
+        for options, expected in ((None, {"pool_pre_ping": True}), ({"pool_pre_ping": False}, {"pool_pre_ping": False})):
+            app = Flask(__name__)
+            app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+            if options is not None:
+                app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+            DB.initialize_db(app)
+            self.assertEqual(app.config["SQLALCHEMY_ENGINE_OPTIONS"], expected)
+            DB.end_db(app)
+        self.assertEqual(self.app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"], 10)
@@ -41,7 +41,8 @@ class TestAppFactory:
             "SQLALCHEMY_DATABASE_URI" : f"sqlite:///{self.tempfile.name}",
             "JWT_SECRET_KEY" : "iamnotasafekey"
         }
-        return LogAggregator(test_config=test_config).app
+        self.log_aggregator = LogAggregator(test_config=test_config)
+        return self.log_aggregator.app
     
     def get_test_app(self):
         """